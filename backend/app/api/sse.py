@@ -0,0 +1,26 @@
+"""Server-Sent Eventsのフレームエンコーダー"""
+
+import json
+
+# json.dumps()のデフォルト設定と同じ出力をするエンコーダーを使い回す
+_encode_json = json.JSONEncoder().encode
+
+_CONTENT_FRAME_PREFIX = 'data: {"content": '
+_CONTENT_FRAME_SUFFIX = "}\n\n"
+
+
+def encode_event(payload: dict) -> str:
+    """任意のペイロードをSSEのdataフレームにエンコードする。"""
+    return f"data: {_encode_json(payload)}\n\n"
+
+
+def encode_content(chunk: str) -> str:
+    """
+    テキストチャンクを{"content": ...}のSSEフレームにエンコードする。
+
+    トークンごとに呼ばれるため、辞書を組み立てずに文字列部分のみをエンコードする。
+    """
+    return _CONTENT_FRAME_PREFIX + _encode_json(chunk) + _CONTENT_FRAME_SUFFIX
+
+
+DONE_FRAME = encode_event({"done": True})
@@ -1,22 +1,43 @@
 """メッセージ/会話モデル定義"""
 
-from datetime import datetime
+from datetime import UTC, datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 
+def utc_now() -> datetime:
+    """現在時刻をDBに保存する形式（タイムゾーン無しのUTC）で返す。"""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
 class Conversation(Base):
     """会話モデル"""
 
     __tablename__ = "conversations"
+    __table_args__ = (
+        # 一覧取得（更新日時降順、キーセットページネーション）用
+        Index("ix_conversations_updated_at_id", "updated_at", "id"),
+    )
 
     id = Column(String, primary_key=True)
     title = Column(String, nullable=False, default="新しいチャット")
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+    updated_at = Column(DateTime, default=utc_now, nullable=False)
+    # 一覧表示用の非正規化カラム（メッセージ保存時に同一トランザクションで更新）
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_message_preview = Column(String, default="", server_default="", nullable=False)
+    last_message_at = Column(DateTime, nullable=True)
 
     def __repr__(self):
         return f"<Conversation(id={self.id}, title={self.title})>"
@@ -26,16 +47,61 @@ class Message(Base):
     """メッセージモデル"""
 
     __tablename__ = "messages"
+    __table_args__ = (
+        # 会話単位のメッセージ取得（時系列順）用
+        Index("ix_messages_conversation_id_timestamp", "conversation_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     conversation_id = Column(String, ForeignKey("conversations.id"), nullable=True)
     role = Column(String, nullable=False)  # 'user' or 'assistant'
     content = Column(String, nullable=False)
     model = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    timestamp = Column(DateTime, default=utc_now, nullable=False)
+    # クライアント切断などで生成が途中終了した応答の場合True
+    truncated = Column(Boolean, default=False, server_default="0", nullable=False)
 
     def __repr__(self):
         return (
             f"<Message(id={self.id}, conversation_id={self.conversation_id}, "
             f"role={self.role}, model={self.model}, timestamp={self.timestamp})>"
         )
+
+
+class RollingSummary(Base):
+    """会話の古いメッセージをまとめた要約モデル"""
+
+    __tablename__ = "rolling_summaries"
+
+    conversation_id = Column(String, ForeignKey("conversations.id"), primary_key=True)
+    content = Column(String, nullable=False)
+    # 要約に含めたメッセージ数（会話の先頭から時系列順）
+    summarized_count = Column(Integer, nullable=False)
+    model = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=utc_now, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<RollingSummary(conversation_id={self.conversation_id}, "
+            f"summarized_count={self.summarized_count})>"
+        )
+
+
+class CachedResponse(Base):
+    """同一プロンプトに対する応答のキャッシュモデル"""
+
+    __tablename__ = "response_cache"
+
+    # 正規化したメッセージ列・モデル・パラメーターのハッシュ
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    # 応答のチャンク列（JSON配列）。再生時も同じ区切りで送信する
+    chunks = Column(String, nullable=False)
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<CachedResponse(key={self.key}, model={self.model}, "
+            f"expires_at={self.expires_at})>"
+        )
@@ -2,6 +2,14 @@
 データベースリポジトリ
 """
 
+from app.repositories.async_message_repository import AsyncMessageRepository
+from app.repositories.conversation_history_cache import ConversationHistoryCache
 from app.repositories.message_repository import MessageRepository
+from app.repositories.message_write_queue import MessageWriteQueue
 
-__all__ = ["MessageRepository"]
+__all__ = [
+    "MessageRepository",
+    "AsyncMessageRepository",
+    "ConversationHistoryCache",
+    "MessageWriteQueue",
+]
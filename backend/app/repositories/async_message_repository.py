@@ -0,0 +1,188 @@
+"""非同期メッセージ/会話リポジトリ"""
+
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import TypeVar
+
+from app.models.message import CachedResponse, Conversation, Message, RollingSummary
+from app.repositories.message_repository import (
+    DEFAULT_CONVERSATION_TITLE,
+    LEGACY_CONVERSATION_ID,
+    MessageRepository,
+)
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class AsyncMessageRepository:
+    """
+    MessageRepositoryの非同期ラッパー
+
+    同期的なSQLAlchemy呼び出しを上限付きのスレッドプールで実行し、
+    DB I/O中もイベントループ（SSEストリーミング）をブロックしない。
+    """
+
+    def __init__(
+        self,
+        db_url: str = "sqlite:///./chat.db",
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        repository: MessageRepository | None = None,
+    ):
+        """
+        AsyncMessageRepositoryを初期化
+
+        Args:
+            db_url: データベースURL（repository未指定時のみ使用）
+            max_workers: DB処理に使用するスレッド数の上限
+            repository: ラップする同期リポジトリ。Noneの場合は新規作成する
+        """
+        self.repository = repository or MessageRepository(db_url=db_url)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="db"
+        )
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """同期処理をスレッドプールで実行する。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+
+    async def close(self) -> None:
+        """スレッドプールを停止する。"""
+        self._executor.shutdown(wait=True)
+
+    async def create_conversation(
+        self,
+        title: str = DEFAULT_CONVERSATION_TITLE,
+        conversation_id: str | None = None,
+    ) -> Conversation:
+        """会話を作成する。"""
+        return await self._run(
+            self.repository.create_conversation, title, conversation_id
+        )
+
+    async def get_conversation(self, conversation_id: str) -> Conversation | None:
+        """会話をIDで取得する。"""
+        return await self._run(self.repository.get_conversation, conversation_id)
+
+    async def delete_conversation(self, conversation_id: str) -> bool:
+        """会話と関連メッセージを削除する。"""
+        return await self._run(self.repository.delete_conversation, conversation_id)
+
+    async def ensure_conversation(self, conversation_id: str) -> Conversation:
+        """会話が無ければ作成し、存在する会話を返す。"""
+        return await self._run(self.repository.ensure_conversation, conversation_id)
+
+    async def save_message(
+        self,
+        role: str,
+        content: str,
+        model: str,
+        conversation_id: str = LEGACY_CONVERSATION_ID,
+    ) -> Message:
+        """メッセージを保存する。"""
+        return await self._run(
+            self.repository.save_message, role, content, model, conversation_id
+        )
+
+    async def save_turn(
+        self,
+        user_content: str,
+        assistant_content: str,
+        model: str,
+        conversation_id: str = LEGACY_CONVERSATION_ID,
+        truncated: bool = False,
+    ) -> tuple[Message, Message]:
+        """1往復分のメッセージを1トランザクションで保存する。"""
+        return await self._run(
+            self.repository.save_turn,
+            user_content,
+            assistant_content,
+            model,
+            conversation_id,
+            truncated=truncated,
+        )
+
+    async def save_messages(self, entries: list[dict]) -> list[Message]:
+        """複数のメッセージを1トランザクションでまとめて保存する。"""
+        return await self._run(self.repository.save_messages, entries)
+
+    async def get_messages_by_conversation(
+        self,
+        conversation_id: str,
+        limit: int | None = None,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> list[Message]:
+        """会話ID単位でメッセージを時系列順に取得する。"""
+        return await self._run(
+            self.repository.get_messages_by_conversation,
+            conversation_id,
+            limit=limit,
+            before=before,
+            after=after,
+        )
+
+    async def get_conversation_history(
+        self, conversation_id: str
+    ) -> list[dict[str, str]]:
+        """プロンプト構築用に会話の全メッセージを時系列順に取得する。"""
+        return await self._run(
+            self.repository.get_conversation_history, conversation_id
+        )
+
+    async def get_rolling_summary(self, conversation_id: str) -> RollingSummary | None:
+        """会話の古いメッセージの要約を取得する。"""
+        return await self._run(self.repository.get_rolling_summary, conversation_id)
+
+    async def save_rolling_summary(
+        self, conversation_id: str, content: str, summarized_count: int, model: str
+    ) -> RollingSummary | None:
+        """会話の要約を保存する。"""
+        return await self._run(
+            self.repository.save_rolling_summary,
+            conversation_id,
+            content,
+            summarized_count,
+            model,
+        )
+
+    async def get_cached_response(self, key: str) -> CachedResponse | None:
+        """キャッシュした応答を取得する（期限切れの場合はNone）。"""
+        return await self._run(self.repository.get_cached_response, key)
+
+    async def save_cached_response(
+        self, key: str, model: str, chunks: str, expires_at: datetime
+    ) -> None:
+        """応答をキャッシュに保存する。"""
+        await self._run(
+            self.repository.save_cached_response, key, model, chunks, expires_at
+        )
+
+    async def prune_cached_responses(self, max_entries: int) -> int:
+        """期限切れの応答とmax_entries件を超える古い応答を削除する。"""
+        return await self._run(self.repository.prune_cached_responses, max_entries)
+
+    async def get_conversation_summaries(
+        self,
+        limit: int | None = None,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> list[dict]:
+        """会話サマリー一覧を更新日時降順で取得する。"""
+        return await self._run(
+            self.repository.get_conversation_summaries,
+            limit=limit,
+            before=before,
+            after=after,
+        )
+
+    async def get_all_messages(self) -> list[Message]:
+        """全メッセージを取得する（互換維持）。"""
+        return await self._run(self.repository.get_all_messages)
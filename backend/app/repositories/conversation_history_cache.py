@@ -0,0 +1,127 @@
+"""会話履歴のインメモリLRUキャッシュ"""
+
+from collections import OrderedDict
+
+DEFAULT_MAX_CONVERSATIONS = 256
+
+
+class HistoryLoad:
+    """DBからの履歴の読み込み（読み込み中に会話が更新されたかを記録する）"""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.stale = False
+
+
+class ConversationHistoryCache:
+    """
+    会話ごとのプロンプト用履歴を保持するLRUキャッシュ
+
+    /api/chat のたびにDBから会話全体を読み直さないよう、最近使われた会話の
+    履歴をメモリに保持する。保存したターンは append_turn で追記し、
+    会話の削除時は invalidate で破棄する。DBからの読み込みは begin_load で
+    開始し、読み込み中に追記や破棄があった場合は put で登録しない
+    （読み込んだ履歴に並行して保存したターンが欠けている可能性があるため）。
+    """
+
+    def __init__(self, max_conversations: int = DEFAULT_MAX_CONVERSATIONS):
+        """
+        ConversationHistoryCacheを初期化
+
+        Args:
+            max_conversations: 保持する会話数の上限（0の場合はキャッシュしない）
+        """
+        self.max_conversations = max_conversations
+        self._entries: OrderedDict[str, list[dict[str, str]]] = OrderedDict()
+        # 会話ID -> 実行中の読み込み
+        self._loads: dict[str, list[HistoryLoad]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, conversation_id: str) -> list[dict[str, str]] | None:
+        """
+        キャッシュ済みの履歴を取得する
+
+        Returns:
+            履歴のコピー。キャッシュに無い場合はNone
+        """
+        history = self._entries.get(conversation_id)
+        if history is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(conversation_id)
+        self.hits += 1
+        return list(history)
+
+    def begin_load(self, conversation_id: str) -> HistoryLoad:
+        """
+        DBからの履歴の読み込みを開始する
+
+        Returns:
+            putに渡す読み込み。登録しない場合はend_loadで終了する
+        """
+        load = HistoryLoad(conversation_id)
+        self._loads.setdefault(conversation_id, []).append(load)
+        return load
+
+    def end_load(self, load: HistoryLoad) -> None:
+        """読み込みを終了する（putの後や読み込みの失敗時に呼んでもよい）。"""
+        loads = self._loads.get(load.conversation_id)
+        if loads is None or load not in loads:
+            return
+        loads.remove(load)
+        if not loads:
+            del self._loads[load.conversation_id]
+
+    def put(
+        self,
+        conversation_id: str,
+        history: list[dict[str, str]],
+        load: HistoryLoad | None = None,
+    ) -> None:
+        """
+        DBから読み込んだ履歴を登録し、上限を超えた古い会話を追い出す
+
+        Args:
+            conversation_id: 会話ID
+            history: 読み込んだ履歴
+            load: begin_loadで開始した読み込み。読み込み中に会話が更新された
+                場合は登録しない
+        """
+        if load is not None:
+            self.end_load(load)
+            if load.stale:
+                return
+        self._entries[conversation_id] = list(history)
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    def append_turn(
+        self, conversation_id: str, user_content: str, assistant_content: str
+    ) -> None:
+        """
+        保存した1往復分を履歴に追記する
+
+        キャッシュに無い会話は何もしない（次回の取得時にDBから読み込む）。
+        """
+        self._mark_loads_stale(conversation_id)
+        history = self._entries.get(conversation_id)
+        if history is None:
+            return
+
+        history.append({"role": "user", "content": user_content})
+        history.append({"role": "assistant", "content": assistant_content})
+
+    def invalidate(self, conversation_id: str) -> None:
+        """会話の履歴をキャッシュから破棄する。"""
+        self._mark_loads_stale(conversation_id)
+        self._entries.pop(conversation_id, None)
+
+    def _mark_loads_stale(self, conversation_id: str) -> None:
+        for load in self._loads.get(conversation_id, ()):
+            load.stale = True
@@ -1,32 +1,113 @@
 """メッセージ/会話リポジトリ"""
 
 import logging
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 from uuid import uuid4
 
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import (
+    Connection,
+    create_engine,
+    event,
+    inspect,
+    select,
+    text,
+    tuple_,
+)
 from sqlalchemy.orm import Session, sessionmaker
 
-from app.models.message import Base, Conversation, Message
+from app.models.message import (
+    Base,
+    CachedResponse,
+    Conversation,
+    Message,
+    RollingSummary,
+    utc_now,
+)
+from app.repositories.pagination import decode_cursor
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONVERSATION_TITLE = "新しいチャット"
 LEGACY_CONVERSATION_ID = "legacy-imported"
 LEGACY_CONVERSATION_TITLE = "インポート済み履歴"
+LAST_MESSAGE_PREVIEW_LENGTH = 80
+
+# (updated_at, id)の複合インデックスに置き換えたインデックス
+OBSOLETE_INDEXES = ("ix_conversations_updated_at",)
+
+# 既存DBに追加する会話統計カラム（カラム名, DDL）
+CONVERSATION_STATS_COLUMNS = (
+    ("message_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("last_message_preview", "VARCHAR NOT NULL DEFAULT ''"),
+    ("last_message_at", "DATETIME"),
+)
+
+# 接続ごとに適用するSQLiteのPRAGMAプロファイル
+SQLITE_PRAGMA_PROFILES: dict[str, dict[str, str | int]] = {
+    # WALで読み取りと書き込みを並行させ、コミット毎のfsyncを省く
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # 負値はKiB単位（64MiB）
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+    # SQLiteのデフォルト設定のまま
+    "none": {},
+}
+DEFAULT_SQLITE_PRAGMA_PROFILE = "tuned"
 
 
 class MessageRepository:
     """メッセージ/会話リポジトリ"""
 
-    def __init__(self, db_url: str = "sqlite:///./chat.db"):
+    def __init__(
+        self, db_url: str = "sqlite:///./chat.db", pragma_profile: str | None = None
+    ):
+        """
+        MessageRepositoryを初期化
+
+        Args:
+            db_url: データベースURL
+            pragma_profile: SQLITE_PRAGMA_PROFILESのプロファイル名。
+                Noneの場合は環境変数SQLITE_PRAGMA_PROFILEから読み込む
+
+        Raises:
+            ValueError: 未知のプロファイル名が指定された場合
+        """
+        profile_name = pragma_profile or os.getenv(
+            "SQLITE_PRAGMA_PROFILE", DEFAULT_SQLITE_PRAGMA_PROFILE
+        )
+        if profile_name not in SQLITE_PRAGMA_PROFILES:
+            raise ValueError(f"Unknown SQLite pragma profile: {profile_name}")
+
         self.engine = create_engine(db_url, connect_args={"check_same_thread": False})
+        if self.engine.dialect.name == "sqlite":
+            self._register_pragmas(SQLITE_PRAGMA_PROFILES[profile_name])
         Base.metadata.create_all(self.engine)
         self.SessionLocal = sessionmaker(
             bind=self.engine, autocommit=False, autoflush=False
         )
         self._migrate_schema()
 
+    def _register_pragmas(self, pragmas: dict[str, str | int]) -> None:
+        """新しいDB接続ごとにPRAGMAを適用するリスナーを登録する。"""
+        if not pragmas:
+            return
+
+        statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+
+        @event.listens_for(self.engine, "connect")
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+            finally:
+                cursor.close()
+
     def _migrate_schema(self) -> None:
         """既存DBへのスキーマ移行を実行する。"""
         inspector = inspect(self.engine)
@@ -35,6 +116,9 @@ class MessageRepository:
             return
 
         message_columns = {col["name"] for col in inspector.get_columns("messages")}
+        conversation_columns = {
+            col["name"] for col in inspector.get_columns("conversations")
+        }
 
         with self.engine.begin() as connection:
             if "conversation_id" not in message_columns:
@@ -42,6 +126,14 @@ class MessageRepository:
                 connection.execute(
                     text("ALTER TABLE messages ADD COLUMN conversation_id VARCHAR")
                 )
+            if "truncated" not in message_columns:
+                logger.info("Adding truncated column to messages table")
+                connection.execute(
+                    text(
+                        "ALTER TABLE messages "
+                        "ADD COLUMN truncated BOOLEAN NOT NULL DEFAULT 0"
+                    )
+                )
 
             connection.execute(
                 text(
@@ -54,8 +146,62 @@ class MessageRepository:
                 {"legacy_id": LEGACY_CONVERSATION_ID},
             )
 
+            missing_stats_columns = [
+                (name, ddl)
+                for name, ddl in CONVERSATION_STATS_COLUMNS
+                if name not in conversation_columns
+            ]
+            for name, ddl in missing_stats_columns:
+                logger.info("Adding %s column to conversations table", name)
+                connection.execute(
+                    text(f"ALTER TABLE conversations ADD COLUMN {name} {ddl}")
+                )
+            if missing_stats_columns:
+                logger.info("Backfilling conversation stats columns")
+                self._backfill_conversation_stats(connection)
+
+            for index_name in OBSOLETE_INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+            # create_allは既存テーブルにインデックスを追加しないため個別に作成する
+            for table in (Conversation.__table__, Message.__table__):
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
         self._ensure_legacy_conversation_record()
 
+    def _backfill_conversation_stats(
+        self, connection: Connection, conversation_id: str | None = None
+    ) -> None:
+        """messagesテーブルから会話の統計カラムを再計算する。"""
+        statement = """
+            UPDATE conversations
+            SET
+                message_count = (
+                    SELECT COUNT(*) FROM messages
+                    WHERE messages.conversation_id = conversations.id
+                ),
+                last_message_preview = COALESCE(
+                    (
+                        SELECT substr(messages.content, 1, :preview_length)
+                        FROM messages
+                        WHERE messages.conversation_id = conversations.id
+                        ORDER BY messages.timestamp DESC, messages.id DESC
+                        LIMIT 1
+                    ),
+                    ''
+                ),
+                last_message_at = (
+                    SELECT MAX(messages.timestamp) FROM messages
+                    WHERE messages.conversation_id = conversations.id
+                )
+        """
+        params: dict = {"preview_length": LAST_MESSAGE_PREVIEW_LENGTH}
+        if conversation_id is not None:
+            statement += " WHERE conversations.id = :conversation_id"
+            params["conversation_id"] = conversation_id
+        connection.execute(text(statement), params)
+
     def _ensure_legacy_conversation_record(self) -> None:
         """legacy-imported の会話レコードを必要に応じて作成する。"""
         session: Session = self.SessionLocal()
@@ -73,13 +219,13 @@ class MessageRepository:
             first_message = (
                 session.query(Message)
                 .filter(Message.conversation_id == LEGACY_CONVERSATION_ID)
-                .order_by(Message.timestamp.asc())
+                .order_by(Message.timestamp.asc(), Message.id.asc())
                 .first()
             )
             last_message = (
                 session.query(Message)
                 .filter(Message.conversation_id == LEGACY_CONVERSATION_ID)
-                .order_by(Message.timestamp.desc())
+                .order_by(Message.timestamp.desc(), Message.id.desc())
                 .first()
             )
 
@@ -97,6 +243,10 @@ class MessageRepository:
             else:
                 conversation.updated_at = last_message.timestamp
 
+            session.flush()
+            self._backfill_conversation_stats(
+                session.connection(), LEGACY_CONVERSATION_ID
+            )
             session.commit()
         finally:
             session.close()
@@ -107,6 +257,35 @@ class MessageRepository:
             return DEFAULT_CONVERSATION_TITLE
         return title[:40]
 
+    def _get_or_create_conversation(
+        self, session: Session, conversation_id: str
+    ) -> Conversation:
+        """セッション内で会話を取得し、無ければ作成して追加する。"""
+        conversation = session.get(Conversation, conversation_id)
+        if conversation is None:
+            now = utc_now()
+            conversation = Conversation(
+                id=conversation_id,
+                title=DEFAULT_CONVERSATION_TITLE,
+                created_at=now,
+                updated_at=now,
+            )
+            session.add(conversation)
+        return conversation
+
+    def _apply_message_to_conversation(
+        self, conversation: Conversation, message: Message
+    ) -> None:
+        """追加されたメッセージを会話のタイトル・統計カラムへ反映する。"""
+        if message.role == "user" and conversation.title == DEFAULT_CONVERSATION_TITLE:
+            conversation.title = self._build_title(message.content)
+        conversation.message_count = (conversation.message_count or 0) + 1
+        conversation.last_message_preview = message.content[
+            :LAST_MESSAGE_PREVIEW_LENGTH
+        ]
+        conversation.last_message_at = message.timestamp
+        conversation.updated_at = message.timestamp
+
     def create_conversation(
         self,
         title: str = DEFAULT_CONVERSATION_TITLE,
@@ -115,7 +294,7 @@ class MessageRepository:
         """会話を作成する。"""
         session: Session = self.SessionLocal()
         try:
-            now = datetime.utcnow()
+            now = utc_now()
             conversation = Conversation(
                 id=conversation_id or str(uuid4()),
                 title=title,
@@ -151,6 +330,9 @@ class MessageRepository:
             session.query(Message).filter(
                 Message.conversation_id == conversation_id
             ).delete()
+            session.query(RollingSummary).filter(
+                RollingSummary.conversation_id == conversation_id
+            ).delete()
             session.delete(conversation)
             session.commit()
             return True
@@ -166,7 +348,7 @@ class MessageRepository:
         try:
             conversation = session.get(Conversation, conversation_id)
             if conversation is None:
-                now = datetime.utcnow()
+                now = utc_now()
                 conversation = Conversation(
                     id=conversation_id,
                     title=DEFAULT_CONVERSATION_TITLE,
@@ -193,28 +375,18 @@ class MessageRepository:
         """メッセージを保存する。"""
         session: Session = self.SessionLocal()
         try:
-            conversation = session.get(Conversation, conversation_id)
-            if conversation is None:
-                now = datetime.utcnow()
-                conversation = Conversation(
-                    id=conversation_id,
-                    title=DEFAULT_CONVERSATION_TITLE,
-                    created_at=now,
-                    updated_at=now,
-                )
-                session.add(conversation)
+            conversation = self._get_or_create_conversation(session, conversation_id)
 
+            now = utc_now()
             message = Message(
                 conversation_id=conversation_id,
                 role=role,
                 content=content,
                 model=model,
+                timestamp=now,
             )
             session.add(message)
-
-            if role == "user" and conversation.title == DEFAULT_CONVERSATION_TITLE:
-                conversation.title = self._build_title(content)
-            conversation.updated_at = datetime.utcnow()
+            self._apply_message_to_conversation(conversation, message)
 
             session.commit()
             session.refresh(message)
@@ -233,53 +405,344 @@ class MessageRepository:
         finally:
             session.close()
 
-    def get_messages_by_conversation(self, conversation_id: str) -> list[Message]:
-        """会話ID単位でメッセージを取得する。"""
+    def save_turn(
+        self,
+        user_content: str,
+        assistant_content: str,
+        model: str,
+        conversation_id: str = LEGACY_CONVERSATION_ID,
+        truncated: bool = False,
+    ) -> tuple[Message, Message]:
+        """
+        1往復分（ユーザー/アシスタント）のメッセージを1トランザクションで保存する。
+
+        会話の取得、2件のINSERT、会話の更新を1回のコミットで行い、
+        コミット後のrefreshによる再読み込みも行わない。
+        truncatedがTrueの場合、アシスタント応答を途中終了として記録する。
+        """
+        session: Session = self.SessionLocal(expire_on_commit=False)
+        try:
+            conversation = self._get_or_create_conversation(session, conversation_id)
+
+            now = utc_now()
+            messages = (
+                Message(
+                    conversation_id=conversation_id,
+                    role="user",
+                    content=user_content,
+                    model=model,
+                    timestamp=now,
+                ),
+                Message(
+                    conversation_id=conversation_id,
+                    role="assistant",
+                    content=assistant_content,
+                    model=model,
+                    # 時刻順で並べたときに必ずユーザー発言が先になるよう、わずかに後ろにずらす
+                    timestamp=now + timedelta(microseconds=1),
+                    truncated=truncated,
+                ),
+            )
+            session.add_all(messages)
+            for message in messages:
+                self._apply_message_to_conversation(conversation, message)
+
+            session.commit()
+            logger.info(
+                "Turn saved: ids=%s, conversation_id=%s, model=%s",
+                [message.id for message in messages],
+                conversation_id,
+                model,
+            )
+            return messages
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to save turn: {e}")
+            raise
+        finally:
+            session.close()
+
+    def save_messages(self, entries: list[dict]) -> list[Message]:
+        """
+        複数会話にまたがるメッセージを1トランザクションでまとめて保存する。
+
+        Args:
+            entries: Messageのカラム名をキーとする辞書のリスト
+                （role, content, model, conversation_id, 任意でtimestamp）
+
+        Returns:
+            保存したメッセージのリスト（entriesと同じ順序）
+        """
+        session: Session = self.SessionLocal(expire_on_commit=False)
+        try:
+            conversations: dict[str, Conversation] = {}
+            messages = []
+            for entry in entries:
+                conversation_id = entry.get("conversation_id", LEGACY_CONVERSATION_ID)
+                conversation = conversations.get(conversation_id)
+                if conversation is None:
+                    conversation = self._get_or_create_conversation(
+                        session, conversation_id
+                    )
+                    conversations[conversation_id] = conversation
+
+                message = Message(
+                    **{
+                        "timestamp": utc_now(),
+                        **entry,
+                        "conversation_id": conversation_id,
+                    }
+                )
+                session.add(message)
+                self._apply_message_to_conversation(conversation, message)
+                messages.append(message)
+
+            session.commit()
+            logger.info(
+                "Message batch saved: messages=%s, conversations=%s",
+                len(messages),
+                len(conversations),
+            )
+            return messages
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to save message batch: {e}")
+            raise
+        finally:
+            session.close()
+
+    def get_messages_by_conversation(
+        self,
+        conversation_id: str,
+        limit: int | None = None,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> list[Message]:
+        """
+        会話ID単位でメッセージを時系列順に取得する。
+
+        (timestamp, id)によるキーセットページネーションに対応する。
+        beforeを指定した場合はカーソルより前の直近limit件を返す。
+
+        Raises:
+            ValueError: カーソルの形式が不正な場合
+        """
+        sort_key = tuple_(Message.timestamp, Message.id)
         session: Session = self.SessionLocal()
         try:
-            return (
-                session.query(Message)
-                .filter(Message.conversation_id == conversation_id)
-                .order_by(Message.timestamp.asc())
-                .all()
+            query = session.query(Message).filter(
+                Message.conversation_id == conversation_id
             )
+            if after is not None:
+                query = query.filter(sort_key > tuple_(*decode_cursor(after)))
+            if before is not None:
+                query = query.filter(sort_key < tuple_(*decode_cursor(before)))
+                query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+            else:
+                query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+            if limit is not None:
+                query = query.limit(limit)
+
+            messages = query.all()
+            if before is not None:
+                messages.reverse()
+            return messages
         finally:
             session.close()
 
-    def get_conversation_summaries(self) -> list[dict]:
-        """会話サマリー一覧を更新日時降順で取得する。"""
+    def get_conversation_history(self, conversation_id: str) -> list[dict[str, str]]:
+        """
+        プロンプト構築用に会話の全メッセージを時系列順に取得する。
+
+        ORMオブジェクトを組み立てず、roleとcontentのみを読み出す。
+
+        Returns:
+            {"role": ..., "content": ...}形式のメッセージリスト
+        """
         session: Session = self.SessionLocal()
         try:
-            conversations = (
-                session.query(Conversation)
-                .order_by(Conversation.updated_at.desc())
-                .all()
+            rows = session.execute(
+                select(Message.role, Message.content)
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.timestamp.asc(), Message.id.asc())
             )
+            return [{"role": role, "content": content} for role, content in rows]
+        finally:
+            session.close()
+
+    def get_rolling_summary(self, conversation_id: str) -> RollingSummary | None:
+        """会話の古いメッセージの要約を取得する。"""
+        session: Session = self.SessionLocal()
+        try:
+            return session.get(RollingSummary, conversation_id)
+        finally:
+            session.close()
 
-            summaries = []
-            for conversation in conversations:
-                messages = (
-                    session.query(Message)
-                    .filter(Message.conversation_id == conversation.id)
-                    .order_by(Message.timestamp.asc())
-                    .all()
+    def save_rolling_summary(
+        self, conversation_id: str, content: str, summarized_count: int, model: str
+    ) -> RollingSummary | None:
+        """
+        会話の要約を保存する
+
+        既存の要約より古い（要約済み件数が少ない）場合や、
+        会話が削除済みの場合は保存しない。
+
+        Returns:
+            保存した要約。保存しなかった場合はNone
+        """
+        session: Session = self.SessionLocal(expire_on_commit=False)
+        try:
+            if session.get(Conversation, conversation_id) is None:
+                return None
+
+            summary = session.get(RollingSummary, conversation_id)
+            if summary is None:
+                summary = RollingSummary(conversation_id=conversation_id)
+                session.add(summary)
+            elif summary.summarized_count >= summarized_count:
+                return None
+
+            summary.content = content
+            summary.summarized_count = summarized_count
+            summary.model = model
+            summary.updated_at = utc_now()
+            session.commit()
+            return summary
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get_cached_response(self, key: str) -> CachedResponse | None:
+        """
+        キャッシュした応答を取得する
+
+        期限切れの応答は削除してNoneを返す。
+        """
+        session: Session = self.SessionLocal()
+        try:
+            cached = session.get(CachedResponse, key)
+            if cached is not None and cached.expires_at <= utc_now():
+                session.delete(cached)
+                session.commit()
+                return None
+            return cached
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def save_cached_response(
+        self, key: str, model: str, chunks: str, expires_at: datetime
+    ) -> None:
+        """
+        応答をキャッシュに保存する（同じキーの応答は上書きする）
+
+        Args:
+            key: プロンプトのハッシュ
+            model: 応答したモデル
+            chunks: 応答のチャンク列（JSON配列）
+            expires_at: 有効期限（UTC）
+        """
+        session: Session = self.SessionLocal()
+        try:
+            session.merge(
+                CachedResponse(
+                    key=key,
+                    model=model,
+                    chunks=chunks,
+                    created_at=utc_now(),
+                    expires_at=expires_at,
                 )
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
 
-                last_preview = ""
-                if messages:
-                    last_preview = messages[-1].content[:80]
-
-                summaries.append(
-                    {
-                        "id": conversation.id,
-                        "title": conversation.title,
-                        "created_at": conversation.created_at,
-                        "updated_at": conversation.updated_at,
-                        "message_count": len(messages),
-                        "last_message_preview": last_preview,
-                    }
+    def prune_cached_responses(self, max_entries: int) -> int:
+        """
+        期限切れの応答と、新しい順にmax_entries件を超える古い応答を削除する
+
+        Args:
+            max_entries: 残す応答の最大数
+
+        Returns:
+            削除した応答数
+        """
+        session: Session = self.SessionLocal()
+        try:
+            deleted = (
+                session.query(CachedResponse)
+                .filter(CachedResponse.expires_at <= utc_now())
+                .delete(synchronize_session=False)
+            )
+            newest = (
+                select(CachedResponse.key)
+                .order_by(CachedResponse.created_at.desc())
+                .limit(max_entries)
+            )
+            deleted += (
+                session.query(CachedResponse)
+                .filter(CachedResponse.key.not_in(newest))
+                .delete(synchronize_session=False)
+            )
+            session.commit()
+            return deleted
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get_conversation_summaries(
+        self,
+        limit: int | None = None,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> list[dict]:
+        """
+        会話サマリー一覧を更新日時降順で取得する。
+
+        (updated_at, id)によるキーセットページネーションに対応する。
+        afterは一覧順で後ろ（より古い会話）、beforeは前（より新しい会話）を返す。
+
+        Raises:
+            ValueError: カーソルの形式が不正な場合
+        """
+        sort_key = tuple_(Conversation.updated_at, Conversation.id)
+        session: Session = self.SessionLocal()
+        try:
+            # 統計カラムは書き込み時に更新済みのため会話テーブルのみを読む
+            statement = select(
+                Conversation.id,
+                Conversation.title,
+                Conversation.created_at,
+                Conversation.updated_at,
+                Conversation.message_count,
+                Conversation.last_message_preview,
+            )
+            if after is not None:
+                statement = statement.where(sort_key < tuple_(*decode_cursor(after)))
+            if before is not None:
+                statement = statement.where(sort_key > tuple_(*decode_cursor(before)))
+                statement = statement.order_by(
+                    Conversation.updated_at.asc(), Conversation.id.asc()
+                )
+            else:
+                statement = statement.order_by(
+                    Conversation.updated_at.desc(), Conversation.id.desc()
                 )
+            if limit is not None:
+                statement = statement.limit(limit)
 
+            summaries = [dict(row._mapping) for row in session.execute(statement)]
+            if before is not None:
+                summaries.reverse()
             return summaries
         finally:
             session.close()
@@ -288,7 +751,9 @@ class MessageRepository:
         """全メッセージを取得する（互換維持）。"""
         session: Session = self.SessionLocal()
         try:
-            messages = session.query(Message).order_by(Message.timestamp).all()
+            messages = (
+                session.query(Message).order_by(Message.timestamp, Message.id).all()
+            )
             logger.info("Retrieved %s messages", len(messages))
             return messages
         finally:
@@ -0,0 +1,240 @@
+"""メッセージ保存のライトビハインドキュー"""
+
+import asyncio
+import contextlib
+import logging
+from datetime import timedelta
+
+from app.models.message import utc_now
+from app.repositories.async_message_repository import AsyncMessageRepository
+from app.repositories.message_repository import LEGACY_CONVERSATION_ID
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL_MS = 50
+DEFAULT_MAX_BATCH_SIZE = 100
+
+# キューに積むと収集中のバッチを即座にコミットさせるマーカー
+_FLUSH = object()
+
+
+class _PendingWrite:
+    """キュー内の保存要求（1回のsave呼び出し分）"""
+
+    def __init__(self, entries: list[dict], future: asyncio.Future):
+        self.entries = entries
+        self.future = future
+
+    @property
+    def conversation_ids(self) -> set[str]:
+        return {entry["conversation_id"] for entry in self.entries}
+
+
+class MessageWriteQueue:
+    """
+    メッセージ保存のライトビハインドキュー
+
+    複数ストリームからの保存要求をasyncio.Queueに積み、単一のライタータスクが
+    flush_interval_msごと、またはmax_batch_size件ごとに1トランザクションで
+    まとめてコミットする。SQLiteの書き込み回数がfsync待ちではなく
+    同時ユーザー数に応じてスケールする。
+    """
+
+    def __init__(
+        self,
+        repository: AsyncMessageRepository,
+        flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ):
+        """
+        MessageWriteQueueを初期化
+
+        Args:
+            repository: バッチ書き込みに使用する非同期リポジトリ
+            flush_interval_ms: 最初の要求からコミットまで待つ最大時間（ミリ秒）
+            max_batch_size: 1トランザクションでコミットする最大メッセージ数
+        """
+        self.repository = repository
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: set[_PendingWrite] = set()
+        self._writer_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """ライタータスクを起動する。"""
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """未コミットの要求をすべて書き込んでからライタータスクを停止する。"""
+        await self.flush()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._writer_task
+            self._writer_task = None
+
+    async def save_message(
+        self,
+        role: str,
+        content: str,
+        model: str,
+        conversation_id: str = LEGACY_CONVERSATION_ID,
+    ) -> asyncio.Future:
+        """
+        メッセージの保存要求をキューに積む
+
+        Returns:
+            コミット完了時に解決されるFuture（待たなくてもよい）。
+            書き込みに失敗した場合は例外が設定される
+        """
+        return self._enqueue([self._build_entry(role, content, model, conversation_id)])
+
+    async def save_turn(
+        self,
+        user_content: str,
+        assistant_content: str,
+        model: str,
+        conversation_id: str = LEGACY_CONVERSATION_ID,
+        truncated: bool = False,
+    ) -> asyncio.Future:
+        """
+        1往復分のメッセージの保存要求をキューに積む
+
+        2件は同じバッチでコミットされる。
+        truncatedがTrueの場合、アシスタント応答を途中終了として記録する。
+
+        Returns:
+            コミット完了時に解決されるFuture（待たなくてもよい）。
+            書き込みに失敗した場合は例外が設定される
+        """
+        user_entry = self._build_entry("user", user_content, model, conversation_id)
+        assistant_entry = self._build_entry(
+            "assistant", assistant_content, model, conversation_id
+        )
+        # 時刻順で並べたときに必ずユーザー発言が先になるよう、応答側をわずかに後ろにずらす
+        assistant_entry["timestamp"] = user_entry["timestamp"] + timedelta(
+            microseconds=1
+        )
+        assistant_entry["truncated"] = truncated
+        return self._enqueue([user_entry, assistant_entry])
+
+    async def flush(self, conversation_id: str | None = None) -> None:
+        """
+        未コミットの要求が書き込まれるまで待つ
+
+        書き込みに失敗した要求があっても例外は送出しない（失敗は各要求のFutureで通知する）。
+
+        Args:
+            conversation_id: 指定した場合はその会話の要求のみを待つ
+        """
+        futures = [
+            pending.future
+            for pending in self._pending
+            if conversation_id is None or conversation_id in pending.conversation_ids
+        ]
+        if not futures:
+            return
+
+        self._queue.put_nowait(_FLUSH)
+        await asyncio.wait(futures)
+
+    def _build_entry(
+        self, role: str, content: str, model: str, conversation_id: str
+    ) -> dict:
+        return {
+            "role": role,
+            "content": content,
+            "model": model,
+            "conversation_id": conversation_id,
+            # 保存順序を保つため、コミット時ではなく受付時刻を記録する
+            "timestamp": utc_now(),
+        }
+
+    def _enqueue(self, entries: list[dict]) -> asyncio.Future:
+        if self._writer_task is None:
+            raise RuntimeError("MessageWriteQueue is not started")
+
+        pending = _PendingWrite(entries, asyncio.get_running_loop().create_future())
+        self._pending.add(pending)
+        self._queue.put_nowait(pending)
+        return pending.future
+
+    async def _run(self) -> None:
+        """キューからバッチを収集して書き込み続ける。"""
+        while True:
+            batch = await self._collect_batch()
+            if batch:
+                await self._write_batch(batch)
+
+    async def _collect_batch(self) -> list[_PendingWrite]:
+        """最初の要求からflush_intervalの間、またはmax_batch_size件まで収集する。"""
+        first = await self._queue.get()
+        if first is _FLUSH:
+            return []
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = [first]
+        message_count = len(first.entries)
+
+        while message_count < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except TimeoutError:
+                break
+            if item is _FLUSH:
+                break
+            batch.append(item)
+            message_count += len(item.entries)
+
+        return batch
+
+    async def _write_batch(self, batch: list[_PendingWrite]) -> None:
+        """
+        バッチを1トランザクションで書き込み、各要求のFutureを解決する
+
+        バッチの書き込みに失敗した場合は、1件の不正な要求でバッチ全体を
+        失わないよう要求ごとに書き込み直し、それでも失敗した要求の
+        Futureに例外を設定する。
+        """
+        entries = [entry for pending in batch for entry in pending.entries]
+        try:
+            await self.repository.save_messages(entries)
+        except Exception as e:
+            if len(batch) == 1:
+                self._fail(batch[0], e)
+                return
+            logger.warning(
+                "Failed to write message batch, retrying %d writes: %s", len(batch), e
+            )
+            for pending in batch:
+                try:
+                    await self.repository.save_messages(pending.entries)
+                except Exception as retry_error:
+                    self._fail(pending, retry_error)
+                else:
+                    self._resolve(pending)
+        else:
+            for pending in batch:
+                self._resolve(pending)
+
+    def _resolve(self, pending: _PendingWrite) -> None:
+        self._pending.discard(pending)
+        if not pending.future.done():
+            pending.future.set_result(None)
+
+    def _fail(self, pending: _PendingWrite, error: Exception) -> None:
+        # データベースエラーはストリーミング中のユーザーに影響させず、Futureで通知する
+        logger.error(
+            "Failed to write messages for %s: %s",
+            ", ".join(sorted(pending.conversation_ids)),
+            error,
+        )
+        self._pending.discard(pending)
+        if not pending.future.done():
+            pending.future.set_exception(error)
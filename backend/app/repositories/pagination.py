@@ -0,0 +1,41 @@
+"""キーセットページネーション用カーソル"""
+
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(sort_value: datetime, key: int | str) -> str:
+    """
+    並び順の値と一意キーから不透明なカーソル文字列を生成する
+
+    Args:
+        sort_value: 並び替えに使用する日時
+        key: 同一日時の行を区別する一意キー
+
+    Returns:
+        URLセーフなカーソル文字列
+    """
+    payload = json.dumps([sort_value.isoformat(), key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int | str]:
+    """
+    カーソル文字列を(並び順の値, 一意キー)に復元する
+
+    Args:
+        cursor: encode_cursorで生成したカーソル文字列
+
+    Returns:
+        (日時, 一意キー)のタプル
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, key = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), key
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -2,11 +2,26 @@
 ビジネスロジックとLLMサービス
 """
 
-from .claude_provider import ClaudeProvider
-from .google_provider import GoogleProvider
+from .admission import AdmissionController, AdmissionError
+from .context_window import ContextWindowManager
+from .conversation_summarizer import ConversationSummarizer
 from .llm_provider import LLMProvider
 from .llm_service import LLMService
-from .openai_provider import OpenAIProvider
+from .provider_registry import PROVIDER_SPECS, ProviderRegistry, load_provider_class
+from .stream_events import StreamEvent
+
+# プロバイダーの実装はSDKを読み込むため、属性として参照されたときに読み込む
+_LAZY_PROVIDERS = {
+    class_name: module for module, class_name, _ in PROVIDER_SPECS.values()
+}
+
+
+def __getattr__(name: str):
+    module = _LAZY_PROVIDERS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return load_provider_class(module, name)
+
 
 __all__ = [
     "LLMService",
@@ -14,4 +29,11 @@ __all__ = [
     "OpenAIProvider",
     "ClaudeProvider",
     "GoogleProvider",
+    "MockProvider",
+    "ProviderRegistry",
+    "ContextWindowManager",
+    "ConversationSummarizer",
+    "AdmissionController",
+    "AdmissionError",
+    "StreamEvent",
 ]
@@ -0,0 +1,267 @@
+import asyncio
+import contextlib
+import logging
+import os
+from collections import deque
+from collections.abc import AsyncIterator
+
+from .stream_events import StreamEvent, queue_event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER_MAX_CONCURRENCY = 32
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_QUEUE_TIMEOUT = 30.0
+# 待機中に順番の変化を通知する間隔（秒）
+QUEUE_POSITION_INTERVAL = 1.0
+
+
+class AdmissionError(Exception):
+    """同時実行数の上限により受け付けられなかったリクエスト"""
+
+
+class QueueFullError(AdmissionError):
+    """待ち行列が上限に達している"""
+
+
+class QueueTimeoutError(AdmissionError):
+    """待ち行列でタイムアウトした"""
+
+
+class ConcurrencyLimiter:
+    """
+    同時実行数の上限とFIFOの待ち行列
+
+    asyncio.Semaphoreと異なり、待ち行列の長さに上限を設け、
+    待機中のリクエストの順番を参照できる。
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        """
+        ConcurrencyLimiterを初期化
+
+        Args:
+            name: ログ用の名前（プロバイダー名またはモデル名）
+            max_concurrency: 同時実行数の上限
+            max_queue: 待ち行列の長さの上限
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> asyncio.Future | None:
+        """
+        実行枠を取得する
+
+        Returns:
+            取得できた場合はNone。待機が必要な場合は枠が割り当てられると
+            解決されるFuture（waitに渡す）
+
+        Raises:
+            QueueFullError: 待ち行列が上限に達している場合
+        """
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return None
+
+        if len(self._waiters) >= self.max_queue:
+            raise QueueFullError(f"Admission queue for {self.name} is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return waiter
+
+    def acquire_nowait(self) -> bool:
+        """待たずに取得できる場合のみ実行枠を取得する。"""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    def position(self, waiter: asyncio.Future) -> int:
+        """待ち行列での順番（1始まり）を返す。実行枠が割り当て済みの場合は0。"""
+        try:
+            return self._waiters.index(waiter) + 1
+        except ValueError:
+            return 0
+
+    def cancel(self, waiter: asyncio.Future) -> None:
+        """待機を取りやめる（割り当て済みの枠は解放する）。"""
+        if waiter.done() and not waiter.cancelled():
+            self.release()
+            return
+        waiter.cancel()
+        with contextlib.suppress(ValueError):
+            self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        """実行枠を返却し、待ち行列の先頭に引き渡す。"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # 実行数は変えずに枠をそのまま引き渡す
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """
+    プロバイダー単位とモデル単位の同時実行数を制限する
+
+    上限を超えたリクエストはFIFOの待ち行列で待機し、待機中は順番を
+    StreamEventとして通知する。過負荷時にはエラーではなく待ち時間として表れる。
+    """
+
+    def __init__(
+        self,
+        provider_max_concurrency: int | None = None,
+        model_max_concurrency: dict[str, int] | None = None,
+        max_queue: int | None = None,
+        queue_timeout: float | None = None,
+    ):
+        """
+        AdmissionControllerを初期化
+
+        Args:
+            provider_max_concurrency: プロバイダーごとの同時実行数の上限。
+                Noneの場合は環境変数PROVIDER_MAX_CONCURRENCY
+            model_max_concurrency: モデルごとの同時実行数の上限。Noneの場合は
+                環境変数MODEL_MAX_CONCURRENCY（"gpt-5.2-pro=4,claude-opus-4-5=8"形式）
+            max_queue: 待ち行列の長さの上限。Noneの場合は環境変数ADMISSION_MAX_QUEUE
+            queue_timeout: 待機のタイムアウト秒数。Noneの場合は
+                環境変数ADMISSION_QUEUE_TIMEOUT
+        """
+        self.provider_max_concurrency = provider_max_concurrency or int(
+            os.getenv("PROVIDER_MAX_CONCURRENCY", DEFAULT_PROVIDER_MAX_CONCURRENCY)
+        )
+        if model_max_concurrency is None:
+            model_max_concurrency = parse_limits(os.getenv("MODEL_MAX_CONCURRENCY", ""))
+        self.model_max_concurrency = model_max_concurrency
+        self.max_queue = max_queue or int(
+            os.getenv("ADMISSION_MAX_QUEUE", DEFAULT_MAX_QUEUE)
+        )
+        self.queue_timeout = queue_timeout or float(
+            os.getenv("ADMISSION_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)
+        )
+        self._limiters: dict[str, ConcurrencyLimiter] = {}
+
+    def limiters_for(self, provider_name: str, model: str) -> list[ConcurrencyLimiter]:
+        """リクエストが取得すべき実行枠を取得順に返す（モデル→プロバイダー）。"""
+        limiters = []
+        if model in self.model_max_concurrency:
+            limiters.append(
+                self._limiter(f"model:{model}", self.model_max_concurrency[model])
+            )
+        limiters.append(
+            self._limiter(f"provider:{provider_name}", self.provider_max_concurrency)
+        )
+        return limiters
+
+    def _limiter(self, key: str, max_concurrency: int) -> ConcurrencyLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = ConcurrencyLimiter(key, max_concurrency, self.max_queue)
+            self._limiters[key] = limiter
+        return limiter
+
+    def try_admit(self, limiters: list[ConcurrencyLimiter]) -> bool:
+        """
+        待たずに取得できる場合のみ、すべての実行枠を取得する
+
+        ヘッジリクエストのように空きがある場合だけ送る追加のリクエストに使う。
+
+        Returns:
+            取得できた場合True（終了時にrelease()すること）。1つでも空きが
+            無い場合は何も取得せずFalse
+        """
+        acquired = []
+        for limiter in limiters:
+            if not limiter.acquire_nowait():
+                for held in reversed(acquired):
+                    held.release()
+                return False
+            acquired.append(limiter)
+        return True
+
+    async def admit(
+        self, limiters: list[ConcurrencyLimiter], acquired: list[ConcurrencyLimiter]
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        実行枠を順に取得する
+
+        待機が発生した場合は順番の変化と実行開始をqueueイベントで通知する。
+        取得した枠はacquiredに追加するので、呼び出し側は終了時に
+        release()すること（途中で失敗した場合も取得済みの分は含まれる）。
+
+        Raises:
+            QueueFullError: 待ち行列が上限に達している場合
+            QueueTimeoutError: queue_timeout以内に枠を取得できなかった場合
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waited = False
+
+        for limiter in limiters:
+            waiter = limiter.try_acquire()
+            if waiter is None:
+                acquired.append(limiter)
+                continue
+
+            waited = True
+            try:
+                last_position = None
+                while not waiter.done():
+                    position = limiter.position(waiter)
+                    if position != last_position:
+                        last_position = position
+                        yield queue_event(position, _elapsed_ms(loop, started))
+
+                    remaining = started + self.queue_timeout - loop.time()
+                    if remaining <= 0:
+                        raise QueueTimeoutError(
+                            f"Timed out waiting for {limiter.name} after "
+                            f"{self.queue_timeout}s"
+                        )
+                    with contextlib.suppress(TimeoutError):
+                        await asyncio.wait_for(
+                            asyncio.shield(waiter),
+                            min(remaining, QUEUE_POSITION_INTERVAL),
+                        )
+            except BaseException:
+                limiter.cancel(waiter)
+                raise
+            acquired.append(limiter)
+
+        if waited:
+            wait_ms = _elapsed_ms(loop, started)
+            logger.info("Admitted after waiting %sms", wait_ms)
+            yield queue_event(0, wait_ms)
+
+
+def _elapsed_ms(loop: asyncio.AbstractEventLoop, started: float) -> int:
+    return int((loop.time() - started) * 1000)
+
+
+def parse_limits(value: str) -> dict[str, int]:
+    """
+    "name=limit,name=limit"形式の設定（モデル名やプロバイダー名ごとの上限）を
+    辞書に変換する
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    limits = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
@@ -0,0 +1,150 @@
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import Callable
+
+from .admission import AdmissionError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_RATE = 0.5
+# 最初のチャンクまでの秒数がこれを超えた呼び出しは失敗と同様に扱う
+DEFAULT_SLOW_CALL_SECONDS = 20.0
+DEFAULT_WINDOW_SIZE = 20
+DEFAULT_MIN_CALLS = 5
+DEFAULT_OPEN_SECONDS = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(AdmissionError):
+    """サーキットブレーカーが開いており、利用できるモデルが無い"""
+
+
+class CircuitBreaker:
+    """
+    プロバイダー単位のサーキットブレーカー
+
+    直近の呼び出し（失敗、または最初のチャンクまでが遅い呼び出し）の割合が
+    閾値を超えると開き、一定時間そのプロバイダーへの送信を止める。
+    時間が経過すると半開状態になり、1件の試行（プローブ）の結果で
+    閉じるか再び開くかを決める。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float | None = None,
+        slow_call_seconds: float | None = None,
+        window_size: int | None = None,
+        min_calls: int | None = None,
+        open_seconds: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        CircuitBreakerを初期化
+
+        引数がNoneの場合は対応する環境変数（CIRCUIT_BREAKER_*）から読み込む。
+
+        Args:
+            name: ログ用の名前（プロバイダー名）
+            failure_rate: 開く条件となる失敗と遅い呼び出しの割合（0〜1）
+            slow_call_seconds: 遅い呼び出しとみなす最初のチャンクまでの秒数
+            window_size: 割合を計算する直近の呼び出し数
+            min_calls: 割合を評価する最小の呼び出し数
+            open_seconds: 開いてから半開状態になるまでの秒数
+            clock: 現在時刻（秒）を返す関数
+        """
+        self.name = name
+        self.failure_rate = failure_rate or float(
+            os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", DEFAULT_FAILURE_RATE)
+        )
+        self.slow_call_seconds = slow_call_seconds or float(
+            os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", DEFAULT_SLOW_CALL_SECONDS)
+        )
+        window_size = window_size or int(
+            os.getenv("CIRCUIT_BREAKER_WINDOW", DEFAULT_WINDOW_SIZE)
+        )
+        self.min_calls = min_calls or int(
+            os.getenv("CIRCUIT_BREAKER_MIN_CALLS", DEFAULT_MIN_CALLS)
+        )
+        self.open_seconds = open_seconds or float(
+            os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS)
+        )
+        self.clock = clock
+        self.state = CLOSED
+        # 直近の呼び出しが失敗または遅かったか
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+
+    def allow_request(self) -> bool:
+        """
+        呼び出してよいか判定する
+
+        半開状態では1件だけプローブとして許可する。プローブの結果が
+        open_seconds以内に記録されない場合は次のプローブを許可する。
+        """
+        now = self.clock()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now - self._opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            logger.info("Circuit for %s is half-open", self.name)
+        if (
+            self._probe_started is not None
+            and now - self._probe_started < self.open_seconds
+        ):
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self, latency: float) -> None:
+        """
+        最初のチャンクを受信した呼び出しを記録する
+
+        Args:
+            latency: 送信から最初のチャンクまでの秒数
+        """
+        slow = latency > self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if slow:
+                self._open()
+            else:
+                self._close()
+            return
+        self._record(slow)
+
+    def record_failure(self) -> None:
+        """最初のチャンクより前に失敗した呼び出しを記録する。"""
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._record(True)
+
+    def _record(self, bad: bool) -> None:
+        if self.state != CLOSED:
+            return
+        self._outcomes.append(bad)
+        if len(self._outcomes) < self.min_calls:
+            return
+        rate = sum(self._outcomes) / len(self._outcomes)
+        if rate >= self.failure_rate:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self.clock()
+        self._probe_started = None
+        logger.warning("Circuit for %s opened for %.0fs", self.name, self.open_seconds)
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._outcomes.clear()
+        self._probe_started = None
+        logger.info("Circuit for %s closed", self.name)
@@ -1,25 +1,56 @@
 import os
 from collections.abc import AsyncIterator
 
-from anthropic import AsyncAnthropic
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 
+from .http_transport import ProviderTransport, model_headers
 from .llm_provider import LLMProvider
+from .model_catalog import default_catalog
+from .stream_events import StreamEvent, usage_event
+
+# プレフィックスキャッシュの区切り（この位置までの入力をキャッシュする）
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# カタログに無いモデルの最大出力トークン数
+DEFAULT_MAX_TOKENS = 4096
 
 
 class ClaudeProvider(LLMProvider):
     """Claude APIの実装"""
 
-    def __init__(self, api_key: str | None = None):
+    def __init__(
+        self,
+        api_key: str | None = None,
+        transport: ProviderTransport | None = None,
+        prompt_caching: bool | None = None,
+    ):
         """
         ClaudeProviderを初期化
 
         Args:
             api_key: Anthropic APIキー。Noneの場合は環境変数から読み込む
+            transport: HTTP接続プールの設定。Noneの場合はSDKのデフォルト
+            prompt_caching: プレフィックスキャッシュを利用するか。Noneの場合は
+                環境変数PROMPT_CACHING（既定は有効）
         """
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY is not set")
-        self.client = AsyncAnthropic(api_key=self.api_key)
+        if prompt_caching is None:
+            prompt_caching = os.getenv("PROMPT_CACHING", "true").lower() in (
+                "1",
+                "true",
+            )
+        self.prompt_caching = prompt_caching
+        if transport is not None:
+            self.http_client = transport.create_client(
+                DefaultAsyncHttpxClient, "claude"
+            )
+        # 再試行はLLMServiceで最初のチャンクより前の失敗に限って行う
+        self.client = AsyncAnthropic(
+            api_key=self.api_key, http_client=self.http_client, max_retries=0
+        )
+        self.base_url = str(self.client.base_url)
 
     def _convert_messages(
         self, messages: list[dict[str, str]]
@@ -48,9 +79,44 @@ class ClaudeProvider(LLMProvider):
 
         return system_message, claude_messages
 
+    def _mark_cache_breakpoints(
+        self, system_message: str | None, claude_messages: list[dict]
+    ) -> tuple[str | list[dict] | None, list[dict]]:
+        """
+        システムプロンプトと最後のメッセージにキャッシュの区切りを付ける
+
+        次のターンのリクエストは今回の入力全体を先頭に含むため、
+        最後のメッセージまでをキャッシュすると次のターンでヒットする。
+
+        Returns:
+            (system, claude_messages)のタプル（content はブロック形式）
+        """
+        system = system_message
+        if system_message:
+            system = [
+                {"type": "text", "text": system_message, "cache_control": CACHE_CONTROL}
+            ]
+
+        if claude_messages:
+            last = claude_messages[-1]
+            claude_messages = [
+                *claude_messages[:-1],
+                {
+                    "role": last["role"],
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": last["content"],
+                            "cache_control": CACHE_CONTROL,
+                        }
+                    ],
+                },
+            ]
+        return system, claude_messages
+
     async def stream_chat(
         self, messages: list[dict[str, str]], model: str
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[str | StreamEvent]:
         """
         Claude APIを使用してストリーミングチャットを処理
 
@@ -59,16 +125,39 @@ class ClaudeProvider(LLMProvider):
             model: 使用するモデル名
 
         Yields:
-            生成されたテキストのチャンク
+            生成されたテキストのチャンク。最後にトークン使用量のusageイベント
         """
         system_message, claude_messages = self._convert_messages(messages)
+        system: str | list[dict] | None = system_message
+        if self.prompt_caching:
+            system, claude_messages = self._mark_cache_breakpoints(
+                system_message, claude_messages
+            )
 
         # Claude APIのパラメータを構築
-        params = {"model": model, "messages": claude_messages, "max_tokens": 4096}
-
-        if system_message:
-            params["system"] = system_message
+        spec = (self.catalog or default_catalog()).get(model)
+        max_tokens = spec.max_output_tokens if spec else DEFAULT_MAX_TOKENS
+        params = {
+            "model": model,
+            "messages": claude_messages,
+            "max_tokens": max_tokens,
+            "extra_headers": model_headers(model),
+        }
+
+        if system:
+            params["system"] = system
 
         async with self.client.messages.stream(**params) as stream:
             async for text in stream.text_stream:
                 yield text
+
+            usage = (await stream.get_final_message()).usage
+            # input_tokensはキャッシュの読み書き分を含まない
+            cached = usage.cache_read_input_tokens or 0
+            written = usage.cache_creation_input_tokens or 0
+            yield usage_event(
+                input_tokens=usage.input_tokens + cached + written,
+                output_tokens=usage.output_tokens,
+                cached_tokens=cached,
+                cache_write_tokens=written,
+            )
@@ -0,0 +1,184 @@
+import logging
+import math
+import os
+from collections import OrderedDict
+
+from .model_catalog import default_catalog
+
+logger = logging.getLogger(__name__)
+
+# カタログに無いモデルの入力トークン予算
+DEFAULT_INPUT_TOKEN_BUDGET = 128_000
+
+# 推定誤差を吸収するため、予算のこの割合までしか使わない
+BUDGET_SAFETY_RATIO = 0.9
+
+# ロール等のメッセージごとの付加トークン
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATION_STRATEGIES = ("drop_oldest", "last_n")
+DEFAULT_TRUNCATION_STRATEGY = "drop_oldest"
+DEFAULT_KEEP_LAST_N = 20
+DEFAULT_TOKEN_CACHE_SIZE = 10_000
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数をオフラインで概算する
+
+    トークナイザーを使わず、ASCII文字は約4文字で1トークン、
+    それ以外（日本語など）は1文字1トークンとして見積もる。
+    多めに見積もる方向の近似で、エンコードとlen()のみで計算できる。
+
+    Args:
+        text: 対象のテキスト
+
+    Returns:
+        推定トークン数
+    """
+    char_count = len(text)
+    # 非ASCII文字の大半はUTF-8で3バイト（2バイト余分）になる
+    non_ascii = min((len(text.encode("utf-8")) - char_count + 1) // 2, char_count)
+    return math.ceil((char_count - non_ascii) / 4) + non_ascii
+
+
+class TokenCounter:
+    """
+    メッセージ本文ごとの推定トークン数のLRUキャッシュ
+
+    会話履歴は同じ本文（同じ文字列オブジェクト）が毎ターン渡されるため、
+    保存済みメッセージの計算は初回のみとなり、予算計算が新しいメッセージ分だけの
+    インクリメンタルな処理になる。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_TOKEN_CACHE_SIZE):
+        """
+        TokenCounterを初期化
+
+        Args:
+            max_entries: キャッシュする本文数の上限
+        """
+        self.max_entries = max_entries
+        self._counts: OrderedDict[str, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def count(self, content: str) -> int:
+        """メッセージ1件分の推定トークン数（付加トークン込み）を返す。"""
+        tokens = self._counts.get(content)
+        if tokens is not None:
+            self._counts.move_to_end(content)
+            return tokens
+
+        tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self._counts[content] = tokens
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return tokens
+
+
+class ContextWindowManager:
+    """
+    モデルごとのトークン予算に収まるようメッセージ履歴を切り詰める
+
+    システムメッセージと最新のメッセージは常に残し、
+    それ以外は新しい順に予算に収まるところまで残す。
+    """
+
+    def __init__(
+        self,
+        strategy: str | None = None,
+        keep_last_n: int | None = None,
+        max_tokens: int | None = None,
+        budgets: dict[str, int] | None = None,
+        token_counter: TokenCounter | None = None,
+    ):
+        """
+        ContextWindowManagerを初期化
+
+        Args:
+            strategy: 切り詰め戦略。Noneの場合は環境変数CONTEXT_TRUNCATION_STRATEGY
+                （drop_oldest: 古いメッセージから削除, last_n: システム＋直近N件）
+            keep_last_n: last_n戦略で残すメッセージ数。Noneの場合は
+                環境変数CONTEXT_KEEP_LAST_N
+            max_tokens: モデルに関わらず適用する入力トークン数の上限。
+                Noneの場合は環境変数CONTEXT_MAX_TOKENS（未設定なら上限なし）
+            budgets: モデルごとの入力トークン予算。Noneの場合はモデルカタログから作成する
+            token_counter: トークン数のキャッシュ
+
+        Raises:
+            ValueError: 未知の切り詰め戦略が指定された場合
+        """
+        self.strategy = strategy or os.getenv(
+            "CONTEXT_TRUNCATION_STRATEGY", DEFAULT_TRUNCATION_STRATEGY
+        )
+        if self.strategy not in TRUNCATION_STRATEGIES:
+            raise ValueError(f"Unknown truncation strategy: {self.strategy}")
+
+        if keep_last_n is None:
+            keep_last_n = int(os.getenv("CONTEXT_KEEP_LAST_N", DEFAULT_KEEP_LAST_N))
+        self.keep_last_n = keep_last_n
+
+        if max_tokens is None and os.getenv("CONTEXT_MAX_TOKENS"):
+            max_tokens = int(os.environ["CONTEXT_MAX_TOKENS"])
+        self.max_tokens = max_tokens
+
+        self.budgets = budgets or default_catalog().input_token_budgets()
+        self.token_counter = token_counter or TokenCounter()
+
+    def budget_for(self, model: str) -> int:
+        """モデルで使用できる入力トークン数を返す。"""
+        budget = self.budgets.get(model, DEFAULT_INPUT_TOKEN_BUDGET)
+        if self.max_tokens is not None:
+            budget = min(budget, self.max_tokens)
+        return int(budget * BUDGET_SAFETY_RATIO)
+
+    def fit(self, messages: list[dict[str, str]], model: str) -> list[dict[str, str]]:
+        """
+        メッセージ履歴をモデルのトークン予算に収める
+
+        Args:
+            messages: チャット履歴（最後の要素が今回のメッセージ）
+            model: 使用するモデル名
+
+        Returns:
+            予算に収まるメッセージリスト。切り詰め不要の場合は引数をそのまま返す
+        """
+        if not messages:
+            return messages
+
+        count = self.token_counter.count
+        system_messages = [msg for msg in messages if msg["role"] == "system"]
+        conversation = [msg for msg in messages if msg["role"] != "system"]
+        if self.strategy == "last_n":
+            conversation = conversation[-max(self.keep_last_n, 1) :]
+
+        remaining = self.budget_for(model) - sum(
+            count(msg["content"]) for msg in system_messages
+        )
+
+        # 新しい順に予算に収まるところまで残す（最新のメッセージは必ず残す）
+        kept = 0
+        for msg in reversed(conversation):
+            remaining -= count(msg["content"])
+            if remaining < 0 and kept > 0:
+                break
+            kept += 1
+
+        if kept == len(messages) - len(system_messages):
+            return messages
+
+        # ユーザー発話から始まるよう、先頭のアシスタント応答は落とす
+        start = len(conversation) - kept
+        while start < len(conversation) - 1 and conversation[start]["role"] != "user":
+            start += 1
+        selected = conversation[start:]
+
+        logger.info(
+            "Truncated context for %s: kept %s of %s messages",
+            model,
+            len(system_messages) + len(selected),
+            len(messages),
+        )
+        return [*system_messages, *selected]
@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import logging
+import os
+from collections import OrderedDict
+
+from app.repositories.async_message_repository import AsyncMessageRepository
+
+from .llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY_MODEL = "gemini-3-flash-preview"
+# 未要約のメッセージがこの件数を超えたら要約を更新する
+DEFAULT_TRIGGER_MESSAGES = 40
+# 要約せずにそのままプロンプトに含める直近のメッセージ数
+DEFAULT_KEEP_RECENT_MESSAGES = 10
+DEFAULT_CACHE_SIZE = 256
+
+SUMMARY_INSTRUCTION = (
+    "あなたは会話の要約者です。これまでの要約と新しいやり取りを統合し、"
+    "以降の応答に必要な事実・決定事項・ユーザーの意図を簡潔な要約にまとめてください。"
+    "要約のみを出力してください。"
+)
+SUMMARY_CONTEXT_PREFIX = "これまでの会話の要約:\n"
+_ROLE_LABELS = {"user": "ユーザー", "assistant": "アシスタント"}
+
+
+class ConversationSummarizer:
+    """
+    長い会話の古いメッセージをバックグラウンドで要約する
+
+    未要約のメッセージが一定数を超えた会話について、前回の要約と新しい
+    メッセージのみを安価なモデルに渡して要約を更新し、rolling_summariesに保存する。
+    プロンプトは「要約＋要約後のメッセージ」で組み立てる。
+    要約はチャット応答とは別タスクで実行するため、/api/chat の遅延には含まれない。
+    """
+
+    def __init__(
+        self,
+        llm_service: LLMService,
+        repository: AsyncMessageRepository,
+        model: str | None = None,
+        trigger_messages: int | None = None,
+        keep_recent: int | None = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        """
+        ConversationSummarizerを初期化
+
+        Args:
+            llm_service: 要約の生成に使用するLLMサービス
+            repository: 履歴の読み込みと要約の保存に使用するリポジトリ
+            model: 要約に使用するモデル。Noneの場合は環境変数SUMMARY_MODEL
+            trigger_messages: 要約を更新する未要約メッセージ数。Noneの場合は
+                環境変数SUMMARY_TRIGGER_MESSAGES
+            keep_recent: 要約しない直近のメッセージ数。Noneの場合は
+                環境変数SUMMARY_KEEP_RECENT_MESSAGES
+            cache_size: メモリに保持する要約の会話数
+        """
+        self.llm_service = llm_service
+        self.repository = repository
+        self.model = model or os.getenv("SUMMARY_MODEL", DEFAULT_SUMMARY_MODEL)
+        if trigger_messages is None:
+            trigger_messages = int(
+                os.getenv("SUMMARY_TRIGGER_MESSAGES", DEFAULT_TRIGGER_MESSAGES)
+            )
+        self.trigger_messages = trigger_messages
+        if keep_recent is None:
+            keep_recent = int(
+                os.getenv("SUMMARY_KEEP_RECENT_MESSAGES", DEFAULT_KEEP_RECENT_MESSAGES)
+            )
+        self.keep_recent = keep_recent
+        self.cache_size = cache_size
+        # 会話ID -> (要約, 要約済みメッセージ数)。要約が無い会話は("", 0)
+        self._summaries: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    async def build_messages(
+        self, conversation_id: str, history: list[dict[str, str]]
+    ) -> list[dict[str, str]]:
+        """
+        要約済みのメッセージを要約に置き換えた履歴を返す
+
+        Args:
+            conversation_id: 会話ID
+            history: 保存済みの全メッセージ（時系列順）
+
+        Returns:
+            要約のシステムメッセージ＋要約後のメッセージ。要約が無い場合はhistory
+        """
+        content, summarized_count = await self._get_summary(conversation_id)
+        if not content or summarized_count > len(history):
+            return history
+
+        return [
+            {"role": "system", "content": SUMMARY_CONTEXT_PREFIX + content},
+            *history[summarized_count:],
+        ]
+
+    def schedule(self, conversation_id: str, message_count: int) -> None:
+        """
+        必要であれば要約の更新をバックグラウンドで開始する
+
+        Args:
+            conversation_id: 会話ID
+            message_count: 会話の保存済みメッセージ数
+        """
+        cached = self._summaries.get(conversation_id)
+        summarized_count = cached[1] if cached is not None else 0
+        unsummarized = message_count - self.keep_recent - summarized_count
+        if unsummarized < self.trigger_messages or conversation_id in self._tasks:
+            return
+
+        task = asyncio.create_task(self._summarize(conversation_id))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda done: self._forget_task(conversation_id, done))
+
+    def invalidate(self, conversation_id: str) -> None:
+        """会話の要約をキャッシュから破棄し、実行中の要約を中止する。"""
+        self._summaries.pop(conversation_id, None)
+        task = self._tasks.pop(conversation_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def stop(self) -> None:
+        """実行中の要約をすべて中止する。"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def _forget_task(self, conversation_id: str, task: asyncio.Task) -> None:
+        if self._tasks.get(conversation_id) is task:
+            del self._tasks[conversation_id]
+
+    async def _get_summary(self, conversation_id: str) -> tuple[str, int]:
+        cached = self._summaries.get(conversation_id)
+        if cached is not None:
+            self._summaries.move_to_end(conversation_id)
+            return cached
+
+        summary = await self.repository.get_rolling_summary(conversation_id)
+        if summary is None:
+            self._remember(conversation_id, "", 0)
+        else:
+            self._remember(conversation_id, summary.content, summary.summarized_count)
+        return self._summaries[conversation_id]
+
+    def _remember(self, conversation_id: str, content: str, count: int) -> None:
+        self._summaries[conversation_id] = (content, count)
+        self._summaries.move_to_end(conversation_id)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    def _build_prompt(
+        self, previous_summary: str, messages: list[dict[str, str]]
+    ) -> list[dict[str, str]]:
+        transcript = "\n".join(
+            f"{_ROLE_LABELS.get(msg['role'], msg['role'])}: {msg['content']}"
+            for msg in messages
+        )
+        return [
+            {"role": "system", "content": SUMMARY_INSTRUCTION},
+            {
+                "role": "user",
+                "content": (
+                    f"これまでの要約:\n{previous_summary or '（なし）'}\n\n"
+                    f"新しいやり取り:\n{transcript}"
+                ),
+            },
+        ]
+
+    async def _summarize(self, conversation_id: str) -> None:
+        """前回の要約と新しいメッセージから要約を更新する。"""
+        try:
+            if not self.llm_service.is_model_available(self.model):
+                logger.warning("Summary model is not available: %s", self.model)
+                return
+
+            previous, summarized_count = await self._get_summary(conversation_id)
+            history = await self.repository.get_conversation_history(conversation_id)
+            end = len(history) - self.keep_recent
+            if end - summarized_count < self.trigger_messages:
+                return
+
+            prompt = self._build_prompt(previous, history[summarized_count:end])
+            chunks = [
+                chunk
+                async for chunk in self.llm_service.stream_chat(prompt, self.model)
+                if isinstance(chunk, str)
+            ]
+            content = "".join(chunks).strip()
+            if not content:
+                return
+
+            saved = await self.repository.save_rolling_summary(
+                conversation_id, content, end, self.model
+            )
+            if saved is not None:
+                self._remember(conversation_id, content, end)
+                logger.info(
+                    "Summarized %s messages of conversation %s",
+                    end,
+                    conversation_id,
+                )
+        except Exception as e:
+            # 要約に失敗しても次回のプロンプトは全履歴で組み立てられる
+            logger.error("Failed to summarize conversation %s: %s", conversation_id, e)
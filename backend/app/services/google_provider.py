@@ -1,20 +1,27 @@
 import os
 from collections.abc import AsyncIterator
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
+from .http_transport import ProviderTransport, model_headers
 from .llm_provider import LLMProvider
+from .stream_events import StreamEvent, usage_event
 
 
 class GoogleProvider(LLMProvider):
     """Google Gemini API(OpenAI互換)の実装"""
 
-    def __init__(self, api_key: str | None = None):
+    def __init__(
+        self,
+        api_key: str | None = None,
+        transport: ProviderTransport | None = None,
+    ):
         """
         GoogleProviderを初期化
 
         Args:
             api_key: Google APIキー。Noneの場合は環境変数から読み込む
+            transport: HTTP接続プールの設定。Noneの場合はSDKのデフォルト
         """
         self.api_key = (
             api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
@@ -22,32 +29,55 @@ class GoogleProvider(LLMProvider):
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY is not set")
 
+        if transport is not None:
+            self.http_client = transport.create_client(
+                DefaultAsyncHttpxClient, "google"
+            )
+        # 再試行はLLMServiceで最初のチャンクより前の失敗に限って行う
         self.client = AsyncOpenAI(
             api_key=self.api_key,
             base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+            http_client=self.http_client,
+            max_retries=0,
         )
+        self.base_url = str(self.client.base_url)
 
     async def stream_chat(
         self,
         messages: list[dict[str, str]],
         model: str,
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[str | StreamEvent]:
         """
         Gemini API(OpenAI互換)を使用してストリーミングチャットを処理
 
+        Geminiのプレフィックスキャッシュ（暗黙的キャッシュ）は自動で適用されるため、
+        メッセージは並べ替えずにそのまま送る。
+
         Args:
             messages: チャット履歴
             model: 使用するモデル名
 
         Yields:
-            生成されたテキストのチャンク
+            生成されたテキストのチャンク。最後にトークン使用量のusageイベント
         """
         stream = await self.client.chat.completions.create(
             model=model,
             messages=messages,
             stream=True,
+            stream_options={"include_usage": True},
+            extra_headers=model_headers(model),
         )
 
-        async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        # 呼び出し側がジェネレーターを閉じた場合もHTTPレスポンスを即座に閉じる
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    details = usage.prompt_tokens_details
+                    yield usage_event(
+                        input_tokens=usage.prompt_tokens,
+                        output_tokens=usage.completion_tokens,
+                        cached_tokens=(details.cached_tokens or 0) if details else 0,
+                    )
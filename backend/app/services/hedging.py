@@ -0,0 +1,206 @@
+import asyncio
+import math
+import os
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import aclosing
+
+from .model_router import parse_fallbacks
+
+DEFAULT_HEDGE_DELAY = 2.0
+DEFAULT_HEDGE_QUANTILE = 0.9
+# 分位点の計算に使う直近の最初のチャンクまでの時間の件数
+DEFAULT_WINDOW_SIZE = 200
+# この件数に達するまでは固定の遅延を使う
+DEFAULT_MIN_SAMPLES = 20
+
+# 勝者のストリームからの中継キューの上限（読み手が遅い場合は受信を待たせる）
+RELAY_QUEUE_SIZE = 16
+
+_CHUNK = "chunk"
+_DONE = "done"
+_ERROR = "error"
+
+# ヘッジ用のストリームと、終了時に呼ぶ後始末（実行枠の返却など）
+BackupStream = tuple[AsyncIterator[str], Callable[[], None]]
+
+
+class HedgePolicy:
+    """
+    ヘッジリクエストの設定と、モデルごとの最初のチャンクまでの時間の統計
+
+    最初のチャンクが一定時間内に届かない場合、同じモデル（または設定した
+    代替モデル）に同じリクエストをもう1件送り、先に最初のチャンクを返した方を使う。
+    遅延は直近の最初のチャンクまでの時間の分位点（既定はp90）で決める。
+    """
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        delay: float | None = None,
+        quantile: float | None = None,
+        backups: dict[str, list[str]] | None = None,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+    ):
+        """
+        HedgePolicyを初期化
+
+        引数がNoneの場合は対応する環境変数から読み込む。
+
+        Args:
+            enabled: ヘッジを行うか。環境変数LLM_HEDGING（既定は無効）
+            delay: 統計が揃うまでのヘッジの遅延秒数。環境変数LLM_HEDGE_DELAY
+            quantile: 遅延に使う最初のチャンクまでの時間の分位点（0〜1）。
+                環境変数LLM_HEDGE_QUANTILE
+            backups: モデル名 -> ヘッジ先のモデル名。環境変数LLM_HEDGE_MODELS
+                （"gpt-5.2-pro=gpt-5.2,..."形式）。設定の無いモデルは同じモデルに送る
+            window_size: 分位点の計算に使う直近の件数
+            min_samples: 分位点を使い始める件数
+        """
+        if enabled is None:
+            enabled = os.getenv("LLM_HEDGING", "").lower() in ("1", "true")
+        self.enabled = enabled
+        self.delay = delay or float(os.getenv("LLM_HEDGE_DELAY", DEFAULT_HEDGE_DELAY))
+        self.quantile = quantile or float(
+            os.getenv("LLM_HEDGE_QUANTILE", DEFAULT_HEDGE_QUANTILE)
+        )
+        if backups is None:
+            backups = parse_fallbacks(os.getenv("LLM_HEDGE_MODELS", ""))
+        self.backups = backups
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self._samples: dict[str, deque[float]] = {}
+
+    def backup_for(self, model: str) -> str:
+        """ヘッジ先のモデル名を返す。"""
+        backups = self.backups.get(model)
+        return backups[0] if backups else model
+
+    def delay_for(self, model: str) -> float:
+        """ヘッジを送るまでの秒数を返す。"""
+        samples = self._samples.get(model)
+        if samples is None or len(samples) < self.min_samples:
+            return self.delay
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, math.ceil(self.quantile * len(ordered)) - 1)
+        return ordered[max(0, index)]
+
+    def record(self, model: str, ttft: float) -> None:
+        """
+        最初のチャンクまでの時間を記録する
+
+        Args:
+            model: モデル名
+            ttft: 送信から最初のチャンクまでの秒数
+        """
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window_size)
+        samples.append(ttft)
+
+
+async def race_first_chunk(
+    primary: AsyncIterator[str],
+    start_backup: Callable[[], BackupStream | None],
+    delay: float,
+) -> AsyncIterator[tuple[int, str]]:
+    """
+    最初のチャンクを先に返したストリームを使う
+
+    primaryが delay 秒以内に最初のチャンクを返さない場合はstart_backupで
+    ヘッジのストリームを開始する。先に最初のチャンクを返した方を勝者とし、
+    敗者のタスクはキャンセルしてプロバイダーのストリームを閉じる。
+    各ストリームの後始末（実行枠の返却など）はそのストリームが閉じた時点で行い、
+    敗者の実行枠を勝者の生成が終わるまで保持しない。
+    一方が最初のチャンクより前に失敗した場合は他方を待つ。
+
+    Args:
+        primary: 元のリクエストのストリーム
+        start_backup: ヘッジのストリームを開始する関数。空きが無いなどで
+            送らない場合はNoneを返す
+        delay: ヘッジを送るまでの秒数
+
+    Yields:
+        (ストリームの番号（0: primary, 1: ヘッジ）, チャンク)
+
+    Raises:
+        Exception: すべてのストリームが最初のチャンクより前に失敗した場合は
+            primaryの例外（勝者が途中で失敗した場合はその例外）
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=RELAY_QUEUE_SIZE)
+    tasks: list[asyncio.Task] = []
+    cleanups: dict[int, Callable[[], None]] = {}
+
+    def run_cleanup(index: int) -> None:
+        cleanup = cleanups.pop(index, None)
+        if cleanup is not None:
+            cleanup()
+
+    def launch(stream: AsyncIterator[str], cleanup: Callable[[], None] | None) -> None:
+        index = len(tasks)
+        if cleanup is not None:
+            cleanups[index] = cleanup
+        task = asyncio.create_task(_pump(index, stream, queue))
+        task.add_done_callback(lambda _: run_cleanup(index))
+        tasks.append(task)
+
+    hedge_at = loop.time() + delay
+    hedged = False
+    winner: int | None = None
+    errors: dict[int, Exception] = {}
+    try:
+        launch(primary, None)
+        while True:
+            timeout = None
+            if not hedged and winner is None:
+                timeout = max(0.0, hedge_at - loop.time())
+            try:
+                index, kind, value = await asyncio.wait_for(queue.get(), timeout)
+            except TimeoutError:
+                hedged = True
+                backup = start_backup()
+                if backup is not None:
+                    launch(*backup)
+                continue
+
+            if winner is None:
+                if kind == _ERROR:
+                    errors[index] = value
+                    # ヘッジ前の失敗は通常の失敗として再試行などに任せる
+                    if not hedged or len(errors) == len(tasks):
+                        raise errors.get(0, value)
+                    continue
+                winner = index
+                for loser, task in enumerate(tasks):
+                    if loser != winner:
+                        task.cancel()
+            if index != winner:
+                continue
+
+            if kind == _CHUNK:
+                yield index, value
+            elif kind == _DONE:
+                return
+            else:
+                raise value
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            # 敗者のストリームのコンテキストマネージャーが閉じるまで待つ
+            await asyncio.wait(tasks)
+        for index in list(cleanups):
+            run_cleanup(index)
+
+
+async def _pump(index: int, stream: AsyncIterator[str], queue: asyncio.Queue) -> None:
+    """ストリームのチャンクを番号付きでキューに送る。"""
+    try:
+        async with aclosing(stream) as chunks:
+            async for chunk in chunks:
+                await queue.put((index, _CHUNK, chunk))
+        await queue.put((index, _DONE, None))
+    except Exception as e:
+        await queue.put((index, _ERROR, e))
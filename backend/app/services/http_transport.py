@@ -0,0 +1,217 @@
+import asyncio
+import importlib
+import importlib.util
+import logging
+import os
+from collections.abc import Callable, Mapping
+from types import ModuleType
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+# ストリーミング中はチャンク間の待ち時間に適用される
+DEFAULT_READ_TIMEOUT = 120.0
+DEFAULT_WRITE_TIMEOUT = 30.0
+DEFAULT_POOL_TIMEOUT = 10.0
+DEFAULT_WARMUP_CONNECTIONS = 2
+
+# プロバイダーがチャットのリクエストに付けるモデル名のヘッダー。
+# 送信前にリクエストフックで取り除き、request.extensionsに移す（上流には送らない）
+MODEL_HEADER = "x-genai-model"
+MODEL_EXTENSION = "genai_model"
+
+
+def model_headers(model: str) -> dict[str, str]:
+    """
+    チャットのリクエストに付けるヘッダーを返す
+
+    SDKのextra_headersに渡すと、応答リスナーにそのリクエストのモデル名が渡される。
+    """
+    return {MODEL_HEADER: model}
+
+
+def http2_available() -> bool:
+    """HTTP/2に必要なh2パッケージがインストールされているか確認する。"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _http_module(client_class: type) -> ModuleType:
+    """
+    SDKのHTTPクライアントクラスが基づくhttpx系モジュールを返す
+
+    SDKのバージョンによってhttpxまたはその後継パッケージを使うため、
+    Limits/Timeoutはクライアントと同じモジュールから生成する。
+    """
+    for base in client_class.__mro__:
+        if base.__name__ == "AsyncClient":
+            return importlib.import_module(base.__module__.split(".")[0])
+    raise TypeError(f"Not an httpx AsyncClient class: {client_class!r}")
+
+
+async def _tag_request(request: Any) -> None:
+    """モデル名のヘッダーをrequest.extensionsに移す。"""
+    model = request.headers.pop(MODEL_HEADER, None)
+    if model is not None:
+        request.extensions[MODEL_EXTENSION] = model
+
+
+class ProviderTransport:
+    """
+    LLMプロバイダーのSDKクライアントに注入するHTTPクライアントを生成・管理する
+
+    接続数の上限、キープアライブ、タイムアウト、HTTP/2（h2がある場合）を
+    設定したクライアントを生成し、起動時に接続を事前確立する。
+    """
+
+    def __init__(
+        self,
+        max_connections: int | None = None,
+        max_keepalive_connections: int | None = None,
+        keepalive_expiry: float | None = None,
+        connect_timeout: float | None = None,
+        read_timeout: float | None = None,
+        http2: bool | None = None,
+    ):
+        """
+        ProviderTransportを初期化
+
+        引数がNoneの場合は対応する環境変数（PROVIDER_HTTP_*）から読み込む。
+
+        Args:
+            max_connections: プロバイダーごとの最大同時接続数
+            max_keepalive_connections: 保持するキープアライブ接続数
+            keepalive_expiry: アイドル接続を保持する秒数
+            connect_timeout: 接続確立（TLSハンドシェイク含む）のタイムアウト秒数
+            read_timeout: 読み取りのタイムアウト秒数
+            http2: HTTP/2を使用するか。Noneの場合は環境変数PROVIDER_HTTP2（既定はfalse）。
+                h2はオプションの依存関係（http2）でインストールする
+                （無い場合はHTTP/1.1になる）
+        """
+        self.max_connections = max_connections or int(
+            os.getenv("PROVIDER_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)
+        )
+        self.max_keepalive_connections = max_keepalive_connections or int(
+            os.getenv("PROVIDER_HTTP_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+        )
+        self.keepalive_expiry = keepalive_expiry or float(
+            os.getenv("PROVIDER_HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)
+        )
+        self.connect_timeout = connect_timeout or float(
+            os.getenv("PROVIDER_HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)
+        )
+        self.read_timeout = read_timeout or float(
+            os.getenv("PROVIDER_HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)
+        )
+        if http2 is None:
+            http2 = os.getenv("PROVIDER_HTTP2", "false").lower() in ("1", "true")
+        self.http2 = http2 and http2_available()
+        if http2 and not self.http2:
+            logger.warning(
+                "PROVIDER_HTTP2 is enabled but h2 is not installed; "
+                "provider connections use HTTP/1.1"
+            )
+
+        self._clients: list[Any] = []
+        self._response_listeners: list[
+            Callable[[str, str, Mapping[str, str]], None]
+        ] = []
+
+    def add_response_listener(
+        self, listener: Callable[[str, str, Mapping[str, str]], None]
+    ) -> None:
+        """
+        チャットのリクエストに対する応答ヘッダーを受け取るリスナーを登録する
+
+        model_headersでモデル名を付けたリクエストの応答のみ渡す
+        （接続の事前確立などの応答は渡さない）。
+
+        Args:
+            listener: (プロバイダー名, モデル名, 応答ヘッダー)を受け取る関数
+        """
+        self._response_listeners.append(listener)
+
+    def create_client(self, client_class: type, provider_name: str) -> Any:
+        """
+        調整済みのHTTPクライアントを生成する
+
+        Args:
+            client_class: SDKのデフォルトHTTPクライアントクラス
+                （openai.DefaultAsyncHttpxClient など）
+            provider_name: 応答リスナーに渡すプロバイダー名
+
+        Returns:
+            SDKクライアントのhttp_clientに渡すAsyncClient
+        """
+        http = _http_module(client_class)
+        client = client_class(
+            limits=http.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=http.Timeout(
+                self.read_timeout,
+                connect=self.connect_timeout,
+                write=DEFAULT_WRITE_TIMEOUT,
+                pool=DEFAULT_POOL_TIMEOUT,
+            ),
+            http2=self.http2,
+            event_hooks={
+                "request": [_tag_request],
+                "response": [self._response_hook(provider_name)],
+            },
+        )
+        self._clients.append(client)
+        return client
+
+    def _response_hook(self, provider_name: str) -> Callable:
+        async def on_response(response: Any) -> None:
+            model = response.request.extensions.get(MODEL_EXTENSION)
+            if model is None:
+                return
+            for listener in self._response_listeners:
+                try:
+                    listener(provider_name, model, response.headers)
+                except Exception as e:
+                    # ヘッダーの解析失敗でリクエストを失敗させない
+                    logger.warning("Response listener failed: %s", e)
+
+        return on_response
+
+    async def warm_up(
+        self,
+        client: Any,
+        url: str,
+        connections: int = DEFAULT_WARMUP_CONNECTIONS,
+    ) -> None:
+        """
+        TLSハンドシェイク済みの接続をプールに用意する
+
+        失敗してもリクエスト時に接続するだけなので、ログのみ出力する。
+
+        Args:
+            client: create_clientで生成したクライアント
+            url: 接続先（プロバイダーのベースURL）
+            connections: 確立する接続数（HTTP/2では1接続を多重化するため1）
+        """
+        if self.http2:
+            connections = 1
+
+        async def open_connection() -> None:
+            try:
+                await client.head(url)
+            except Exception as e:
+                logger.warning("Failed to warm up connection to %s: %s", url, e)
+
+        await asyncio.gather(*(open_connection() for _ in range(connections)))
+        logger.info("Warmed up %s connection(s) to %s", connections, url)
+
+    async def aclose(self) -> None:
+        """生成したクライアントの接続をすべて閉じる。"""
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.aclose()
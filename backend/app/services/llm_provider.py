@@ -1,14 +1,31 @@
 from abc import ABC, abstractmethod
 from collections.abc import AsyncIterator
+from contextvars import ContextVar
+from typing import Any
+
+from .model_catalog import ModelCatalog
+from .stream_events import StreamEvent
+
+# 処理中のリクエストの会話ID。プロバイダーのプレフィックスキャッシュの振り分けに使う
+conversation_scope: ContextVar[str | None] = ContextVar(
+    "conversation_scope", default=None
+)
 
 
 class LLMProvider(ABC):
     """LLMプロバイダーの抽象基底クラス"""
 
+    # 接続の事前確立に使うHTTPクライアントと接続先（未設定の場合は事前確立しない）
+    http_client: Any = None
+    base_url: str | None = None
+    # 出力トークン数の上限などを参照するモデルカタログ（Noneの場合は既定のカタログ）。
+    # ProviderRegistryがLLMServiceのカタログを設定する
+    catalog: ModelCatalog | None = None
+
     @abstractmethod
     async def stream_chat(
         self, messages: list[dict[str, str]], model: str
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[str | StreamEvent]:
         """
         チャットメッセージをストリーミングで処理
 
@@ -17,6 +34,7 @@ class LLMProvider(ABC):
             model: 使用するモデル名
 
         Yields:
-            生成されたテキストのチャンク
+            生成されたテキストのチャンク。プロバイダーが報告した場合は最後に
+            トークン使用量のusageイベント（StreamEvent）
         """
         pass
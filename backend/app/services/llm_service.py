@@ -1,42 +1,152 @@
-import os
-from collections.abc import AsyncIterator
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Mapping
+from contextlib import aclosing
 
-from .claude_provider import ClaudeProvider
-from .google_provider import GoogleProvider
+from .admission import AdmissionController, AdmissionError
+from .circuit_breaker import CircuitOpenError
+from .context_window import ContextWindowManager
+from .hedging import BackupStream, HedgePolicy, race_first_chunk
+from .http_transport import ProviderTransport
 from .llm_provider import LLMProvider
-from .openai_provider import OpenAIProvider
+from .metrics import MetricsRegistry
+from .model_catalog import ModelCatalog, default_catalog
+from .model_router import ModelRouter
+from .provider_registry import ProviderRegistry
+from .rate_limiter import RateLimiter
+from .retry import RETRYABLE_KINDS, RetryPolicy, classify_error
+from .stream_events import StreamEvent, model_event, retry_event, throttle_event
+
+logger = logging.getLogger(__name__)
+
+# サーキットブレーカーが開いていたため代替モデルに切り替えた場合の理由
+CIRCUIT_OPEN = "circuit_open"
 
 
 class LLMService:
     """LLMサービスのファサード"""
 
-    def __init__(self):
-        """LLMServiceを初期化"""
-        # プロバイダーの初期化
-        self.providers: dict[str, LLMProvider] = {}
-
-        # OpenAIプロバイダーの初期化（APIキーがある場合のみ）
-        if os.getenv("OPENAI_API_KEY"):
-            self.providers["openai"] = OpenAIProvider()
-
-        # Claudeプロバイダーの初期化（APIキーがある場合のみ）
-        if os.getenv("ANTHROPIC_API_KEY"):
-            self.providers["claude"] = ClaudeProvider()
-
-        # Googleプロバイダーの初期化（APIキーがある場合のみ）
-        if os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"):
-            self.providers["google"] = GoogleProvider()
-
-        # モデル名からプロバイダーへのマッピング
-        self.model_mapping = {
-            "gpt-5.2": "openai",
-            "gpt-5.2-pro": "openai",
-            "gemini-3-pro-preview": "google",
-            "gemini-3-flash-preview": "google",
-            "claude-opus-4-5": "claude",
-            "claude-sonnet-4-5": "claude",
-            "claude-haiku-4-5": "claude",
-        }
+    def __init__(
+        self,
+        context_window: ContextWindowManager | None = None,
+        transport: ProviderTransport | None = None,
+        admission: AdmissionController | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        metrics: MetricsRegistry | None = None,
+        router: ModelRouter | None = None,
+        hedging: HedgePolicy | None = None,
+        catalog: ModelCatalog | None = None,
+    ):
+        """
+        LLMServiceを初期化
+
+        Args:
+            context_window: 履歴をトークン予算に収めるマネージャー。
+                Noneの場合は環境変数の設定で作成する
+            transport: プロバイダーのSDKクライアントに注入するHTTP接続プール。
+                Noneの場合は環境変数の設定で作成する
+            admission: プロバイダー/モデル単位の同時実行数の制限。
+                Noneの場合は環境変数の設定で作成する
+            rate_limiter: プロバイダー/モデル単位のRPM・TPM制限。
+                Noneの場合は環境変数の設定で作成する
+            retry_policy: 最初のチャンクより前に失敗した場合の再試行の方針。
+                Noneの場合は環境変数の設定で作成する
+            metrics: 再試行回数などを記録するカウンター
+            router: フォールバックチェーンとサーキットブレーカー。
+                Noneの場合は環境変数の設定で作成する
+            hedging: 最初のチャンクが遅い場合のヘッジリクエストの設定。
+                Noneの場合は環境変数の設定で作成する（既定は無効）
+            catalog: モデルカタログ。Noneの場合は起動時に読み込んだカタログ
+        """
+        self.transport = transport or ProviderTransport()
+
+        # 送信前にRPM/TPMの予算を確保し、応答ヘッダーで予算を調整する
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.transport.add_response_listener(self.rate_limiter.observe_headers)
+
+        # モデル名からプロバイダーへのマッピング（カタログの不変のインデックス）
+        self.catalog = catalog or default_catalog()
+        self.model_mapping = self.catalog.model_mapping
+
+        # APIキーが設定されているプロバイダー（SDKの読み込みとクライアントの生成は
+        # そのプロバイダーのモデルを初めて使うときに行う）
+        self.providers: Mapping[str, LLMProvider] = ProviderRegistry(
+            self.transport, catalog=self.catalog
+        )
+
+        # モデルごとのトークン予算に収まるよう履歴を切り詰める
+        self.context_window = context_window or ContextWindowManager(
+            budgets=self.catalog.input_token_budgets()
+        )
+
+        # 上流への同時リクエスト数を制限し、超過分は待ち行列で待たせる
+        self.admission = admission or AdmissionController()
+
+        # 最初のチャンクより前の一時的なエラーはバックオフして再試行する
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or MetricsRegistry()
+
+        # 劣化したプロバイダーのモデルは代替モデルに切り替える
+        self.router = router or ModelRouter()
+
+        # 最初のチャンクが遅い場合は同じリクエストをもう1件送る（オプトイン）
+        self.hedging = hedging or HedgePolicy()
+
+    async def warm_up(self) -> None:
+        """
+        APIキーが設定されているプロバイダーを生成し、接続を事前に確立する
+
+        SDKの読み込みとTLSハンドシェイクを初回応答から除く。SDKの読み込みは
+        イベントループを止めないよう別スレッドで行う。
+        """
+        providers = await asyncio.to_thread(list, self.providers.values())
+        await asyncio.gather(
+            *(
+                self.transport.warm_up(provider.http_client, provider.base_url)
+                for provider in providers
+                if provider.http_client is not None and provider.base_url
+            )
+        )
+
+    async def _get_provider(self, provider_name: str | None) -> LLMProvider | None:
+        """
+        プロバイダーを返す（APIキーが無い場合はNone）
+
+        未生成のプロバイダーはSDKの読み込みでイベントループを止めないよう
+        別スレッドで生成する。
+        """
+        if provider_name is None:
+            return None
+        if isinstance(self.providers, ProviderRegistry) and not (
+            self.providers.is_loaded(provider_name)
+        ):
+            return await asyncio.to_thread(self.providers.get, provider_name)
+        return self.providers.get(provider_name)
+
+    async def aclose(self) -> None:
+        """プロバイダーへのHTTP接続を閉じる。"""
+        await self.transport.aclose()
+
+    def _estimate_tokens(self, messages: list[dict[str, str]]) -> int:
+        """TPM制限用にリクエストの推定入力トークン数を返す。"""
+        count = self.context_window.token_counter.count
+        return sum(count(msg["content"]) for msg in messages)
+
+    def _record_first_chunk(self, provider_name: str, model: str, ttft: float) -> None:
+        """最初のチャンクまでの時間をサーキットブレーカーとヘッジの統計に記録する。"""
+        self.router.breaker(provider_name).record_success(ttft)
+        self.hedging.record(model, ttft)
+
+    def _record_usage(self, provider_name: str, model: str, usage: StreamEvent) -> None:
+        """プロバイダーが報告したトークン使用量をカウンターに加算する。"""
+        labels = {"provider": provider_name, "model": model}
+        for name, field in (
+            ("llm_input_tokens_total", "input_tokens"),
+            ("llm_cached_input_tokens_total", "cached_tokens"),
+            ("llm_output_tokens_total", "output_tokens"),
+        ):
+            self.metrics.increment(name, usage.data[field], **labels)
 
     def has_api_key(self, model: str) -> bool:
         """
@@ -67,27 +177,274 @@ class LLMService:
 
     async def stream_chat(
         self, messages: list[dict[str, str]], model: str
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[str | StreamEvent]:
         """
         統一されたインターフェースでストリーミングチャットを処理
 
+        要求されたモデルが最初のチャンクより前に失敗した場合、またはその
+        プロバイダーのサーキットブレーカーが開いている場合は、フォールバック
+        チェーンの次のモデルで応答を生成する。
+
         Args:
             messages: チャット履歴
             model: 使用するモデル名
 
         Yields:
-            生成されたテキストのチャンク
+            生成されたテキストのチャンク。同時実行数の上限で待機した場合は
+            最初のチャンクの前にqueueイベント、レート制限で送信を遅らせる場合は
+            throttleイベント、一時的なエラーで再試行する場合はretryイベント、
+            代替モデルに切り替える場合はmodelイベント（StreamEvent）を返す
 
         Raises:
             ValueError: 未知のモデルまたはAPIキーが未設定の場合
+            AdmissionError: 待ち行列が満杯、待機がタイムアウトした場合、
+                レート制限の待ち時間が上限を超える場合、またはすべての候補の
+                サーキットブレーカーが開いている場合
         """
         provider_name = self.model_mapping.get(model)
         if not provider_name:
             raise ValueError(f"Unknown model: {model}")
 
-        provider = self.providers.get(provider_name)
-        if not provider:
+        if provider_name not in self.providers:
             raise ValueError(f"API key not configured for provider: {provider_name}")
 
-        async for chunk in provider.stream_chat(messages, model):
-            yield chunk
+        reason = None
+        last_error: Exception | None = None
+        for candidate in self.router.candidates(model):
+            provider_name = self.model_mapping.get(candidate)
+            provider = await self._get_provider(provider_name)
+            if provider is None:
+                continue
+
+            if not self.router.breaker(provider_name).allow_request():
+                logger.warning(
+                    "Circuit for %s is open; skipping %s", provider_name, candidate
+                )
+                reason = reason or CIRCUIT_OPEN
+                continue
+
+            if candidate != model:
+                self.metrics.increment(
+                    "llm_failovers_total",
+                    model=model,
+                    fallback=candidate,
+                    reason=reason,
+                )
+                yield model_event(candidate, model, reason)
+
+            started_output = False
+            try:
+                async with aclosing(
+                    self._stream_model(provider_name, provider, messages, candidate)
+                ) as stream:
+                    async for chunk in stream:
+                        if isinstance(chunk, str):
+                            started_output = True
+                        yield chunk
+                return
+            except Exception as e:
+                kind = classify_error(e)
+                # 出力済みの場合、またはリクエスト自体の問題の場合は切り替えない
+                if started_output or not (
+                    isinstance(e, AdmissionError) or kind in RETRYABLE_KINDS
+                ):
+                    raise
+                logger.warning("Model %s failed before output: %s", candidate, e)
+                reason = "admission" if isinstance(e, AdmissionError) else kind
+                last_error = e
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"No available provider for {model}")
+
+    async def _stream_model(
+        self,
+        provider_name: str,
+        provider: LLMProvider,
+        messages: list[dict[str, str]],
+        model: str,
+    ) -> AsyncIterator[str | StreamEvent]:
+        """1つのモデルで応答を生成する（同時実行数・レート制限・再試行を適用）。"""
+        messages = self.context_window.fit(messages, model)
+        breaker = self.router.breaker(provider_name)
+
+        acquired = []
+        try:
+            async with aclosing(
+                self.admission.admit(
+                    self.admission.limiters_for(provider_name, model), acquired
+                )
+            ) as events:
+                async for event in events:
+                    yield event
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            attempt = 1
+            while True:
+                # レート制限の予算に収まるまで送信を遅らせる
+                reservation = self.rate_limiter.reserve(
+                    provider_name, model, self._estimate_tokens(messages)
+                )
+                if reservation.delay > 0:
+                    try:
+                        yield throttle_event(int(reservation.delay * 1000))
+                        await asyncio.sleep(reservation.delay)
+                    except BaseException:
+                        reservation.cancel()
+                        raise
+
+                started_output = False
+                dispatched = loop.time()
+                # ヘッジする場合は最初のチャンクと使用量を実際に応答した側で記録する
+                hedged = self.hedging.enabled
+                if hedged:
+                    stream = self._hedged_stream(
+                        provider_name, provider, messages, model
+                    )
+                else:
+                    stream = provider.stream_chat(messages, model)
+                try:
+                    # 呼び出し側が途中で閉じた場合にプロバイダーのストリームも即座に閉じる
+                    async with aclosing(stream) as stream:
+                        async for chunk in stream:
+                            if not started_output and isinstance(chunk, str):
+                                started_output = True
+                                if not hedged:
+                                    self._record_first_chunk(
+                                        provider_name, model, loop.time() - dispatched
+                                    )
+                            elif (
+                                not hedged
+                                and isinstance(chunk, StreamEvent)
+                                and chunk.event == "usage"
+                            ):
+                                self._record_usage(provider_name, model, chunk)
+                            yield chunk
+                except Exception as e:
+                    kind = classify_error(e)
+                    labels = {"provider": provider_name, "model": model, "kind": kind}
+                    if not started_output and kind in RETRYABLE_KINDS:
+                        breaker.record_failure()
+                    # 出力済みの場合は応答が重複するため再試行しない
+                    delay = (
+                        None
+                        if started_output
+                        else self.retry_policy.next_delay(
+                            kind, attempt, loop.time() - started
+                        )
+                    )
+                    if delay is None:
+                        self.metrics.increment("llm_errors_total", **labels)
+                        if attempt > 1:
+                            self.metrics.increment(
+                                "llm_retries_exhausted_total", **labels
+                            )
+                        raise
+
+                    self.metrics.increment("llm_retries_total", **labels)
+                    logger.warning(
+                        "Retrying %s after %s error (attempt %s, %.2fs): %s",
+                        model,
+                        kind,
+                        attempt,
+                        delay,
+                        e,
+                    )
+                    attempt += 1
+                    yield retry_event(attempt, int(delay * 1000), kind)
+                    await asyncio.sleep(delay)
+                    continue
+
+                if attempt > 1:
+                    self.metrics.increment(
+                        "llm_retry_successes_total",
+                        provider=provider_name,
+                        model=model,
+                    )
+                return
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    async def _hedged_stream(
+        self,
+        provider_name: str,
+        provider: LLMProvider,
+        messages: list[dict[str, str]],
+        model: str,
+    ) -> AsyncIterator[str | StreamEvent]:
+        """
+        最初のチャンクが遅い場合にヘッジリクエストを送り、先に応答した方を返す
+
+        ヘッジは空きのある実行枠とレート制限の予算の範囲でのみ送る。
+        ヘッジ先の別モデルが勝った場合はmodelイベントを返す。
+        最初のチャンクまでの時間（サーキットブレーカーとヘッジの遅延の統計）と
+        使用量は勝った側のプロバイダーとモデルに記録し、キャンセルした側は記録しない。
+        """
+        loop = asyncio.get_running_loop()
+        dispatched = loop.time()
+        backup_model = self.hedging.backup_for(model)
+        backup_provider_name = self.model_mapping.get(backup_model)
+        backup_provider = await self._get_provider(backup_provider_name)
+        backup_dispatched: float | None = None
+
+        def start_backup() -> BackupStream | None:
+            nonlocal backup_dispatched
+            if backup_provider is None:
+                return None
+            if not self.router.breaker(backup_provider_name).allow_request():
+                return None
+
+            limiters = self.admission.limiters_for(backup_provider_name, backup_model)
+            if not self.admission.try_admit(limiters):
+                return None
+
+            def release() -> None:
+                for limiter in reversed(limiters):
+                    limiter.release()
+
+            backup_messages = self.context_window.fit(messages, backup_model)
+            try:
+                reservation = self.rate_limiter.reserve(
+                    backup_provider_name,
+                    backup_model,
+                    self._estimate_tokens(backup_messages),
+                )
+            except AdmissionError:
+                release()
+                return None
+            if reservation.delay > 0:
+                reservation.cancel()
+                release()
+                return None
+
+            self.metrics.increment("llm_hedges_total", model=model, backup=backup_model)
+            backup_dispatched = loop.time()
+            return backup_provider.stream_chat(backup_messages, backup_model), release
+
+        async with aclosing(
+            race_first_chunk(
+                provider.stream_chat(messages, model),
+                start_backup,
+                self.hedging.delay_for(model),
+            )
+        ) as race:
+            winner: tuple[str, str] | None = None
+            async for index, chunk in race:
+                if winner is None:
+                    if index == 1:
+                        winner = (backup_provider_name, backup_model)
+                        ttft = loop.time() - backup_dispatched
+                        self.metrics.increment(
+                            "llm_hedge_wins_total", model=model, backup=backup_model
+                        )
+                        if backup_model != model:
+                            yield model_event(backup_model, model, "hedge")
+                    else:
+                        winner = (provider_name, model)
+                        ttft = loop.time() - dispatched
+                    self._record_first_chunk(*winner, ttft)
+                if isinstance(chunk, StreamEvent) and chunk.event == "usage":
+                    self._record_usage(*winner, chunk)
+                yield chunk
@@ -0,0 +1,59 @@
+from collections import Counter
+
+
+class MetricsRegistry:
+    """
+    プロセス内のカウンターを保持する
+
+    カウンターは名前とラベル（キーワード引数）の組で区別する。
+    /api/metrics で snapshot() の内容を返す。
+    """
+
+    def __init__(self):
+        """MetricsRegistryを初期化"""
+        self._counters: dict[str, Counter[tuple[tuple[str, str], ...]]] = {}
+
+    def increment(self, name: str, amount: int = 1, **labels: str) -> None:
+        """
+        カウンターを加算する
+
+        Args:
+            name: カウンター名
+            amount: 加算する値
+            **labels: カウンターのラベル
+        """
+        counter = self._counters.setdefault(name, Counter())
+        counter[tuple(sorted(labels.items()))] += amount
+
+    def get(self, name: str, **labels: str) -> int:
+        """
+        カウンターの値を返す
+
+        Args:
+            name: カウンター名
+            **labels: カウンターのラベル。省略した場合はラベルを問わず合計する
+
+        Returns:
+            指定したラベルをすべて持つカウンターの合計
+        """
+        counter = self._counters.get(name, Counter())
+        return sum(
+            value
+            for key, value in counter.items()
+            if labels.items() <= dict(key).items()
+        )
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        """
+        すべてのカウンターを返す
+
+        Returns:
+            カウンター名 -> [{"labels": {...}, "value": 値}, ...]
+        """
+        return {
+            name: [
+                {"labels": dict(key), "value": value}
+                for key, value in sorted(counter.items())
+            ]
+            for name, counter in sorted(self._counters.items())
+        }
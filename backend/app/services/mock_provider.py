@@ -0,0 +1,157 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+
+from .context_window import estimate_tokens
+from .llm_provider import LLMProvider
+from .stream_events import StreamEvent, usage_event
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential")
+DEFAULT_TTFT = 0.2
+DEFAULT_TOKEN_LATENCY = 0.02
+DEFAULT_LATENCY_DISTRIBUTION = "fixed"
+DEFAULT_OUTPUT_TOKENS = 200
+DEFAULT_SEED = 0
+# RPM制限のウィンドウ（秒）
+RATE_LIMIT_WINDOW = 60.0
+
+# 応答に使う語（1語を1チャンクとして返す）
+WORDS = ("これは", "負荷試験", "用の", "モック", "応答", "です。", "lorem", "ipsum")
+
+
+class MockAPIError(Exception):
+    """MockProviderが注入するエラー（classify_errorはstatus_codeで分類する）"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MockProvider(LLMProvider):
+    """
+    負荷試験・ベンチマーク用のローカルなモックプロバイダー
+
+    外部APIを呼ばずに、設定した最初のチャンクまでの時間・チャンク間隔・
+    出力長で合成した応答をストリーミングする。エラーの注入とRPM制限
+    （429）の再現もでき、乱数のシードを固定すれば同じ順序の呼び出しに
+    同じ応答を返す。
+    """
+
+    def __init__(
+        self,
+        ttft: float | None = None,
+        token_latency: float | None = None,
+        latency_distribution: str | None = None,
+        output_tokens: int | None = None,
+        error_rate: float | None = None,
+        rpm: int | None = None,
+        seed: int | None = None,
+        transport: object | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        MockProviderを初期化
+
+        引数がNoneの場合は対応する環境変数（MOCK_LLM_*）から読み込む。
+
+        Args:
+            ttft: 最初のチャンクまでの平均秒数
+            token_latency: チャンク間の平均秒数
+            latency_distribution: 待ち時間の分布（fixed: 常に平均値,
+                uniform: 0〜平均の2倍の一様分布, exponential: 指数分布）
+            output_tokens: 1回の応答のチャンク数
+            error_rate: 最初のチャンクより前に500エラーを返す割合（0〜1）
+            rpm: 1分あたりのリクエスト数の上限。超えた分は429エラー（0で無制限）
+            seed: 乱数のシード
+            transport: レジストリから渡されるHTTP接続プール（使用しない）
+            clock: RPM制限に使う現在時刻（秒）を返す関数
+
+        Raises:
+            ValueError: 未知の分布が指定された場合
+        """
+        # 0も有効な値のため、Noneの場合のみ環境変数から読み込む
+        if ttft is None:
+            ttft = float(os.getenv("MOCK_LLM_TTFT", DEFAULT_TTFT))
+        self.ttft = ttft
+        if token_latency is None:
+            token_latency = float(
+                os.getenv("MOCK_LLM_TOKEN_LATENCY", DEFAULT_TOKEN_LATENCY)
+            )
+        self.token_latency = token_latency
+        self.latency_distribution = latency_distribution or os.getenv(
+            "MOCK_LLM_LATENCY_DISTRIBUTION", DEFAULT_LATENCY_DISTRIBUTION
+        )
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution: {self.latency_distribution}"
+            )
+        if output_tokens is None:
+            output_tokens = int(
+                os.getenv("MOCK_LLM_OUTPUT_TOKENS", DEFAULT_OUTPUT_TOKENS)
+            )
+        self.output_tokens = output_tokens
+        if error_rate is None:
+            error_rate = float(os.getenv("MOCK_LLM_ERROR_RATE", 0))
+        self.error_rate = error_rate
+        if rpm is None:
+            rpm = int(os.getenv("MOCK_LLM_RPM", 0))
+        self.rpm = rpm
+        if seed is None:
+            seed = int(os.getenv("MOCK_LLM_SEED", DEFAULT_SEED))
+        self.random = random.Random(seed)
+        self.clock = clock
+        self._requests: deque[float] = deque()
+
+    async def stream_chat(
+        self, messages: list[dict[str, str]], model: str
+    ) -> AsyncIterator[str | StreamEvent]:
+        """
+        合成した応答をストリーミングで返す
+
+        Args:
+            messages: チャット履歴
+            model: モデル名（応答には影響しない）
+
+        Yields:
+            合成したテキストのチャンク。最後にトークン使用量のusageイベント
+
+        Raises:
+            MockAPIError: RPM制限を超えた場合（429）、またはエラーを注入した場合（500）
+        """
+        self._admit()
+        fail = self.random.random() < self.error_rate
+        await asyncio.sleep(self._sample(self.ttft))
+        if fail:
+            raise MockAPIError(500, "Injected mock provider error")
+
+        for index in range(self.output_tokens):
+            if index:
+                await asyncio.sleep(self._sample(self.token_latency))
+            yield self.random.choice(WORDS)
+
+        yield usage_event(
+            input_tokens=sum(estimate_tokens(msg["content"]) for msg in messages),
+            output_tokens=self.output_tokens,
+        )
+
+    def _admit(self) -> None:
+        """RPM制限を超えている場合は429エラーを送出する。"""
+        if not self.rpm:
+            return
+        now = self.clock()
+        while self._requests and now - self._requests[0] >= RATE_LIMIT_WINDOW:
+            self._requests.popleft()
+        if len(self._requests) >= self.rpm:
+            raise MockAPIError(429, "Mock provider rate limit exceeded")
+        self._requests.append(now)
+
+    def _sample(self, mean: float) -> float:
+        """平均がmeanになる待ち時間を設定した分布から返す。"""
+        if mean <= 0 or self.latency_distribution == "fixed":
+            return max(mean, 0.0)
+        if self.latency_distribution == "uniform":
+            return self.random.uniform(0, 2 * mean)
+        return self.random.expovariate(1 / mean)
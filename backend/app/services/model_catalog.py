@@ -0,0 +1,121 @@
+import functools
+import os
+import tomllib
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+
+DEFAULT_CATALOG_PATH = Path(__file__).with_name("models.toml")
+
+_REQUIRED_FIELDS = ("provider", "name", "context_window", "max_output_tokens")
+
+
+class ModelSpec(NamedTuple):
+    """カタログに定義したモデル1件分の情報"""
+
+    id: str
+    provider: str
+    name: str
+    description: str
+    context_window: int
+    max_output_tokens: int
+    max_input_tokens: int | None = None
+    # 100万トークンあたりの料金（USD）
+    input_price: float | None = None
+    cached_input_price: float | None = None
+    output_price: float | None = None
+
+    @property
+    def input_token_budget(self) -> int:
+        """入力に使えるトークン数を返す。"""
+        if self.max_input_tokens is not None:
+            return self.max_input_tokens
+        return self.context_window - self.max_output_tokens
+
+
+class ModelCatalog:
+    """
+    モデルIDからモデル情報を引く不変のインデックス
+
+    起動時に1度だけ作成し、ルーティング（モデル -> プロバイダー）、
+    コンテキストウィンドウの予算、/api/models のすべてがこれを参照する。
+    """
+
+    def __init__(self, models: Iterable[ModelSpec]):
+        """
+        ModelCatalogを初期化
+
+        Args:
+            models: モデル情報（この順序で列挙する）
+
+        Raises:
+            ValueError: モデルIDが重複している場合
+        """
+        index: dict[str, ModelSpec] = {}
+        for spec in models:
+            if spec.id in index:
+                raise ValueError(f"Duplicate model in catalog: {spec.id}")
+            index[spec.id] = spec
+        self._models = MappingProxyType(index)
+        self.model_mapping = MappingProxyType(
+            {spec.id: spec.provider for spec in index.values()}
+        )
+
+    def __contains__(self, model: object) -> bool:
+        return model in self._models
+
+    def __iter__(self) -> Iterator[ModelSpec]:
+        return iter(self._models.values())
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def get(self, model: str) -> ModelSpec | None:
+        """モデル情報を返す。カタログに無い場合はNone。"""
+        return self._models.get(model)
+
+    def input_token_budgets(self) -> dict[str, int]:
+        """モデルID -> 入力トークン予算を返す。"""
+        return {spec.id: spec.input_token_budget for spec in self}
+
+
+def load_catalog(path: str | Path | None = None) -> ModelCatalog:
+    """
+    TOMLファイルからモデルカタログを読み込む
+
+    Args:
+        path: カタログのファイル。Noneの場合は環境変数MODEL_CATALOG
+            （未設定なら同梱のmodels.toml）
+
+    Returns:
+        モデルカタログ
+
+    Raises:
+        ValueError: 必須項目が無いなど、定義が不正な場合
+    """
+    path = Path(path or os.getenv("MODEL_CATALOG") or DEFAULT_CATALOG_PATH)
+    with path.open("rb") as f:
+        data = tomllib.load(f)
+
+    specs = []
+    for model_id, fields in data.get("models", {}).items():
+        missing = [name for name in _REQUIRED_FIELDS if name not in fields]
+        if missing:
+            raise ValueError(
+                f"Model {model_id} in {path} is missing: {', '.join(missing)}"
+            )
+        unknown = set(fields) - set(ModelSpec._fields[1:])
+        if unknown:
+            raise ValueError(
+                f"Model {model_id} in {path} has unknown fields: "
+                f"{', '.join(sorted(unknown))}"
+            )
+        specs.append(ModelSpec(model_id, **{"description": "", **fields}))
+    return ModelCatalog(specs)
+
+
+@functools.cache
+def default_catalog() -> ModelCatalog:
+    """起動時に読み込んだモデルカタログを返す（2回目以降は同じインスタンス）。"""
+    return load_catalog()
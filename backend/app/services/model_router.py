@@ -0,0 +1,69 @@
+import os
+from collections.abc import Callable
+
+from .circuit_breaker import CircuitBreaker
+
+
+class ModelRouter:
+    """
+    モデルのフォールバックチェーンとプロバイダーごとのサーキットブレーカーを管理する
+
+    要求されたモデルのプロバイダーが劣化している場合に、チェーンの次のモデル
+    （別プロバイダーのモデル）で応答を生成できるようにする。
+    """
+
+    def __init__(
+        self,
+        fallbacks: dict[str, list[str]] | None = None,
+        breaker_factory: Callable[[str], CircuitBreaker] = CircuitBreaker,
+    ):
+        """
+        ModelRouterを初期化
+
+        Args:
+            fallbacks: モデル名 -> 代替モデル名のリスト（優先順）。Noneの場合は
+                環境変数MODEL_FALLBACKS
+                （"claude-sonnet-4-5=gpt-5.2>gemini-3-flash-preview,..."形式）
+            breaker_factory: プロバイダー名からサーキットブレーカーを作成する関数
+        """
+        if fallbacks is None:
+            fallbacks = parse_fallbacks(os.getenv("MODEL_FALLBACKS", ""))
+        self.fallbacks = fallbacks
+        self.breaker_factory = breaker_factory
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def candidates(self, model: str) -> list[str]:
+        """要求されたモデルと代替モデルを試す順に返す。"""
+        chain = [model]
+        for fallback in self.fallbacks.get(model, []):
+            if fallback not in chain:
+                chain.append(fallback)
+        return chain
+
+    def breaker(self, provider_name: str) -> CircuitBreaker:
+        """プロバイダーのサーキットブレーカーを返す。"""
+        breaker = self._breakers.get(provider_name)
+        if breaker is None:
+            breaker = self._breakers[provider_name] = self.breaker_factory(
+                provider_name
+            )
+        return breaker
+
+
+def parse_fallbacks(value: str) -> dict[str, list[str]]:
+    """
+    "model=fallback1>fallback2,model=fallback"形式の設定を辞書に変換する
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    fallbacks = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model, separator, chain = item.partition("=")
+        if not separator or not chain.strip():
+            raise ValueError(f"Invalid fallback chain: {item}")
+        fallbacks[model.strip()] = [name.strip() for name in chain.split(">")]
+    return fallbacks
@@ -1,29 +1,55 @@
+import hashlib
+import json
 import os
 from collections.abc import AsyncIterator
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
-from .llm_provider import LLMProvider
+from .http_transport import ProviderTransport, model_headers
+from .llm_provider import LLMProvider, conversation_scope
+from .stream_events import StreamEvent, usage_event
 
 
 class OpenAIProvider(LLMProvider):
     """OpenAI APIの実装"""
 
-    def __init__(self, api_key: str | None = None):
+    def __init__(
+        self,
+        api_key: str | None = None,
+        transport: ProviderTransport | None = None,
+        prompt_caching: bool | None = None,
+    ):
         """
         OpenAIProviderを初期化
 
         Args:
             api_key: OpenAI APIキー。Noneの場合は環境変数から読み込む
+            transport: HTTP接続プールの設定。Noneの場合はSDKのデフォルト
+            prompt_caching: プレフィックスキャッシュを利用するか。Noneの場合は
+                環境変数PROMPT_CACHING（既定は有効）
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY is not set")
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        if prompt_caching is None:
+            prompt_caching = os.getenv("PROMPT_CACHING", "true").lower() in (
+                "1",
+                "true",
+            )
+        self.prompt_caching = prompt_caching
+        if transport is not None:
+            self.http_client = transport.create_client(
+                DefaultAsyncHttpxClient, "openai"
+            )
+        # 再試行はLLMServiceで最初のチャンクより前の失敗に限って行う
+        self.client = AsyncOpenAI(
+            api_key=self.api_key, http_client=self.http_client, max_retries=0
+        )
+        self.base_url = str(self.client.base_url)
 
     async def stream_chat(
         self, messages: list[dict[str, str]], model: str
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[str | StreamEvent]:
         """
         OpenAI APIを使用してストリーミングチャットを処理
 
@@ -32,7 +58,7 @@ class OpenAIProvider(LLMProvider):
             model: 使用するモデル名
 
         Yields:
-            生成されたテキストのチャンク
+            生成されたテキストのチャンク。最後にトークン使用量のusageイベント
         """
         input_messages = [
             {
@@ -44,12 +70,64 @@ class OpenAIProvider(LLMProvider):
             if msg.get("role") in ("user", "assistant", "system", "developer")
         ]
 
-        async with self.client.responses.stream(
-            model=model,
-            input=input_messages,
-        ) as stream:
+        params = {
+            "model": model,
+            "input": input_messages,
+            "extra_headers": model_headers(model),
+        }
+        if self.prompt_caching:
+            # 同じ会話のリクエストを同じキャッシュに振り分ける
+            params["prompt_cache_key"] = prefix_cache_key(
+                messages, model, conversation_scope.get()
+            )
+
+        async with self.client.responses.stream(**params) as stream:
             async for event in stream:
                 if event.type == "response.output_text.delta":
                     yield event.delta
+                elif event.type == "response.completed":
+                    usage = event.response.usage
+                    if usage is not None:
+                        yield usage_event(
+                            input_tokens=usage.input_tokens,
+                            output_tokens=usage.output_tokens,
+                            cached_tokens=usage.input_tokens_details.cached_tokens,
+                        )
                 elif event.type == "error":
                     raise RuntimeError(event.message)
+
+
+def prefix_cache_key(
+    messages: list[dict[str, str]], model: str, scope: str | None = None
+) -> str:
+    """
+    プレフィックスキャッシュの振り分けキーを作成する
+
+    モデル、会話のスコープ（会話ID）、システムプロンプト、会話の先頭
+    （最初のユーザーメッセージまで）から作成するため、同じ会話ではターンが
+    進んでも同じキーになり、同じ書き出しの別の会話やモデルとは分かれる。
+
+    Args:
+        messages: プロバイダーに送るメッセージ列
+        model: モデル名
+        scope: 会話ID。Noneの場合は会話の先頭のみで区別する
+
+    Returns:
+        32文字の16進文字列
+    """
+    system = [
+        msg.get("content")
+        for msg in messages
+        if msg.get("role") in ("system", "developer")
+    ]
+    prefix = []
+    for msg in messages:
+        prefix.append([msg.get("role"), msg.get("content")])
+        if msg.get("role") == "user":
+            break
+    payload = json.dumps(
+        {"model": model, "scope": scope, "system": system, "prefix": prefix},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
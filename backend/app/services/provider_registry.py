@@ -0,0 +1,120 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator, Mapping
+
+from .http_transport import ProviderTransport
+from .llm_provider import LLMProvider
+from .model_catalog import ModelCatalog
+
+logger = logging.getLogger(__name__)
+
+# プロバイダー名 -> (モジュール, クラス名, APIキーの環境変数（いずれかが設定されていれば有効）)
+PROVIDER_SPECS: dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "openai": (".openai_provider", "OpenAIProvider", ("OPENAI_API_KEY",)),
+    "claude": (".claude_provider", "ClaudeProvider", ("ANTHROPIC_API_KEY",)),
+    "google": (
+        ".google_provider",
+        "GoogleProvider",
+        ("GEMINI_API_KEY", "GOOGLE_API_KEY"),
+    ),
+    # 負荷試験用のモック（MOCK_LLM=trueで有効）
+    "mock": (".mock_provider", "MockProvider", ("MOCK_LLM",)),
+}
+
+
+def load_provider_class(module: str, class_name: str) -> type[LLMProvider]:
+    """プロバイダーのモジュール（とSDK）を読み込み、クラスを返す。"""
+    return getattr(importlib.import_module(module, __package__), class_name)
+
+
+class ProviderRegistry(Mapping[str, LLMProvider]):
+    """
+    プロバイダーを初回利用時に生成するレジストリ
+
+    APIキーの有無は環境変数だけで判定し、SDKのモジュールの読み込みと
+    クライアントの生成はそのプロバイダーのモデルが初めて使われるまで遅らせる。
+    起動時やテストの収集時に、使わないSDKの読み込み時間を払わないようにする。
+    """
+
+    def __init__(
+        self,
+        transport: ProviderTransport,
+        specs: dict[str, tuple[str, str, tuple[str, ...]]] | None = None,
+        catalog: ModelCatalog | None = None,
+    ):
+        """
+        ProviderRegistryを初期化
+
+        Args:
+            transport: プロバイダーのSDKクライアントに注入するHTTP接続プール
+            specs: プロバイダー名 -> (モジュール, クラス名, APIキーの環境変数)。
+                Noneの場合はPROVIDER_SPECS
+            catalog: 生成したプロバイダーに設定するモデルカタログ
+        """
+        self.transport = transport
+        self.catalog = catalog
+        self.specs = PROVIDER_SPECS if specs is None else specs
+        # APIキーが設定されているプロバイダー（未生成を含む）
+        self._configured = [
+            name
+            for name, (_, _, env_keys) in self.specs.items()
+            if any(_is_set(os.getenv(key)) for key in env_keys)
+        ]
+        self._providers: dict[str, LLMProvider] = {}
+        # 事前読み込みのスレッドとリクエストで二重に生成しないためのロック
+        self._lock = threading.Lock()
+
+    def register(self, name: str, provider: LLMProvider) -> None:
+        """生成済みのプロバイダーを登録する。"""
+        self._providers[name] = provider
+
+    def is_loaded(self, name: str) -> bool:
+        """プロバイダーが生成済みか返す。"""
+        return name in self._providers
+
+    def loaded(self) -> dict[str, LLMProvider]:
+        """生成済みのプロバイダーを返す（SDKは読み込まない）。"""
+        return dict(self._providers)
+
+    def __contains__(self, name: object) -> bool:
+        # 生成せずにAPIキーの有無だけで判定する
+        return name in self._providers or name in self._configured
+
+    def __getitem__(self, name: str) -> LLMProvider:
+        provider = self._providers.get(name)
+        if provider is not None:
+            return provider
+        if name not in self._configured:
+            raise KeyError(name)
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider is None:
+                provider = self._providers[name] = self._create(name)
+        return provider
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._providers
+        for name in self._configured:
+            if name not in self._providers:
+                yield name
+
+    def __len__(self) -> int:
+        return len(set(self._providers) | set(self._configured))
+
+    def _create(self, name: str) -> LLMProvider:
+        module, class_name, _ = self.specs[name]
+        started = time.perf_counter()
+        provider = load_provider_class(module, class_name)(transport=self.transport)
+        provider.catalog = self.catalog
+        logger.info(
+            "Loaded provider %s in %.0fms", name, (time.perf_counter() - started) * 1000
+        )
+        return provider
+
+
+def _is_set(value: str | None) -> bool:
+    """環境変数が設定されているか（"false"や"0"は未設定として扱う）。"""
+    return bool(value) and value.lower() not in ("0", "false")
@@ -0,0 +1,265 @@
+import email.utils
+import logging
+import os
+import time
+from collections.abc import Callable, Mapping
+
+from .admission import AdmissionError, parse_limits
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WAIT = 60.0
+
+# レート制限ヘッダー名（OpenAI互換, Anthropic）。{kind}はrequestsまたはtokens
+_LIMIT_HEADERS = ("x-ratelimit-limit-{kind}", "anthropic-ratelimit-{kind}-limit")
+_REMAINING_HEADERS = (
+    "x-ratelimit-remaining-{kind}",
+    "anthropic-ratelimit-{kind}-remaining",
+)
+_BUCKET_KINDS = {"requests": "rpm", "tokens": "tpm"}
+
+
+class RateLimitExceededError(AdmissionError):
+    """レート制限の待ち時間が上限を超える"""
+
+
+class TokenBucket:
+    """
+    1分あたりの上限を持つトークンバケット
+
+    予約時に残量から差し引き（不足分は負の残量として借りる）、
+    残量が0に戻るまでの時間を待ち時間として返す。待つリクエストは
+    予約順に間隔を空けて送信される。
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        """
+        TokenBucketを初期化
+
+        Args:
+            per_minute: 1分あたりの上限（リクエスト数またはトークン数）
+            clock: 現在時刻（秒）を返す関数
+        """
+        self.clock = clock
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = clock()
+
+    @property
+    def rate(self) -> float:
+        """1秒あたりの補充量。"""
+        return self.capacity / 60
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        残量から予約し、送信までに待つべき秒数を返す
+
+        上限を超える量は上限に丸める（1回の要求が永遠に通らないことを防ぐ）。
+        """
+        self._refill()
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """送信しなかった予約分を返却する。"""
+        self._refill()
+        self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+    def update_limit(self, per_minute: float) -> None:
+        """プロバイダーが通知した上限に合わせる。"""
+        self._refill()
+        self.capacity = float(per_minute)
+        self.level = min(self.level, self.capacity)
+
+    def update_remaining(self, remaining: float) -> None:
+        """プロバイダーが通知した残量を超えないよう残量を減らす。"""
+        self._refill()
+        self.level = min(self.level, float(remaining))
+
+
+class Reservation:
+    """レート制限の予約（送信しなかった場合はcancelで返却する）"""
+
+    def __init__(self, delay: float, entries: list[tuple[TokenBucket, float]]):
+        self.delay = delay
+        self._entries = entries
+
+    def cancel(self) -> None:
+        for bucket, amount in self._entries:
+            bucket.refund(amount)
+        self._entries = []
+
+
+class RateLimiter:
+    """
+    プロバイダー/モデル単位のRPM・TPMトークンバケット
+
+    送信前に予約して必要なだけ待つことで、上流のレート制限エラーを
+    事前に回避する。チャットの応答ヘッダー（retry-after、上限と残量）を
+    取り込み、実行時にモデル単位の予算を調整する。
+    """
+
+    def __init__(
+        self,
+        provider_rpm: dict[str, int] | None = None,
+        provider_tpm: dict[str, int] | None = None,
+        model_rpm: dict[str, int] | None = None,
+        model_tpm: dict[str, int] | None = None,
+        max_wait: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        RateLimiterを初期化
+
+        上限の辞書がNoneの場合は対応する環境変数（"name=limit,..."形式）から
+        読み込む: PROVIDER_RPM_LIMITS, PROVIDER_TPM_LIMITS, MODEL_RPM_LIMITS,
+        MODEL_TPM_LIMITS。設定の無いプロバイダー/モデルは制限しない。
+
+        Args:
+            provider_rpm: プロバイダーごとの1分あたりのリクエスト数
+            provider_tpm: プロバイダーごとの1分あたりの推定トークン数
+            model_rpm: モデルごとの1分あたりのリクエスト数
+            model_tpm: モデルごとの1分あたりの推定トークン数
+            max_wait: 待ち時間の上限秒数。Noneの場合は環境変数RATE_LIMIT_MAX_WAIT
+            clock: 現在時刻（秒）を返す関数
+        """
+        self.clock = clock
+        self.max_wait = max_wait or float(
+            os.getenv("RATE_LIMIT_MAX_WAIT", DEFAULT_MAX_WAIT)
+        )
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+        self._paused_until: dict[str, float] = {}
+
+        configured = {
+            ("rpm", "provider"): provider_rpm,
+            ("tpm", "provider"): provider_tpm,
+            ("rpm", "model"): model_rpm,
+            ("tpm", "model"): model_tpm,
+        }
+        for (kind, scope), limits in configured.items():
+            if limits is None:
+                env_name = f"{scope.upper()}_{kind.upper()}_LIMITS"
+                limits = parse_limits(os.getenv(env_name, ""))
+            for name, per_minute in limits.items():
+                self._buckets[(kind, f"{scope}:{name}")] = TokenBucket(
+                    per_minute, clock
+                )
+
+    def reserve(self, provider_name: str, model: str, tokens: int) -> Reservation:
+        """
+        1リクエスト分を予約する
+
+        Args:
+            provider_name: プロバイダー名
+            model: モデル名
+            tokens: リクエストの推定トークン数
+
+        Returns:
+            送信までに待つ秒数（delay）を持つ予約
+
+        Raises:
+            RateLimitExceededError: 待ち時間がmax_waitを超える場合
+        """
+        entries = []
+        delay = max(0.0, self._paused_until.get(model, 0.0) - self.clock())
+        for key in (f"provider:{provider_name}", f"model:{model}"):
+            for kind, amount in (("rpm", 1), ("tpm", tokens)):
+                bucket = self._buckets.get((kind, key))
+                if bucket is None:
+                    continue
+                delay = max(delay, bucket.reserve(amount))
+                entries.append((bucket, amount))
+
+        reservation = Reservation(delay, entries)
+        if delay > self.max_wait:
+            reservation.cancel()
+            raise RateLimitExceededError(
+                f"Rate limit for {provider_name}/{model} requires waiting "
+                f"{delay:.1f}s (max {self.max_wait}s)"
+            )
+        return reservation
+
+    def observe_headers(
+        self, provider_name: str, model: str, headers: Mapping[str, str]
+    ) -> None:
+        """
+        チャットの応答ヘッダーから予算を調整する
+
+        上流のレート制限はモデルごとに掛かるため、retry-after / retry-after-ms の
+        間はそのモデルへの送信を止め、上限と残量のヘッダーがあれば
+        モデル単位のバケットに反映する。
+
+        Args:
+            provider_name: プロバイダー名
+            model: リクエストのモデル名
+            headers: 応答ヘッダー
+        """
+        retry_after = _parse_retry_after(headers)
+        if retry_after is not None:
+            until = self.clock() + retry_after
+            if until > self._paused_until.get(model, 0.0):
+                self._paused_until[model] = until
+                logger.warning(
+                    "Provider %s asked to retry %s after %.1fs",
+                    provider_name,
+                    model,
+                    retry_after,
+                )
+
+        for header_kind, kind in _BUCKET_KINDS.items():
+            limit = _first_number(headers, _LIMIT_HEADERS, header_kind)
+            remaining = _first_number(headers, _REMAINING_HEADERS, header_kind)
+            if limit is None and remaining is None:
+                continue
+
+            key = (kind, f"model:{model}")
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if limit is None:
+                    continue
+                bucket = self._buckets[key] = TokenBucket(limit, self.clock)
+            elif limit is not None and limit != bucket.capacity:
+                bucket.update_limit(limit)
+            if remaining is not None:
+                bucket.update_remaining(remaining)
+
+
+def _first_number(
+    headers: Mapping[str, str], names: tuple[str, ...], kind: str
+) -> float | None:
+    for name in names:
+        value = headers.get(name.format(kind=kind))
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+def _parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """retry-after-ms（ミリ秒）またはretry-after（秒またはHTTP日付）を秒で返す。"""
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from datetime import UTC, datetime
+
+from app.repositories.async_message_repository import AsyncMessageRepository
+
+from .metrics import MetricsRegistry
+from .stream_events import StreamEvent, cache_event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 3600.0
+
+
+def normalize_messages(messages: list[dict[str, str]]) -> list[dict[str, str]]:
+    """
+    キャッシュキー用にメッセージ列を正規化する
+
+    役割と内容のみを残し、改行コードと前後の空白の違いを無視する。
+    """
+    return [
+        {
+            "role": msg["role"],
+            "content": msg["content"].replace("\r\n", "\n").strip(),
+        }
+        for msg in messages
+    ]
+
+
+class ResponseCache:
+    """
+    同一のプロンプトに対する応答のキャッシュ
+
+    正規化したメッセージ列・モデル・パラメーターのハッシュをキーに、
+    応答のチャンク列をTTL付きのLRUに保持する。リポジトリを指定した場合は
+    SQLiteのresponse_cacheテーブルにも保存し、再起動後やメモリから
+    追い出された後も再利用する。テーブルも保存のたびに期限切れの応答を削除し、
+    max_entries件を超えないよう古い応答から削除する。
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        ttl: float | None = None,
+        excluded_models: set[str] | None = None,
+        default_models: set[str] | None = None,
+        repository: AsyncMessageRepository | None = None,
+        metrics: MetricsRegistry | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        ResponseCacheを初期化
+
+        Args:
+            max_entries: メモリとテーブルそれぞれに保持する応答数。Noneの場合は
+                環境変数RESPONSE_CACHE_SIZE
+            ttl: 応答の有効期間（秒）。Noneの場合は環境変数RESPONSE_CACHE_TTL
+            excluded_models: キャッシュしないモデル。Noneの場合は
+                環境変数RESPONSE_CACHE_EXCLUDED_MODELS（カンマ区切り）
+            default_models: リクエストでcacheを指定しない場合もキャッシュする
+                モデル（"*"はすべてのモデル）。Noneの場合は環境変数
+                RESPONSE_CACHE_MODELS（カンマ区切り）
+            repository: 応答を永続化するリポジトリ。Noneの場合はメモリのみ
+            metrics: ヒット/ミスを記録するカウンター
+            clock: 現在時刻（UNIX時間の秒）を返す関数
+        """
+        self.max_entries = max_entries or int(
+            os.getenv("RESPONSE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)
+        )
+        self.ttl = ttl or float(os.getenv("RESPONSE_CACHE_TTL", DEFAULT_TTL))
+        if excluded_models is None:
+            excluded_models = _parse_models(
+                os.getenv("RESPONSE_CACHE_EXCLUDED_MODELS", "")
+            )
+        self.excluded_models = excluded_models
+        if default_models is None:
+            default_models = _parse_models(os.getenv("RESPONSE_CACHE_MODELS", ""))
+        self.default_models = default_models
+        self.repository = repository
+        self.metrics = metrics or MetricsRegistry()
+        self.clock = clock
+        # キー -> (チャンク列, 有効期限)
+        self._entries: OrderedDict[str, tuple[list[str], float]] = OrderedDict()
+
+    def enabled_for(self, model: str, requested: bool | None = None) -> bool:
+        """
+        モデルの応答をキャッシュするか返す
+
+        生成は非決定的なため、リクエストで許可した場合と、サーバーの設定で
+        既定でキャッシュするモデルの場合のみキャッシュする。
+
+        Args:
+            model: モデル名
+            requested: リクエストのcacheの値（Noneの場合はサーバーの設定に従う）
+        """
+        if model in self.excluded_models:
+            return False
+        if requested is not None:
+            return requested
+        return "*" in self.default_models or model in self.default_models
+
+    @staticmethod
+    def key(
+        messages: list[dict[str, str]], model: str, params: dict | None = None
+    ) -> str:
+        """
+        キャッシュキーを作成する
+
+        Args:
+            messages: プロバイダーに送るメッセージ列
+            model: モデル名
+            params: 応答に影響する生成パラメーター
+
+        Returns:
+            SHA-256の16進文字列
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "params": params or {},
+                "messages": normalize_messages(messages),
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, model: str) -> list[str] | None:
+        """
+        キャッシュした応答のチャンク列を返す
+
+        Args:
+            key: keyで作成したキャッシュキー
+            model: ヒット/ミスの記録に使うモデル名
+
+        Returns:
+            チャンク列。キャッシュに無い、または期限切れの場合はNone
+        """
+        chunks = self._get_memory(key)
+        if chunks is None and self.repository is not None:
+            chunks = await self._get_persisted(key)
+
+        if chunks is None:
+            self.metrics.increment("response_cache_misses_total", model=model)
+        else:
+            self.metrics.increment("response_cache_hits_total", model=model)
+        return chunks
+
+    async def put(self, key: str, model: str, chunks: list[str]) -> None:
+        """
+        応答をキャッシュに保存する
+
+        メモリには即座に保存し、その後テーブルへの保存と古い応答の削除を行う。
+        永続化に失敗してもメモリのキャッシュは有効なので、ログのみ出力する。
+
+        Args:
+            key: keyで作成したキャッシュキー
+            model: 応答したモデル
+            chunks: 応答のチャンク列
+        """
+        expires_at = self.clock() + self.ttl
+        self._put_memory(key, list(chunks), expires_at)
+        if self.repository is None:
+            return
+        try:
+            await self.repository.save_cached_response(
+                key,
+                model,
+                json.dumps(chunks, ensure_ascii=False),
+                _to_utc_naive(expires_at),
+            )
+        except Exception as e:
+            logger.error("Failed to persist cached response: %s", e)
+            return
+        await self.prune()
+
+    async def prune(self) -> None:
+        """テーブルから期限切れの応答とmax_entries件を超える古い応答を削除する。"""
+        if self.repository is None:
+            return
+        try:
+            deleted = await self.repository.prune_cached_responses(self.max_entries)
+        except Exception as e:
+            logger.error("Failed to prune cached responses: %s", e)
+            return
+        if deleted:
+            logger.info("Pruned %d cached responses", deleted)
+
+    def _get_memory(self, key: str) -> list[str] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        chunks, expires_at = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return chunks
+
+    def _put_memory(self, key: str, chunks: list[str], expires_at: float) -> None:
+        self._entries[key] = (chunks, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_persisted(self, key: str) -> list[str] | None:
+        try:
+            cached = await self.repository.get_cached_response(key)
+        except Exception as e:
+            logger.error("Failed to read cached response: %s", e)
+            return None
+        if cached is None:
+            return None
+
+        expires_at = cached.expires_at.replace(tzinfo=UTC).timestamp()
+        if expires_at <= self.clock():
+            return None
+        chunks = json.loads(cached.chunks)
+        self._put_memory(key, chunks, expires_at)
+        return chunks
+
+
+def _parse_models(value: str) -> set[str]:
+    """カンマ区切りのモデル名を集合にする。"""
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def _to_utc_naive(timestamp: float) -> datetime:
+    """UNIX時間をDBに保存する形式（タイムゾーン無しのUTC）に変換する。"""
+    return datetime.fromtimestamp(timestamp, UTC).replace(tzinfo=None)
+
+
+async def replay(chunks: list[str]) -> AsyncIterator[str | StreamEvent]:
+    """
+    キャッシュした応答をLLMService.stream_chatと同じ形式で返す
+
+    Yields:
+        cacheイベントの後、キャッシュしたチャンク
+    """
+    yield cache_event()
+    for chunk in chunks:
+        yield chunk
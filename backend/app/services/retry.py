@@ -0,0 +1,160 @@
+import os
+import random
+import sys
+from collections.abc import Callable
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+# 最初の試行開始からの再試行の締め切り（秒）
+DEFAULT_DEADLINE = 30.0
+
+# エラーの分類
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+CONNECTION = "connection"
+TIMEOUT = "timeout"
+AUTH = "auth"
+CLIENT = "client"
+UNKNOWN = "unknown"
+
+RETRYABLE_KINDS = frozenset({RATE_LIMIT, SERVER, CONNECTION, TIMEOUT})
+
+# 例外型で判定するSDK。SDKはプロバイダーの初回利用時に読み込むため、
+# 読み込み済みのSDKの例外型だけを使う（読み込まれていないSDKの例外は送出されない）
+_SDK_MODULES = ("openai", "anthropic")
+
+
+def _sdk_errors(*names: str) -> tuple[type, ...]:
+    """読み込み済みのSDKから指定した名前の例外型を集める。"""
+    return tuple(
+        getattr(module, name)
+        for module in map(sys.modules.get, _SDK_MODULES)
+        if module is not None
+        for name in names
+    )
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    プロバイダー呼び出しのエラーを分類する
+
+    SDKの例外型とHTTPステータス（SDK以外の例外はstatus_code属性）で判定する。
+    ストリームの途中で切断された場合など、SDKが包まずに送出する
+    httpx系のトランスポートエラーも接続エラーとして扱う。
+
+    Args:
+        error: プロバイダーが送出した例外
+
+    Returns:
+        エラーの分類（RATE_LIMIT, SERVER, CONNECTION, TIMEOUT, AUTH, CLIENT, UNKNOWN）
+    """
+    if isinstance(error, _sdk_errors("RateLimitError")):
+        return RATE_LIMIT
+    if isinstance(error, _sdk_errors("APITimeoutError")):
+        return TIMEOUT
+    if isinstance(error, _sdk_errors("APIConnectionError")):
+        return CONNECTION
+    if isinstance(error, _sdk_errors("AuthenticationError", "PermissionDeniedError")):
+        return AUTH
+    if isinstance(error, _sdk_errors("APIStatusError")):
+        if error.status_code == 408:
+            return TIMEOUT
+        if error.status_code >= 500:
+            return SERVER
+        return CLIENT
+
+    # SDK以外（MockProviderなど）でHTTPステータスを持つ例外
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        if status_code == 429:
+            return RATE_LIMIT
+        if status_code in (401, 403):
+            return AUTH
+        if status_code == 408:
+            return TIMEOUT
+        if status_code >= 500:
+            return SERVER
+        return CLIENT
+
+    # SDKのバージョンによってhttpxまたはその後継パッケージの例外になるため名前で判定する
+    names = {base.__name__ for base in type(error).__mro__}
+    if "TimeoutException" in names:
+        return TIMEOUT
+    if "TransportError" in names:
+        return CONNECTION
+    return UNKNOWN
+
+
+class RetryPolicy:
+    """
+    一時的なエラーに対する再試行の方針
+
+    指数バックオフにフルジッター（0〜上限の一様乱数）を加えた待ち時間で再試行し、
+    試行回数と最初の試行からの締め切りの両方で打ち切る。
+    """
+
+    def __init__(
+        self,
+        max_attempts: int | None = None,
+        base_delay: float | None = None,
+        max_delay: float | None = None,
+        deadline: float | None = None,
+        random_func: Callable[[], float] = random.random,
+    ):
+        """
+        RetryPolicyを初期化
+
+        引数がNoneの場合は対応する環境変数（LLM_RETRY_*）から読み込む。
+
+        Args:
+            max_attempts: 最初の試行を含む最大試行回数（1で再試行しない）
+            base_delay: 1回目の再試行の待ち時間の上限秒数
+            max_delay: 待ち時間の上限秒数
+            deadline: 最初の試行開始からの締め切り秒数
+            random_func: 0以上1未満の乱数を返す関数
+        """
+        if max_attempts is None:
+            max_attempts = int(
+                os.getenv("LLM_RETRY_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+            )
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay or float(
+            os.getenv("LLM_RETRY_BASE_DELAY", DEFAULT_BASE_DELAY)
+        )
+        self.max_delay = max_delay or float(
+            os.getenv("LLM_RETRY_MAX_DELAY", DEFAULT_MAX_DELAY)
+        )
+        self.deadline = deadline or float(
+            os.getenv("LLM_RETRY_DEADLINE", DEFAULT_DEADLINE)
+        )
+        self.random_func = random_func
+
+    def backoff(self, attempt: int) -> float:
+        """
+        再試行までの待ち時間を返す
+
+        Args:
+            attempt: 失敗した試行の番号（1始まり）
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling * self.random_func()
+
+    def next_delay(self, kind: str, attempt: int, elapsed: float) -> float | None:
+        """
+        再試行する場合の待ち時間を返す
+
+        Args:
+            kind: classify_errorによるエラーの分類
+            attempt: 失敗した試行の番号（1始まり）
+            elapsed: 最初の試行開始からの経過秒数
+
+        Returns:
+            待ち時間（秒）。再試行しない場合はNone
+        """
+        if kind not in RETRYABLE_KINDS or attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if elapsed + delay >= self.deadline:
+            return None
+        return delay
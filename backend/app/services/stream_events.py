@@ -0,0 +1,103 @@
+class StreamEvent:
+    """
+    LLMServiceがテキストチャンクの間に返すメタ情報イベント
+
+    SSEでは {"<event>": {...}} 形式の独立したフレームとして送信する。
+    """
+
+    def __init__(self, event: str, **data):
+        """
+        StreamEventを初期化
+
+        Args:
+            event: イベント名（SSEペイロードのキー）
+            **data: イベントの内容
+        """
+        self.event = event
+        self.data = data
+
+    def to_payload(self) -> dict:
+        """SSEフレームに載せるペイロードを返す。"""
+        return {self.event: self.data}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, StreamEvent):
+            return NotImplemented
+        return self.event == other.event and self.data == other.data
+
+    def __repr__(self):
+        return f"<StreamEvent(event={self.event}, data={self.data})>"
+
+
+def queue_event(position: int, wait_ms: int) -> StreamEvent:
+    """
+    同時実行数の上限による待機状況のイベントを作成する
+
+    Args:
+        position: 待ち行列での順番（1始まり）。0は実行開始
+        wait_ms: これまでの待ち時間（ミリ秒）
+    """
+    return StreamEvent("queue", position=position, wait_ms=wait_ms)
+
+
+def throttle_event(wait_ms: int) -> StreamEvent:
+    """
+    レート制限の予算待ちで送信を遅らせることを通知するイベントを作成する
+
+    Args:
+        wait_ms: 送信までの待ち時間（ミリ秒）
+    """
+    return StreamEvent("throttle", wait_ms=wait_ms)
+
+
+def retry_event(attempt: int, wait_ms: int, reason: str) -> StreamEvent:
+    """
+    一時的なエラーにより応答の生成を再試行することを通知するイベントを作成する
+
+    Args:
+        attempt: 次の試行の番号（2始まり）
+        wait_ms: 再試行までの待ち時間（ミリ秒）
+        reason: エラーの分類（rate_limit, server, connection, timeout）
+    """
+    return StreamEvent("retry", attempt=attempt, wait_ms=wait_ms, reason=reason)
+
+
+def model_event(model: str, requested: str, reason: str) -> StreamEvent:
+    """
+    要求されたモデルの代わりに代替モデルで応答を生成することを通知するイベントを作成する
+
+    Args:
+        model: 応答を生成するモデル
+        requested: 要求されたモデル
+        reason: 切り替えの理由（エラーの分類、またはcircuit_open）
+    """
+    return StreamEvent("model", model=model, requested=requested, reason=reason)
+
+
+def cache_event() -> StreamEvent:
+    """応答キャッシュから再生することを通知するイベントを作成する。"""
+    return StreamEvent("cache", hit=True)
+
+
+def usage_event(
+    input_tokens: int,
+    output_tokens: int,
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0,
+) -> StreamEvent:
+    """
+    プロバイダーが報告したトークン使用量のイベントを作成する
+
+    Args:
+        input_tokens: 入力トークン数（プレフィックスキャッシュから読んだ分を含む）
+        output_tokens: 出力トークン数
+        cached_tokens: プレフィックスキャッシュから読んだ入力トークン数
+        cache_write_tokens: プレフィックスキャッシュに書き込んだ入力トークン数
+    """
+    return StreamEvent(
+        "usage",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=cached_tokens,
+        cache_write_tokens=cache_write_tokens,
+    )
@@ -0,0 +1,366 @@
+"""
+/api/chat のSSEストリーミングのエンドツーエンド負荷試験
+
+モックプロバイダー（MOCK_LLM）を有効にしたアプリを子プロセスのuvicorn
+（1ワーカー）で起動し、非同期HTTPクライアントで同時にN本のストリームを開く。
+最初のチャンクまでの時間（TTFT）、チャンク間隔のパーセンタイル、スループット、
+サーバーのイベントループの遅延、DB書き込みの所要時間をJSONに書き出す。
+--compare で以前の結果との差分を表示し、コミット間の性能の退行を確認できる。
+
+実行例:
+    uv run python -m benchmarks.bench_chat_load
+    uv run python -m benchmarks.bench_chat_load --concurrency 500 --requests 2000 \\
+        --output results/chat_load.json --compare results/chat_load_main.json
+    # 起動済みのサーバーに対して実行する（サーバー側の計測は行わない）
+    uv run python -m benchmarks.bench_chat_load --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MODEL = "mock-llm"
+READY_TIMEOUT = 30.0
+# --compare で比較する指標
+COMPARED_METRICS = (
+    ("ttft_ms", "p50"),
+    ("ttft_ms", "p99"),
+    ("inter_token_ms", "p50"),
+    ("inter_token_ms", "p99"),
+    ("event_loop_lag_ms", "p99"),
+    ("db_write_ms", "p99"),
+    ("throughput", "tokens_per_second"),
+)
+
+
+class StreamResult:
+    """1本のストリームの計測結果"""
+
+    def __init__(self):
+        self.ttft: float | None = None
+        self.gaps: list[float] = []
+        self.chunks = 0
+        self.error: str | None = None
+
+
+def summarize(values: list[float], scale: float = 1000.0) -> dict[str, float]:
+    """最近接順位法のパーセンタイルなどを返す（既定はミリ秒に換算）。"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def percentile(q: float) -> float:
+        index = max(0, math.ceil(q * len(ordered)) - 1)
+        return round(ordered[index] * scale, 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3),
+        "p50": percentile(0.50),
+        "p90": percentile(0.90),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+
+async def run_stream(client: httpx.AsyncClient, index: int) -> StreamResult:
+    """ストリームを1本開き、contentフレームの到着時刻を記録する。"""
+    result = StreamResult()
+    payload = {
+        "message": f"負荷試験 {index}",
+        "model": MODEL,
+        "conversation_id": f"load-{index}",
+        "history": [],
+    }
+    started = time.perf_counter()
+    last = started
+    try:
+        async with client.stream("POST", "/api/chat", json=payload) as response:
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = json.loads(line[6:])
+                if "error" in data:
+                    result.error = str(data["error"])
+                    return result
+                if "content" not in data:
+                    continue
+                now = time.perf_counter()
+                if result.ttft is None:
+                    result.ttft = now - started
+                else:
+                    result.gaps.append(now - last)
+                last = now
+                result.chunks += 1
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    return result
+
+
+async def run_load(base_url: str, concurrency: int, requests: int) -> list:
+    """最大concurrency本を同時に開き、合計requests本のストリームを実行する。"""
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=None
+    ) as client:
+
+        async def bounded(index: int) -> StreamResult:
+            async with semaphore:
+                return await run_stream(client, index)
+
+        return await asyncio.gather(*(bounded(i) for i in range(requests)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(
+    args: argparse.Namespace, workdir: Path, port: int, stats: Path, log
+) -> subprocess.Popen:
+    """
+    モックプロバイダーを有効にしたサーバーを一時ディレクトリで起動する
+
+    サーバーのログは計測結果の表示に混ざらないよう workdir/server.log に出力する。
+    """
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND_DIR),
+        "MOCK_LLM": "true",
+        "MOCK_LLM_TTFT": str(args.ttft),
+        "MOCK_LLM_TOKEN_LATENCY": str(args.token_latency),
+        "MOCK_LLM_LATENCY_DISTRIBUTION": args.distribution,
+        "MOCK_LLM_OUTPUT_TOKENS": str(args.output_tokens),
+        "MOCK_LLM_ERROR_RATE": str(args.error_rate),
+        # 同時実行数の制限で待たせず、サーバー自体の処理能力を測る
+        "PROVIDER_MAX_CONCURRENCY": str(args.concurrency),
+        "PROVIDER_HTTP_WARMUP": "false",
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.chat_load_server",
+            "--port",
+            str(port),
+            "--stats",
+            str(stats),
+        ],
+        cwd=workdir,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_until_ready(base_url: str, server: subprocess.Popen) -> None:
+    deadline = time.monotonic() + READY_TIMEOUT
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited before becoming ready")
+            try:
+                if (await client.get("/api/models")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become ready")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    """SIGINTで停止し、終了処理（統計の書き出し）を待つ。"""
+    if server.poll() is None:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=READY_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def within(samples: list, started: float, ended: float) -> list[float]:
+    """サーバーが記録した(時刻, 値)のうち、負荷をかけていた間の値を返す。"""
+    return [value for at, value in samples if started <= at <= ended]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(
+    args: argparse.Namespace,
+    results: list,
+    elapsed: float,
+    server_samples: dict[str, list[float]] | None,
+) -> dict:
+    succeeded = [result for result in results if result.error is None]
+    errors: dict[str, int] = {}
+    for result in results:
+        if result.error is not None:
+            errors[result.error] = errors.get(result.error, 0) + 1
+    chunks = sum(result.chunks for result in succeeded)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare",)},
+        },
+        "streams": {
+            "requests": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "errors": errors,
+        },
+        "ttft_ms": summarize([r.ttft for r in succeeded if r.ttft is not None]),
+        "inter_token_ms": summarize([gap for r in succeeded for gap in r.gaps]),
+        "throughput": {
+            "wall_seconds": round(elapsed, 3),
+            "tokens_per_second": round(chunks / elapsed, 1),
+            "streams_per_second": round(len(succeeded) / elapsed, 2),
+        },
+    }
+    if server_samples is not None:
+        report["event_loop_lag_ms"] = summarize(server_samples["event_loop_lag"])
+        report["db_write_ms"] = summarize(server_samples["db_write"])
+    return report
+
+
+def print_report(report: dict) -> None:
+    streams = report["streams"]
+    throughput = report["throughput"]
+    print(
+        f"streams: {streams['succeeded']}/{streams['requests']} succeeded "
+        f"in {throughput['wall_seconds']}s "
+        f"({throughput['tokens_per_second']} tokens/s, "
+        f"{throughput['streams_per_second']} streams/s)"
+    )
+    if streams["errors"]:
+        print(f"errors: {streams['errors']}")
+    for name in ("ttft_ms", "inter_token_ms", "event_loop_lag_ms", "db_write_ms"):
+        stats = report.get(name)
+        if stats is None or not stats["count"]:
+            continue
+        print(
+            f"{name}: p50={stats['p50']} p90={stats['p90']} "
+            f"p99={stats['p99']} max={stats['max']} (n={stats['count']})"
+        )
+
+
+def print_comparison(report: dict, baseline: dict) -> None:
+    commit = baseline.get("meta", {}).get("commit")
+    print(f"compared with {commit or 'baseline'}:")
+    for section, key in COMPARED_METRICS:
+        before = baseline.get(section, {}).get(key)
+        after = report.get(section, {}).get(key)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"  {section}.{key}: {before} -> {after} ({change:+.1f}%)")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    if args.url:
+        started = time.perf_counter()
+        results = await run_load(args.url, args.concurrency, args.requests)
+        return build_report(args, results, time.perf_counter() - started, None)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        stats_path = Path(workdir) / "server_stats.json"
+        log_path = Path(workdir) / "server.log"
+        with log_path.open("w") as log:
+            server = start_server(args, Path(workdir), port, stats_path, log)
+        try:
+            await wait_until_ready(base_url, server)
+        except RuntimeError:
+            stop_server(server)
+            print(log_path.read_text()[-4000:], file=sys.stderr)
+            raise
+        try:
+            load_started = time.time()
+            started = time.perf_counter()
+            results = await run_load(base_url, args.concurrency, args.requests)
+            elapsed = time.perf_counter() - started
+            load_ended = time.time()
+        finally:
+            stop_server(server)
+
+        server_samples = None
+        if stats_path.exists():
+            raw = json.loads(stats_path.read_text())
+            server_samples = {
+                name: within(samples, load_started, load_ended)
+                for name, samples in raw.items()
+            }
+    return build_report(args, results, elapsed, server_samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument(
+        "--requests", type=int, help="合計のストリーム数（既定は--concurrencyと同じ）"
+    )
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument(
+        "--distribution",
+        choices=["fixed", "uniform", "exponential"],
+        default="exponential",
+    )
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--url", help="起動済みのサーバーのURL（指定時は起動しない）")
+    parser.add_argument("--output", type=Path, default=Path("chat_load.json"))
+    parser.add_argument("--compare", type=Path, help="比較する以前の結果のJSON")
+    args = parser.parse_args()
+    if args.requests is None:
+        args.requests = args.concurrency
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(
+        json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    )
+    print(f"results written to {args.output}")
+    if args.compare:
+        print_comparison(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
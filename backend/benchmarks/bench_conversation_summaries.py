@@ -0,0 +1,166 @@
+"""
+会話サマリー取得のベンチマーク
+
+指定件数の会話/メッセージを投入したSQLite DBに対して
+MessageRepository.get_conversation_summaries の所要時間を計測する。
+
+実行例:
+    uv run python -m benchmarks.bench_conversation_summaries
+    uv run python -m benchmarks.bench_conversation_summaries \\
+        --conversations 1000 --messages 100000 --compare-legacy
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.models.message import Conversation, Message
+from app.repositories.message_repository import MessageRepository
+
+SEED_BATCH_SIZE = 50_000
+
+
+def seed_database(repo: MessageRepository, conversations: int, messages: int) -> None:
+    """ベンチマーク用の会話とメッセージを一括投入する。"""
+    base_time = datetime(2026, 1, 1)
+    per_conversation = max(messages // conversations, 1)
+
+    with repo.engine.begin() as connection:
+        conversation_rows = []
+        batch = []
+        message_index = 0
+        for conversation_index in range(conversations):
+            remaining = messages - message_index
+            count = min(per_conversation, remaining)
+            if conversation_index == conversations - 1:
+                count = remaining
+
+            content = ""
+            timestamp = None
+            for _ in range(count):
+                content = f"message {message_index} " + "x" * 120
+                timestamp = base_time + timedelta(seconds=message_index)
+                batch.append(
+                    {
+                        "conversation_id": f"conv-{conversation_index}",
+                        "role": "user" if message_index % 2 == 0 else "assistant",
+                        "content": content,
+                        "model": "gpt-5.2",
+                        "timestamp": timestamp,
+                    }
+                )
+                message_index += 1
+                if len(batch) >= SEED_BATCH_SIZE:
+                    connection.execute(Message.__table__.insert(), batch)
+                    batch = []
+
+            conversation_rows.append(
+                {
+                    "id": f"conv-{conversation_index}",
+                    "title": f"会話{conversation_index}",
+                    "created_at": base_time,
+                    "updated_at": timestamp or base_time,
+                    "message_count": count,
+                    "last_message_preview": content[:80],
+                    "last_message_at": timestamp,
+                }
+            )
+
+        if batch:
+            connection.execute(Message.__table__.insert(), batch)
+        connection.execute(Conversation.__table__.insert(), conversation_rows)
+
+
+def legacy_conversation_summaries(repo: MessageRepository) -> list[dict]:
+    """比較用: 会話ごとに全メッセージを読み込む旧実装（N+1クエリ）。"""
+    session = repo.SessionLocal()
+    try:
+        summaries = []
+        for conversation in (
+            session.query(Conversation).order_by(Conversation.updated_at.desc()).all()
+        ):
+            messages = (
+                session.query(Message)
+                .filter(Message.conversation_id == conversation.id)
+                .order_by(Message.timestamp.asc())
+                .all()
+            )
+            summaries.append(
+                {
+                    "id": conversation.id,
+                    "message_count": len(messages),
+                    "last_message_preview": messages[-1].content[:80]
+                    if messages
+                    else "",
+                }
+            )
+        return summaries
+    finally:
+        session.close()
+
+
+def measure(func, repeat: int) -> list[float]:
+    """関数をrepeat回実行し、各回の所要時間（秒）を返す。"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def report(label: str, durations: list[float]) -> None:
+    print(
+        f"{label}: median={statistics.median(durations) * 1000:.1f}ms "
+        f"min={min(durations) * 1000:.1f}ms max={max(durations) * 1000:.1f}ms "
+        f"(n={len(durations)})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conversations", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--db", type=Path, default=None, help="DBファイル（省略時は一時ファイル）"
+    )
+    parser.add_argument(
+        "--compare-legacy", action="store_true", help="旧N+1実装も計測する"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or Path(tmp_dir) / "bench.db"
+        needs_seed = not db_path.exists()
+        repo = MessageRepository(db_url=f"sqlite:///{db_path}")
+
+        if needs_seed:
+            started = time.perf_counter()
+            seed_database(repo, args.conversations, args.messages)
+            print(
+                f"seeded {args.conversations} conversations / {args.messages} "
+                f"messages in {time.perf_counter() - started:.1f}s"
+            )
+
+        summaries = repo.get_conversation_summaries()
+        print(f"summaries returned: {len(summaries)}")
+        report(
+            "get_conversation_summaries",
+            measure(repo.get_conversation_summaries, args.repeat),
+        )
+
+        if args.compare_legacy:
+            report(
+                "legacy (N+1)",
+                measure(lambda: legacy_conversation_summaries(repo), args.repeat),
+            )
+
+        repo.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+起動時のimport時間のベンチマーク
+
+別プロセスで `python -X importtime -c "import main"` を実行し、main の累積
+import時間と、時間のかかったモジュールを表示する。起動時に読み込まないはずの
+プロバイダーSDK（openai / anthropic）が読み込まれた場合や、import時間が
+予算を超えた場合は終了コード1で終了する。
+
+実行例:
+    uv run python -m benchmarks.bench_import_time
+    uv run python -m benchmarks.bench_import_time --budget-ms 1500 --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = 1500.0
+DEFAULT_FORBIDDEN_MODULES = ("openai", "anthropic")
+
+
+def measure(target: str) -> dict[str, tuple[int, int]]:
+    """
+    target のimport時間を計測する
+
+    ログやSQLiteのファイルを作業ツリーに作らないよう一時ディレクトリで実行する。
+
+    Returns:
+        モジュール名 -> (自身の時間, 累積時間)（マイクロ秒）
+    """
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR)}
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument(
+        "--forbid",
+        nargs="*",
+        default=list(DEFAULT_FORBIDDEN_MODULES),
+        help="起動時に読み込まれてはいけないトップレベルのモジュール",
+    )
+    args = parser.parse_args()
+
+    # 1回目はバイトコードのコンパイルを含むため計測に含めない
+    measure(args.target)
+    runs = [measure(args.target) for _ in range(args.repeat)]
+    totals = [run[args.target][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals)
+
+    last = runs[-1]
+    print(f"import {args.target}: median={median_ms:.1f}ms (runs={args.repeat})")
+    print(f"top {args.top} modules by cumulative time:")
+    slowest = sorted(last.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[: args.top]:
+        print(
+            f"  {cumulative_us / 1000:8.1f}ms  (self {self_us / 1000:6.1f}ms)  {name}"
+        )
+
+    failed = False
+    loaded = sorted({name for name in last if name.split(".")[0] in args.forbid})
+    if loaded:
+        print(f"FAIL: forbidden modules imported at startup: {', '.join(loaded[:5])}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: median {median_ms:.1f}ms exceeds budget {args.budget_ms:.0f}ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"OK: within budget {args.budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
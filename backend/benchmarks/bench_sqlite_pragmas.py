@@ -0,0 +1,115 @@
+"""
+SQLite PRAGMAプロファイルのベンチマーク
+
+PRAGMAプロファイルごとに以下を計測する。
+- save_message の逐次書き込みスループット
+- 書き込みと並行した読み取り（会話一覧・メッセージ取得）のレイテンシ
+
+実行例:
+    uv run python -m benchmarks.bench_sqlite_pragmas
+    uv run python -m benchmarks.bench_sqlite_pragmas --writes 2000 --readers 8
+"""
+
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.repositories.message_repository import (
+    SQLITE_PRAGMA_PROFILES,
+    MessageRepository,
+)
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    """昇順に並べた値からパーセンタイルを返す。"""
+    ordered = sorted(values)
+    index = min(int(len(ordered) * ratio), len(ordered) - 1)
+    return ordered[index]
+
+
+def bench_write_throughput(repo: MessageRepository, writes: int) -> float:
+    """逐次save_messageのスループット（件/秒）を返す。"""
+    repo.create_conversation("書き込み計測", "conv-write")
+    started = time.perf_counter()
+    for i in range(writes):
+        repo.save_message("user", f"message {i}", "gpt-5.2", "conv-write")
+    return writes / (time.perf_counter() - started)
+
+
+def bench_concurrent_reads(
+    repo: MessageRepository, readers: int, duration: float
+) -> list[float]:
+    """書き込みスレッドと並行して読み取りを行い、各読み取りの所要時間を返す。"""
+    repo.create_conversation("並行計測", "conv-read")
+    stop = threading.Event()
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def writer() -> None:
+        i = 0
+        while not stop.is_set():
+            repo.save_message("assistant", f"reply {i}", "gpt-5.2", "conv-read")
+            i += 1
+
+    def reader() -> None:
+        local = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            repo.get_conversation_summaries(limit=50)
+            repo.get_messages_by_conversation("conv-read", limit=50)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader) for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writes", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(SQLITE_PRAGMA_PROFILES),
+        choices=list(SQLITE_PRAGMA_PROFILES),
+    )
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            repo = MessageRepository(
+                db_url=f"sqlite:///{Path(tmp_dir) / 'bench.db'}",
+                pragma_profile=profile,
+            )
+
+            throughput = bench_write_throughput(repo, args.writes)
+            latencies = bench_concurrent_reads(repo, args.readers, args.duration)
+
+            print(f"[{profile}]")
+            print(f"  save_message: {throughput:.0f} msg/s ({args.writes} writes)")
+            if latencies:
+                print(
+                    f"  concurrent reads: n={len(latencies)} "
+                    f"p50={statistics.median(latencies) * 1000:.2f}ms "
+                    f"p99={percentile(latencies, 0.99) * 1000:.2f}ms "
+                    f"max={max(latencies) * 1000:.2f}ms"
+                )
+            repo.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+SSEストリーミング経路のマイクロベンチマーク
+
+合成した10万チャンクのストリームを chat_stream のジェネレーターに流し、
+トークンあたりのオーバーヘッド（フレームのエンコードと応答の蓄積）を計測する。
+比較用に、従来の `+=` 連結と json.dumps による実装も計測する。
+
+実行例:
+    uv run python -m benchmarks.bench_sse_stream
+    uv run python -m benchmarks.bench_sse_stream --chunks 100000 --chunk-size 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("OPENAI_API_KEY", "bench-openai-key")
+
+import main as app_main  # noqa: E402
+
+
+class SyntheticLLMService:
+    """固定長チャンクを即座に返すLLMサービス"""
+
+    def __init__(self, chunks: int, chunk_size: int):
+        self.chunk = "あ" * chunk_size
+        self.chunks = chunks
+
+    def is_model_available(self, model: str) -> bool:
+        return True
+
+    async def stream_chat(self, messages, model):
+        chunk = self.chunk
+        for _ in range(self.chunks):
+            yield chunk
+
+
+class NullRepository:
+    """DB書き込みを行わないリポジトリ"""
+
+    async def ensure_conversation(self, conversation_id):
+        return None
+
+    async def save_turn(self, *args, **kwargs):
+        return None
+
+
+async def consume(body_iterator) -> int:
+    frames = 0
+    async for _ in body_iterator:
+        frames += 1
+    return frames
+
+
+async def bench_baseline(service: SyntheticLLMService) -> float:
+    """ストリームを読み捨てるだけの所要時間（オーバーヘッドの基準）。"""
+    started = time.perf_counter()
+    async for _ in service.stream_chat([], "gpt-5.2"):
+        pass
+    return time.perf_counter() - started
+
+
+async def bench_legacy(service: SyntheticLLMService) -> float:
+    """従来実装（`+=` 連結と1チャンクごとのjson.dumps）の所要時間。"""
+
+    async def generate():
+        full_response = ""
+        async for chunk in service.stream_chat([], "gpt-5.2"):
+            full_response += chunk
+            yield f"data: {json.dumps({'content': chunk})}\n\n"
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    started = time.perf_counter()
+    await consume(generate())
+    return time.perf_counter() - started
+
+
+async def bench_chat_stream(service: SyntheticLLMService) -> float:
+    """chat_stream のジェネレーター全体の所要時間。"""
+    request = app_main.ChatRequest(
+        conversation_id="bench", message="hello", model="gpt-5.2", history=[]
+    )
+    with (
+        patch.object(app_main, "llm_service", service),
+        patch.object(app_main, "message_repository", NullRepository()),
+        patch.object(app_main, "message_writer", None),
+    ):
+        response = await app_main.chat_stream(request)
+        started = time.perf_counter()
+        frames = await consume(response.body_iterator)
+        elapsed = time.perf_counter() - started
+
+    assert frames == service.chunks + 1
+    return elapsed
+
+
+def report(label: str, elapsed: float, baseline: float, chunks: int) -> None:
+    overhead = max(elapsed - baseline, 0.0)
+    print(
+        f"{label}: total={elapsed * 1000:.1f}ms "
+        f"overhead/token={overhead / chunks * 1e9:.0f}ns"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    service = SyntheticLLMService(args.chunks, args.chunk_size)
+
+    baseline = min([await bench_baseline(service) for _ in range(args.repeat)])
+    current = min([await bench_chat_stream(service) for _ in range(args.repeat)])
+    legacy = min([await bench_legacy(service) for _ in range(args.repeat)])
+
+    print(f"chunks={args.chunks} chunk_size={args.chunk_size} (best of {args.repeat})")
+    print(f"baseline (read only): total={baseline * 1000:.1f}ms")
+    report("chat_stream", current, baseline, args.chunks)
+    report("legacy (+= / json.dumps)", legacy, baseline, args.chunks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+負荷試験用のアプリケーションサーバー
+
+bench_chat_load から子プロセスとして起動する（MOCK_LLM などの環境変数は
+親プロセスが設定する）。負荷をかけている間のイベントループの遅延と
+DB書き込みの所要時間を記録し、終了時に --stats のJSONファイルへ書き出す。
+
+実行例（通常は bench_chat_load が起動する）:
+    MOCK_LLM=true uv run python -m benchmarks.chat_load_server \\
+        --port 8100 --stats /tmp/server_stats.json
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import time
+from pathlib import Path
+
+import uvicorn
+
+# イベントループの遅延を測る間隔（秒）
+LAG_PROBE_INTERVAL = 0.01
+
+
+def record_duration(samples: list, method):
+    """非同期メソッドの所要時間を(終了時刻, 秒)で記録するラッパー"""
+
+    @functools.wraps(method)
+    async def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            samples.append((time.time(), time.perf_counter() - started))
+
+    return timed
+
+
+async def probe_event_loop_lag(samples: list) -> None:
+    """一定間隔で眠り、予定より遅れて起きた時間を(時刻, 秒)で記録する。"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        lag = loop.time() - started - LAG_PROBE_INTERVAL
+        samples.append((time.time(), max(lag, 0.0)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--stats", type=Path, required=True)
+    args = parser.parse_args()
+
+    import main as app_main
+
+    samples: dict[str, list] = {"event_loop_lag": [], "db_write": []}
+    # ライトビハインド書き込みの場合もリポジトリへの一括書き込みを計測する
+    repository = app_main.message_repository
+    for name in ("save_turn", "save_messages"):
+        setattr(
+            repository,
+            name,
+            record_duration(samples["db_write"], getattr(repository, name)),
+        )
+
+    probe_task: asyncio.Task | None = None
+
+    @app_main.app.on_event("startup")
+    async def start_probe() -> None:
+        nonlocal probe_task
+        probe_task = asyncio.create_task(
+            probe_event_loop_lag(samples["event_loop_lag"])
+        )
+
+    @app_main.app.on_event("shutdown")
+    async def write_stats() -> None:
+        if probe_task is not None:
+            probe_task.cancel()
+        args.stats.write_text(json.dumps(samples))
+
+    uvicorn.run(app_main.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,19 @@
 FastAPI バックエンドのエントリーポイント
 """
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
+from contextlib import aclosing
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from typing import Literal
 
+import anyio
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Response, status
+from fastapi import FastAPI, Header, HTTPException, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
@@ -18,8 +22,30 @@ from pydantic import BaseModel
 # .envファイルを読み込み（importの前に実行する必要がある）
 load_dotenv()  # noqa: E402
 
-from app.repositories.message_repository import MessageRepository  # noqa: E402
+from app.api.sse import DONE_FRAME, encode_content, encode_event  # noqa: E402
+from app.repositories.async_message_repository import (  # noqa: E402
+    AsyncMessageRepository,
+)
+from app.repositories.conversation_history_cache import (  # noqa: E402
+    DEFAULT_MAX_CONVERSATIONS,
+    ConversationHistoryCache,
+)
+from app.repositories.message_write_queue import MessageWriteQueue  # noqa: E402
+from app.repositories.pagination import encode_cursor  # noqa: E402
+from app.services.admission import AdmissionError  # noqa: E402
+from app.services.conversation_summarizer import ConversationSummarizer  # noqa: E402
+from app.services.llm_provider import conversation_scope  # noqa: E402
 from app.services.llm_service import LLMService  # noqa: E402
+from app.services.model_catalog import ModelSpec  # noqa: E402
+from app.services.response_cache import ResponseCache, replay  # noqa: E402
+from app.services.retry import (  # noqa: E402
+    AUTH,
+    CONNECTION,
+    RATE_LIMIT,
+    TIMEOUT,
+    classify_error,
+)
+from app.services.stream_events import StreamEvent  # noqa: E402
 
 # ログ設定
 logging.basicConfig(
@@ -33,6 +59,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# ページネーション設定
+MAX_PAGE_LIMIT = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# プロバイダーのエラーの分類ごとのユーザー向けメッセージ
+ERROR_MESSAGES = {
+    RATE_LIMIT: "リクエストが多すぎます。しばらく待ってから再試行してください",
+    AUTH: "サービスに接続できません",
+    CONNECTION: "ネットワークエラーが発生しました。接続を確認してください",
+    TIMEOUT: "ネットワークエラーが発生しました。接続を確認してください",
+}
+
 
 # データモデル
 class ChatMessage(BaseModel):
@@ -48,7 +86,11 @@ class ChatRequest(BaseModel):
     conversation_id: str
     message: str
     model: str
-    history: list[ChatMessage] = []
+    # 省略時はサーバー側で保存済みのメッセージから履歴を組み立てる
+    history: list[ChatMessage] | None = None
+    # 同じプロンプトの応答の再利用を許可するか（RESPONSE_CACHE有効時のみ）。
+    # 省略時はサーバーの設定（RESPONSE_CACHE_MODELS）に従う
+    cache: bool | None = None
 
 
 class ModelInfo(BaseModel):
@@ -56,8 +98,14 @@ class ModelInfo(BaseModel):
 
     id: str
     name: str
-    provider: Literal["openai", "claude", "google"]
+    provider: Literal["openai", "claude", "google", "mock"]
     description: str
+    context_window: int
+    max_output_tokens: int
+    # 100万トークンあたりの料金（USD）
+    input_price: float | None = None
+    cached_input_price: float | None = None
+    output_price: float | None = None
 
 
 class ConversationCreateRequest(BaseModel):
@@ -91,13 +139,47 @@ class StoredMessage(BaseModel):
     content: str
     model: str
     timestamp: datetime
+    truncated: bool = False
 
 
 app = FastAPI(title="AI Chat MVP")
 
 # サービスの初期化
 llm_service = LLMService()
-message_repository = MessageRepository()
+message_repository = AsyncMessageRepository()
+
+# ライトビハインド書き込み（MESSAGE_WRITE_BEHIND=true の場合のみ有効）
+message_writer: MessageWriteQueue | None = None
+if os.getenv("MESSAGE_WRITE_BEHIND", "").lower() in ("1", "true"):
+    message_writer = MessageWriteQueue(
+        message_repository,
+        flush_interval_ms=int(os.getenv("MESSAGE_WRITE_BEHIND_FLUSH_MS", "50")),
+        max_batch_size=int(os.getenv("MESSAGE_WRITE_BEHIND_BATCH_SIZE", "100")),
+    )
+
+# 起動時の接続事前確立タスク
+warm_up_task: asyncio.Task | None = None
+
+# 長い会話の古いメッセージのバックグラウンド要約（CONVERSATION_SUMMARY=true の場合のみ有効）
+summarizer: ConversationSummarizer | None = None
+if os.getenv("CONVERSATION_SUMMARY", "").lower() in ("1", "true"):
+    summarizer = ConversationSummarizer(llm_service, message_repository)
+
+# 同一プロンプトの応答キャッシュ（RESPONSE_CACHE=memory または sqlite の場合のみ有効）
+response_cache: ResponseCache | None = None
+response_cache_mode = os.getenv("RESPONSE_CACHE", "").lower()
+if response_cache_mode in ("memory", "sqlite"):
+    response_cache = ResponseCache(
+        repository=message_repository if response_cache_mode == "sqlite" else None,
+        metrics=llm_service.metrics,
+    )
+
+# プロンプト用の会話履歴キャッシュ
+history_cache = ConversationHistoryCache(
+    max_conversations=int(
+        os.getenv("HISTORY_CACHE_SIZE", str(DEFAULT_MAX_CONVERSATIONS))
+    )
+)
 
 # CORS設定
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -107,6 +189,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
@@ -141,12 +224,45 @@ async def startup_event():
     else:
         logger.info("Gemini API key is configured")
 
-    if not openai_key and not anthropic_key and not google_key:
+    mock_enabled = "mock" in llm_service.providers
+    if mock_enabled:
+        logger.warning("MOCK_LLM is enabled. mock-* models return synthetic responses.")
+
+    if not openai_key and not anthropic_key and not google_key and not mock_enabled:
         logger.error(
             "No API keys configured. At least one API key (OPENAI_API_KEY, ANTHROPIC_API_KEY, GEMINI_API_KEY or GOOGLE_API_KEY) must be set."
         )
         raise RuntimeError("No API keys configured")
 
+    if message_writer is not None:
+        await message_writer.start()
+        logger.info("Write-behind message persistence is enabled")
+
+    if summarizer is not None:
+        logger.info("Conversation summarization is enabled (%s)", summarizer.model)
+
+    if response_cache is not None:
+        # 前回の起動までに溜まった期限切れの応答を削除する
+        await response_cache.prune()
+
+    # プロバイダーへの接続を事前確立する（起動は待たせない）
+    if os.getenv("PROVIDER_HTTP_WARMUP", "true").lower() in ("1", "true"):
+        global warm_up_task
+        warm_up_task = asyncio.create_task(llm_service.warm_up())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """終了時の処理"""
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    if summarizer is not None:
+        await summarizer.stop()
+    if message_writer is not None:
+        await message_writer.stop()
+    await message_repository.close()
+    await llm_service.aclose()
+
 
 @app.get("/")
 async def root():
@@ -154,84 +270,71 @@ async def root():
     return {"message": "AI Chat MVP API"}
 
 
-@app.get("/api/models", response_model=list[ModelInfo])
-async def get_models():
-    """利用可能なLLMモデルのリストを返す"""
-    openai_key = os.getenv("OPENAI_API_KEY")
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-    google_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+@app.get("/api/metrics")
+async def get_metrics():
+    """再試行回数などのカウンターを返す"""
+    return llm_service.metrics.snapshot()
 
-    models = []
-
-    if openai_key:
-        models.extend(
-            [
-                ModelInfo(
-                    id="gpt-5.2",
-                    name="GPT-5.2",
-                    provider="openai",
-                    description="OpenAIの最新モデル",
-                ),
-                ModelInfo(
-                    id="gpt-5.2-pro",
-                    name="GPT-5.2 Pro",
-                    provider="openai",
-                    description="OpenAIの高性能モデル",
-                ),
-            ]
-        )
 
-    if google_key:
-        models.extend(
-            [
-                ModelInfo(
-                    id="gemini-3-pro-preview",
-                    name="Gemini 3 Pro",
-                    provider="google",
-                    description="Googleの高性能モデル",
-                ),
-                ModelInfo(
-                    id="gemini-3-flash-preview",
-                    name="Gemini 3 Flash",
-                    provider="google",
-                    description="Googleの高速モデル",
-                ),
-            ]
-        )
+# 利用可能なモデルID -> (/api/modelsのレスポンス本文, ETag)
+models_responses: dict[tuple[str, ...], tuple[bytes, str]] = {}
 
-    if anthropic_key:
-        models.extend(
-            [
-                ModelInfo(
-                    id="claude-opus-4-5",
-                    name="Claude 4.5 Opus",
-                    provider="claude",
-                    description="Claudeの高性能モデル",
-                ),
-                ModelInfo(
-                    id="claude-sonnet-4-5",
-                    name="Claude 4.5 Sonnet",
-                    provider="claude",
-                    description="Claudeのバランス型モデル",
-                ),
-                ModelInfo(
-                    id="claude-haiku-4-5",
-                    name="Claude 4.5 Haiku",
-                    provider="claude",
-                    description="Claudeの高速モデル",
-                ),
-            ]
-        )
 
-    logger.info("Returning %s available models", len(models))
-    return models
+def build_models_response(specs: list[ModelSpec]) -> tuple[bytes, str]:
+    """モデル一覧のレスポンス本文とETagを作成する。"""
+    models = [
+        ModelInfo(
+            id=spec.id,
+            name=spec.name,
+            provider=spec.provider,
+            description=spec.description,
+            context_window=spec.context_window,
+            max_output_tokens=spec.max_output_tokens,
+            input_price=spec.input_price,
+            cached_input_price=spec.cached_input_price,
+            output_price=spec.output_price,
+        ).model_dump()
+        for spec in specs
+    ]
+    body = json.dumps(models, ensure_ascii=False).encode("utf-8")
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Matchヘッダーがetagに一致するか判定する。"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@app.get("/api/models", response_model=list[ModelInfo])
+async def get_models(if_none_match: str | None = Header(default=None)):
+    """
+    利用可能なLLMモデルのリストを返す
+
+    モデルカタログとAPIキーの設定から作成したレスポンスを再利用し、
+    ETagが一致する場合は304を返す。
+    """
+    specs = [spec for spec in llm_service.catalog if llm_service.has_api_key(spec.id)]
+    key = tuple(spec.id for spec in specs)
+    cached = models_responses.get(key)
+    if cached is None:
+        cached = models_responses[key] = build_models_response(specs)
+        logger.info("Built model list with %s available models", len(specs))
+    body, etag = cached
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.post("/api/conversations", response_model=ConversationResponse)
 async def create_conversation(request: ConversationCreateRequest | None = None):
     """新しい会話を作成する"""
     title = request.title if request else "新しいチャット"
-    conversation = message_repository.create_conversation(title=title)
+    conversation = await message_repository.create_conversation(title=title)
     return ConversationResponse(
         id=conversation.id,
         title=conversation.title,
@@ -241,9 +344,35 @@ async def create_conversation(request: ConversationCreateRequest | None = None):
 
 
 @app.get("/api/conversations", response_model=list[ConversationSummary])
-async def list_conversations():
-    """会話サマリー一覧を返す"""
-    summaries = message_repository.get_conversation_summaries()
+async def list_conversations(
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    before: str | None = None,
+    after: str | None = None,
+):
+    """
+    会話サマリー一覧を返す
+
+    limit指定時はキーセットページネーションを行い、
+    続きのページがあり得る場合は次ページ用カーソルをX-Next-Cursorヘッダーで返す。
+    """
+    if message_writer is not None:
+        await message_writer.flush()
+
+    try:
+        summaries = await message_repository.get_conversation_summaries(
+            limit=limit, before=before, after=after
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="不正なカーソルです"
+        ) from e
+
+    if limit is not None and len(summaries) == limit:
+        edge = summaries[0] if before is not None else summaries[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            edge["updated_at"], edge["id"]
+        )
     return [ConversationSummary(**summary) for summary in summaries]
 
 
@@ -252,7 +381,13 @@ async def list_conversations():
 )
 async def delete_conversation(conversation_id: str):
     """指定会話を削除する"""
-    deleted = message_repository.delete_conversation(conversation_id)
+    if message_writer is not None:
+        await message_writer.flush(conversation_id)
+
+    deleted = await message_repository.delete_conversation(conversation_id)
+    history_cache.invalidate(conversation_id)
+    if summarizer is not None:
+        summarizer.invalidate(conversation_id)
     if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="会話が見つかりません"
@@ -263,15 +398,40 @@ async def delete_conversation(conversation_id: str):
 @app.get(
     "/api/conversations/{conversation_id}/messages", response_model=list[StoredMessage]
 )
-async def get_conversation_messages(conversation_id: str):
-    """指定会話のメッセージ一覧を返す"""
-    conversation = message_repository.get_conversation(conversation_id)
+async def get_conversation_messages(
+    conversation_id: str,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    before: str | None = None,
+    after: str | None = None,
+):
+    """
+    指定会話のメッセージ一覧を返す
+
+    limit指定時はキーセットページネーションを行い、
+    続きのページがあり得る場合は次ページ用カーソルをX-Next-Cursorヘッダーで返す。
+    """
+    conversation = await message_repository.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="会話が見つかりません"
         )
 
-    messages = message_repository.get_messages_by_conversation(conversation_id)
+    if message_writer is not None:
+        await message_writer.flush(conversation_id)
+
+    try:
+        messages = await message_repository.get_messages_by_conversation(
+            conversation_id, limit=limit, before=before, after=after
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="不正なカーソルです"
+        ) from e
+
+    if limit is not None and len(messages) == limit:
+        edge = messages[0] if before is not None else messages[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(edge.timestamp, edge.id)
     return [
         StoredMessage(
             id=message.id,
@@ -280,18 +440,39 @@ async def get_conversation_messages(conversation_id: str):
             content=message.content,
             model=message.model,
             timestamp=message.timestamp,
+            truncated=message.truncated,
         )
         for message in messages
     ]
 
 
+async def load_history(conversation_id: str) -> list[dict[str, str]]:
+    """
+    保存済みのメッセージから会話履歴を取得する
+
+    最近使われた会話はLRUキャッシュから返し、DBを読まない。
+    """
+    history = history_cache.get(conversation_id)
+    if history is None:
+        load = history_cache.begin_load(conversation_id)
+        try:
+            if message_writer is not None:
+                await message_writer.flush(conversation_id)
+            history = await message_repository.get_conversation_history(conversation_id)
+        finally:
+            history_cache.end_load(load)
+        # 読み込み中に保存されたターンがある場合は登録しない
+        history_cache.put(conversation_id, history, load)
+    return history
+
+
 @app.post("/api/chat")
 async def chat_stream(request: ChatRequest):
     """チャットメッセージを受信し、ストリーミングレスポンスを返す"""
     logger.info("Chat request received for model: %s", request.model)
 
     # 会話が存在しない場合は作成
-    message_repository.ensure_conversation(request.conversation_id)
+    await message_repository.ensure_conversation(request.conversation_id)
 
     # モデルが利用可能か確認
     if not llm_service.is_model_available(request.model):
@@ -301,55 +482,134 @@ async def chat_stream(request: ChatRequest):
             detail="サービスに接続できません",
         )
 
-    async def generate():
+    # メッセージ履歴を構築（クライアントが履歴を送らない場合はサーバー側で組み立てる）
+    stored_message_count: int | None = None
+    if request.history is None:
+        history = await load_history(request.conversation_id)
+        stored_message_count = len(history)
+        if summarizer is not None:
+            # 要約済みの古いメッセージは要約に置き換える
+            history = await summarizer.build_messages(request.conversation_id, history)
+    else:
+        history = [
+            {"role": msg.role, "content": msg.content} for msg in request.history
+        ]
+    messages = [*history, {"role": "user", "content": request.message}]
+
+    # キャッシュの対象は、同じモデルへの同一プロンプトの応答を再生する
+    cache_key: str | None = None
+    if response_cache is not None and response_cache.enabled_for(
+        request.model, request.cache
+    ):
+        cache_key = response_cache.key(messages, request.model)
+
+    def invalidate_unsaved_turn(saved: asyncio.Future) -> None:
+        if saved.cancelled() or saved.exception() is not None:
+            history_cache.invalidate(request.conversation_id)
+
+    async def save_turn(
+        full_response: str, model: str, truncated: bool = False
+    ) -> None:
+        """1往復分のメッセージを保存する（DBエラーはユーザーに影響させない）"""
         try:
-            # メッセージ履歴を構築
-            messages = [
-                {"role": msg.role, "content": msg.content} for msg in request.history
-            ]
-            messages.append({"role": "user", "content": request.message})
+            repository = message_writer or message_repository
+            saved = await repository.save_turn(
+                request.message,
+                full_response,
+                model,
+                request.conversation_id,
+                truncated=truncated,
+            )
+            history_cache.append_turn(
+                request.conversation_id, request.message, full_response
+            )
+            if isinstance(saved, asyncio.Future):
+                # ライトビハインドの書き込みが失敗した場合は先に追記した履歴を破棄する
+                saved.add_done_callback(invalidate_unsaved_turn)
+            logger.info("Messages saved to database")
+            if summarizer is not None and stored_message_count is not None:
+                # 要約は応答とは別タスクで更新する
+                summarizer.schedule(request.conversation_id, stored_message_count + 2)
+        except asyncio.CancelledError:
+            # コミット後にキャンセルされた場合は追記されていない可能性がある
+            history_cache.invalidate(request.conversation_id)
+            raise
+        except Exception as db_error:
+            history_cache.invalidate(request.conversation_id)
+            logger.error("Database error: %s", db_error)
+            # データベースエラーはユーザーに影響させない
 
-            full_response = ""
+    async def generate():
+        # 長い生成でも線形時間になるよう、チャンクはリストに溜めて最後に結合する
+        chunks: list[str] = []
+        completed = False
+        # 代替モデルに切り替えた場合は実際に応答したモデルを保存する
+        used_model = request.model
+        # プロバイダーのプレフィックスキャッシュを会話単位に振り分ける
+        conversation_scope.set(request.conversation_id)
+
+        try:
+            cached = None
+            if cache_key is not None:
+                cached = await response_cache.get(cache_key, request.model)
+            if cached is not None:
+                source = replay(cached)
+            else:
+                source = llm_service.stream_chat(messages, request.model)
 
             # ストリーミングレスポンスを生成
-            async for chunk in llm_service.stream_chat(messages, request.model):
-                full_response += chunk
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+            # ジェネレーターが閉じられた場合は上流のプロバイダーストリームも閉じる
+            async with aclosing(source) as stream:
+                async for chunk in stream:
+                    if isinstance(chunk, StreamEvent):
+                        if chunk.event == "model":
+                            used_model = chunk.data["model"]
+                        # 待ち行列の順番などのメタ情報は独立したフレームで送る
+                        yield encode_event(chunk.to_payload())
+                        continue
+                    chunks.append(chunk)
+                    yield encode_content(chunk)
+            completed = True
 
             # メッセージをデータベースに保存
-            try:
-                message_repository.save_message(
-                    "user", request.message, request.model, request.conversation_id
-                )
-                message_repository.save_message(
-                    "assistant", full_response, request.model, request.conversation_id
-                )
-                logger.info("Messages saved to database")
-            except Exception as db_error:
-                logger.error("Database error: %s", db_error)
-                # データベースエラーはユーザーに影響させない
+            await save_turn("".join(chunks), used_model)
 
             # 完了を通知
-            yield f"data: {json.dumps({'done': True})}\n\n"
+            yield DONE_FRAME
+
+            # 要求したモデルの完全な応答のみ、完了の通知後にキャッシュする
+            if (
+                cache_key is not None
+                and cached is None
+                and chunks
+                and used_model == request.model
+            ):
+                await response_cache.put(cache_key, used_model, chunks)
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # クライアント切断: 上流の生成は打ち切り、途中までの応答を保存する
+            # （待ち行列などで最初のチャンクより前に切断した場合は保存しない）
+            if not completed:
+                logger.info(
+                    "Client disconnected; cancelled generation after %s chunks",
+                    len(chunks),
+                )
+                if chunks:
+                    with anyio.CancelScope(shield=True):
+                        await save_turn("".join(chunks), used_model, truncated=True)
+            raise
 
         except Exception as e:
             logger.error("Error in chat stream: %s", e, exc_info=True)
             error_message = "エラーが発生しました"
 
             # エラーの種類に応じてメッセージを変更
-            error_str = str(e).lower()
-            if "rate" in error_str or "quota" in error_str:
-                error_message = (
-                    "リクエストが多すぎます。しばらく待ってから再試行してください"
-                )
-            elif "auth" in error_str or "api key" in error_str:
-                error_message = "サービスに接続できません"
-            elif "network" in error_str or "connection" in error_str:
-                error_message = (
-                    "ネットワークエラーが発生しました。接続を確認してください"
-                )
+            if isinstance(e, AdmissionError):
+                error_message = "混雑しています。しばらく待ってから再試行してください"
+            else:
+                error_message = ERROR_MESSAGES.get(classify_error(e), error_message)
 
-            yield f"data: {json.dumps({'error': error_message})}\n\n"
+            yield encode_event({"error": error_message})
 
     return StreamingResponse(generate(), media_type="text/event-stream")
 
@@ -0,0 +1,193 @@
+"""同時実行数の制限と待ち行列のテスト"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.admission import (
+    AdmissionController,
+    ConcurrencyLimiter,
+    QueueFullError,
+    QueueTimeoutError,
+    parse_limits,
+)
+from app.services.llm_provider import LLMProvider
+from app.services.llm_service import LLMService
+from app.services.stream_events import StreamEvent, queue_event
+from main import app
+
+
+class SlowProvider(LLMProvider):
+    """一定間隔でトークンを返すテスト用プロバイダー"""
+
+    async def stream_chat(self, messages, model):
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield f"t{i}"
+
+
+def build_service(**admission_options) -> LLMService:
+    options = {"provider_max_concurrency": 1, "model_max_concurrency": {}}
+    options.update(admission_options)
+    service = LLMService(admission=AdmissionController(**options))
+    service.providers = {"openai": SlowProvider()}
+    return service
+
+
+@pytest.mark.asyncio
+async def test_limiter_grants_slots_in_fifo_order():
+    limiter = ConcurrencyLimiter("test", max_concurrency=1, max_queue=10)
+    assert limiter.try_acquire() is None
+    first = limiter.try_acquire()
+    second = limiter.try_acquire()
+
+    assert (limiter.position(first), limiter.position(second)) == (1, 2)
+    limiter.release()
+    assert first.done() and not second.done()
+    assert limiter.position(second) == 1
+    limiter.release()
+    assert second.done()
+    limiter.release()
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_when_queue_is_full():
+    limiter = ConcurrencyLimiter("test", max_concurrency=1, max_queue=1)
+    limiter.try_acquire()
+    limiter.try_acquire()
+
+    with pytest.raises(QueueFullError):
+        limiter.try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_queued_stream_reports_position_before_tokens():
+    service = build_service()
+    first = service.stream_chat([], "gpt-5.2")
+    assert await anext(first) == "t0"
+
+    second = service.stream_chat([], "gpt-5.2")
+    assert await anext(second) == queue_event(1, 0)
+
+    # 先行ストリームの終了後に実行開始を通知してからトークンを返す
+    assert [chunk async for chunk in first] == ["t1", "t2"]
+    admitted = await anext(second)
+    assert isinstance(admitted, StreamEvent)
+    assert admitted.data["position"] == 0
+    assert [chunk async for chunk in second] == ["t0", "t1", "t2"]
+    assert service.admission.limiters_for("openai", "gpt-5.2")[0].active == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_raises_and_frees_the_waiter():
+    service = build_service(queue_timeout=0.05)
+    first = service.stream_chat([], "gpt-5.2")
+    await anext(first)
+
+    second = service.stream_chat([], "gpt-5.2")
+    await anext(second)
+    with pytest.raises(QueueTimeoutError):
+        await anext(second)
+
+    limiter = service.admission.limiters_for("openai", "gpt-5.2")[0]
+    assert (limiter.active, limiter.queued) == (1, 0)
+    await first.aclose()
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_closing_a_waiting_stream_leaves_the_queue():
+    service = build_service()
+    first = service.stream_chat([], "gpt-5.2")
+    await anext(first)
+    second = service.stream_chat([], "gpt-5.2")
+    await anext(second)
+
+    await second.aclose()
+    await first.aclose()
+
+    limiter = service.admission.limiters_for("openai", "gpt-5.2")[0]
+    assert (limiter.active, limiter.queued) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_model_limit_is_applied_before_provider_limit():
+    service = build_service(
+        provider_max_concurrency=10, model_max_concurrency={"gpt-5.2-pro": 1}
+    )
+    pro = service.stream_chat([], "gpt-5.2-pro")
+    await anext(pro)
+
+    # 同じプロバイダーの別モデルは待たない
+    assert await anext(service.stream_chat([], "gpt-5.2")) == "t0"
+    assert await anext(service.stream_chat([], "gpt-5.2-pro")) == queue_event(1, 0)
+
+
+def test_parse_limits():
+    assert parse_limits("gpt-5.2-pro=4, claude-opus-4-5=8,") == {
+        "gpt-5.2-pro": 4,
+        "claude-opus-4-5": 8,
+    }
+    assert parse_limits("") == {}
+
+
+def chat(client):
+    return client.post(
+        "/api/chat",
+        json={
+            "message": "Hello",
+            "model": "gpt-5.2",
+            "conversation_id": "test-conversation",
+            "history": [],
+        },
+    )
+
+
+def test_queue_event_is_sent_as_sse_frame():
+    async def stream():
+        yield queue_event(2, 0)
+        yield queue_event(0, 150)
+        yield "Hello"
+
+    with (
+        patch("main.llm_service") as mock_llm_service,
+        patch("main.message_repository", new_callable=AsyncMock) as mock_repo,
+    ):
+        mock_llm_service.is_model_available.return_value = True
+        mock_llm_service.stream_chat.return_value = stream()
+        response = chat(TestClient(app))
+
+    frames = [
+        json.loads(line[len("data: ") :])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert frames == [
+        {"queue": {"position": 2, "wait_ms": 0}},
+        {"queue": {"position": 0, "wait_ms": 150}},
+        {"content": "Hello"},
+        {"done": True},
+    ]
+    # キューイベントは応答本文に含めない
+    assert mock_repo.save_turn.call_args[0][1] == "Hello"
+
+
+def test_admission_error_is_reported_as_busy():
+    async def stream():
+        raise QueueTimeoutError("Timed out waiting for provider:openai")
+        yield ""
+
+    with (
+        patch("main.llm_service") as mock_llm_service,
+        patch("main.message_repository", new_callable=AsyncMock),
+    ):
+        mock_llm_service.is_model_available.return_value = True
+        mock_llm_service.stream_chat.return_value = stream()
+        response = chat(TestClient(app))
+
+    payload = json.loads(response.text.strip()[len("data: ") :])
+    assert payload["error"].startswith("混雑しています")
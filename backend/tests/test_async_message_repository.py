@@ -0,0 +1,71 @@
+"""非同期会話リポジトリテスト"""
+
+import asyncio
+import threading
+
+import pytest
+import pytest_asyncio
+
+from app.repositories.async_message_repository import AsyncMessageRepository
+
+
+@pytest_asyncio.fixture
+async def repo(tmp_path):
+    repository = AsyncMessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+    yield repository
+    await repository.close()
+
+
+@pytest.mark.asyncio
+async def test_save_and_get_messages(repo):
+    await repo.ensure_conversation("conv-1")
+    await repo.save_message("user", "hello", "gpt-5.2", "conv-1")
+    await repo.save_message("assistant", "hi", "gpt-5.2", "conv-1")
+
+    messages = await repo.get_messages_by_conversation("conv-1")
+    summaries = await repo.get_conversation_summaries()
+
+    assert [message.content for message in messages] == ["hello", "hi"]
+    assert summaries[0]["id"] == "conv-1"
+    assert summaries[0]["message_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_db_calls_run_off_event_loop_thread(repo):
+    loop_thread = threading.get_ident()
+    called_threads = []
+    original = repo.repository.get_conversation
+
+    def recording_get_conversation(conversation_id):
+        called_threads.append(threading.get_ident())
+        return original(conversation_id)
+
+    repo.repository.get_conversation = recording_get_conversation
+
+    await repo.get_conversation("missing")
+
+    assert called_threads
+    assert loop_thread not in called_threads
+
+
+@pytest.mark.asyncio
+async def test_event_loop_progresses_during_slow_db_call(repo):
+    release = threading.Event()
+    ticks = 0
+
+    def slow_get_all_messages():
+        release.wait(timeout=5)
+        return []
+
+    repo.repository.get_all_messages = slow_get_all_messages
+
+    async def ticker():
+        nonlocal ticks
+        for _ in range(5):
+            await asyncio.sleep(0)
+            ticks += 1
+        release.set()
+
+    await asyncio.gather(repo.get_all_messages(), ticker())
+
+    assert ticks == 5
@@ -0,0 +1,237 @@
+"""
+クライアント切断時の生成キャンセルのテスト
+
+SSEクライアントが切断した場合に、上流のプロバイダーストリームが即座に閉じられ、
+途中までの応答が truncated として保存されることを検証する。
+"""
+
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+
+from app.services.claude_provider import ClaudeProvider  # noqa: E402
+from app.services.google_provider import GoogleProvider  # noqa: E402
+from app.services.llm_provider import LLMProvider  # noqa: E402
+from app.services.llm_service import LLMService  # noqa: E402
+from app.services.openai_provider import OpenAIProvider  # noqa: E402
+from main import app  # noqa: E402
+
+
+class SlowProvider(LLMProvider):
+    """一定間隔でトークンを返し続けるテスト用プロバイダー"""
+
+    def __init__(self, total: int = 1000, delay: float = 0.01):
+        self.total = total
+        self.delay = delay
+        self.yielded = 0
+        self.closed = False
+
+    async def stream_chat(self, messages, model):
+        try:
+            for i in range(self.total):
+                await asyncio.sleep(self.delay)
+                self.yielded += 1
+                yield f"t{i} "
+        finally:
+            self.closed = True
+
+
+class FakeStream:
+    """SDKのストリーム（非同期コンテキストマネージャー）の代替"""
+
+    def __init__(self, items):
+        self.items = items
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    def __aiter__(self):
+        return self._iterate()
+
+    @property
+    def text_stream(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.items:
+            yield item
+
+
+def build_service(provider: LLMProvider) -> LLMService:
+    service = LLMService()
+    service.providers = {"openai": provider}
+    return service
+
+
+async def post_chat_and_disconnect(
+    frames_before_disconnect: int, disconnected: asyncio.Event | None = None
+) -> list[bytes]:
+    """
+    /api/chatを呼び出し、指定フレーム数を受信した時点で切断する
+
+    disconnectedを指定した場合は、そのイベントがセットされた時点で切断する。
+    """
+    body = json.dumps(
+        {
+            "message": "Hello",
+            "model": "gpt-5.2",
+            "conversation_id": "test-conversation",
+            "history": [],
+        }
+    ).encode()
+    received: list[bytes] = []
+    disconnected = disconnected or asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"])
+            if len(received) >= frames_before_disconnect:
+                disconnected.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/chat",
+        "raw_path": b"/api/chat",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+        ],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    return received
+
+
+@pytest.mark.asyncio
+async def test_disconnect_closes_provider_and_saves_truncated_reply():
+    provider = SlowProvider()
+
+    with (
+        patch("main.llm_service", build_service(provider)),
+        patch("main.message_repository", new_callable=AsyncMock) as mock_repo,
+    ):
+        received = await post_chat_and_disconnect(frames_before_disconnect=3)
+
+    # 上流のストリームが途中で閉じられていること
+    assert provider.closed
+    assert provider.yielded < provider.total
+
+    # 送信済みの内容が truncated として保存されていること
+    streamed = "".join(
+        json.loads(frame.decode()[len("data: ") :])["content"] for frame in received
+    )
+    mock_repo.save_turn.assert_awaited_once()
+    args, kwargs = mock_repo.save_turn.call_args
+    assert args[0] == "Hello"
+    assert args[1].startswith(streamed)
+    assert kwargs == {"truncated": True}
+
+
+@pytest.mark.asyncio
+async def test_disconnect_before_first_token_saves_nothing():
+    started = asyncio.Event()
+
+    class WaitingProvider(LLMProvider):
+        async def stream_chat(self, messages, model):
+            started.set()
+            await asyncio.sleep(10)
+            yield "late"
+
+    with (
+        patch("main.llm_service", build_service(WaitingProvider())),
+        patch("main.message_repository", new_callable=AsyncMock) as mock_repo,
+    ):
+        received = await post_chat_and_disconnect(0, disconnected=started)
+
+    assert received == []
+    mock_repo.save_turn.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_llm_service_aclose_closes_provider_stream():
+    provider = SlowProvider()
+    stream = build_service(provider).stream_chat([], "gpt-5.2")
+
+    await anext(stream)
+    await anext(stream)
+    await stream.aclose()
+
+    assert provider.closed
+    assert provider.yielded == 2
+
+
+@pytest.mark.asyncio
+async def test_openai_provider_closes_sdk_stream():
+    fake = FakeStream(
+        [SimpleNamespace(type="response.output_text.delta", delta="a")] * 10
+    )
+    provider = OpenAIProvider(api_key="test-key")
+    provider.client = MagicMock()
+    provider.client.responses.stream.return_value = fake
+
+    stream = provider.stream_chat([{"role": "user", "content": "hi"}], "gpt-5.2")
+    await anext(stream)
+    await stream.aclose()
+
+    assert fake.closed
+
+
+@pytest.mark.asyncio
+async def test_claude_provider_closes_sdk_stream():
+    fake = FakeStream(["a"] * 10)
+    provider = ClaudeProvider(api_key="test-key")
+    provider.client = MagicMock()
+    provider.client.messages.stream.return_value = fake
+
+    stream = provider.stream_chat(
+        [{"role": "user", "content": "hi"}], "claude-haiku-4-5"
+    )
+    await anext(stream)
+    await stream.aclose()
+
+    assert fake.closed
+
+
+@pytest.mark.asyncio
+async def test_google_provider_closes_sdk_stream():
+    chunk = SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content="a"))]
+    )
+    fake = FakeStream([chunk] * 10)
+    provider = GoogleProvider(api_key="test-key")
+    provider.client = MagicMock()
+    provider.client.chat.completions.create = AsyncMock(return_value=fake)
+
+    stream = provider.stream_chat(
+        [{"role": "user", "content": "hi"}], "gemini-3-flash-preview"
+    )
+    await anext(stream)
+    await stream.aclose()
+
+    assert fake.closed
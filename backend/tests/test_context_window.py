@@ -0,0 +1,144 @@
+"""コンテキストウィンドウ管理のテスト"""
+
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from app.services.context_window import (
+    MESSAGE_OVERHEAD_TOKENS,
+    ContextWindowManager,
+    TokenCounter,
+    estimate_tokens,
+)
+from app.services.llm_provider import LLMProvider
+from app.services.llm_service import LLMService
+
+
+def turn(i: int) -> list[dict[str, str]]:
+    return [
+        {"role": "user", "content": f"question {i} " * 10},
+        {"role": "assistant", "content": f"answer {i} " * 10},
+    ]
+
+
+def test_every_routed_model_has_a_budget():
+    assert set(LLMService().model_mapping) <= set(ContextWindowManager().budgets)
+
+
+def test_estimate_tokens_counts_japanese_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("こんにちは") == 5
+    assert estimate_tokens("abcdこんにちは") == 6
+
+
+def test_token_counter_caches_counts_per_content():
+    counter = TokenCounter(max_entries=2)
+
+    assert counter.count("abcd") == 1 + MESSAGE_OVERHEAD_TOKENS
+    counter.count("abcd")
+    counter.count("efgh")
+    counter.count("ijkl")
+
+    assert len(counter) == 2
+
+
+def test_fit_returns_same_list_when_within_budget():
+    manager = ContextWindowManager(strategy="drop_oldest")
+    messages = [*turn(1), {"role": "user", "content": "hi"}]
+
+    assert manager.fit(messages, "gpt-5.2") is messages
+
+
+def test_drop_oldest_keeps_system_and_recent_turns():
+    manager = ContextWindowManager(strategy="drop_oldest", max_tokens=200)
+    system = {"role": "system", "content": "You are helpful."}
+    messages = [system]
+    for i in range(10):
+        messages.extend(turn(i))
+    messages.append({"role": "user", "content": "latest"})
+
+    fitted = manager.fit(messages, "gpt-5.2")
+
+    assert fitted[0] == system
+    assert fitted[1]["role"] == "user"
+    assert fitted[-1] == {"role": "user", "content": "latest"}
+    assert fitted[1:] == messages[len(messages) - len(fitted) + 1 :]
+    assert len(fitted) < len(messages)
+
+
+def test_last_n_keeps_system_plus_last_messages():
+    manager = ContextWindowManager(strategy="last_n", keep_last_n=3)
+    system = {"role": "system", "content": "You are helpful."}
+    messages = [system, *turn(1), *turn(2), {"role": "user", "content": "latest"}]
+
+    fitted = manager.fit(messages, "gpt-5.2")
+
+    assert fitted == [system, *messages[-3:]]
+
+
+def test_truncated_history_starts_with_user_message():
+    manager = ContextWindowManager(strategy="last_n", keep_last_n=2)
+    messages = [*turn(1), {"role": "user", "content": "latest"}]
+
+    assert manager.fit(messages, "gpt-5.2") == [messages[-1]]
+
+
+def test_latest_message_is_kept_even_when_over_budget():
+    manager = ContextWindowManager(strategy="drop_oldest", max_tokens=10)
+    latest = {"role": "user", "content": "x" * 1000}
+
+    assert manager.fit([*turn(1), latest], "gpt-5.2") == [latest]
+
+
+class RecordingProvider(LLMProvider):
+    """受け取ったメッセージを記録するプロバイダー"""
+
+    def __init__(self):
+        self.received = None
+
+    async def stream_chat(self, messages, model):
+        self.received = messages
+        yield "ok"
+
+
+@pytest.mark.asyncio
+async def test_llm_service_applies_context_window_before_dispatch():
+    provider = RecordingProvider()
+    service = LLMService(context_window=ContextWindowManager(max_tokens=50))
+    service.providers = {"claude": provider}
+    messages = [*turn(1), *turn(2), {"role": "user", "content": "latest"}]
+
+    chunks = [
+        chunk async for chunk in service.stream_chat(messages, "claude-haiku-4-5")
+    ]
+
+    assert chunks == ["ok"]
+    assert provider.received[-1] == {"role": "user", "content": "latest"}
+    assert len(provider.received) < len(messages)
+
+
+def test_unknown_strategy_raises():
+    with pytest.raises(ValueError, match="Unknown truncation strategy"):
+        ContextWindowManager(strategy="random")
+
+
+@settings(max_examples=50)
+@given(
+    sizes=st.lists(st.integers(min_value=0, max_value=200), min_size=1, max_size=30),
+    max_tokens=st.integers(min_value=50, max_value=2000),
+)
+def test_fit_stays_within_budget_and_preserves_order(sizes, max_tokens):
+    manager = ContextWindowManager(strategy="drop_oldest", max_tokens=max_tokens)
+    roles = ["user", "assistant"]
+    messages = [
+        {"role": roles[i % 2], "content": f"{i}:" + "a" * size}
+        for i, size in enumerate(sizes)
+    ]
+
+    fitted = manager.fit(messages, "gpt-5.2")
+    total = sum(manager.token_counter.count(msg["content"]) for msg in fitted)
+
+    assert fitted[-1] is messages[-1]
+    assert fitted == messages[len(messages) - len(fitted) :]
+    assert len(fitted) == 1 or total <= manager.budget_for("gpt-5.2")
@@ -0,0 +1,76 @@
+"""会話履歴キャッシュのテスト"""
+
+from app.repositories.conversation_history_cache import ConversationHistoryCache
+
+
+def test_get_returns_none_on_miss_and_copy_on_hit():
+    cache = ConversationHistoryCache()
+    assert cache.get("conv-1") is None
+
+    cache.put("conv-1", [{"role": "user", "content": "hello"}])
+    history = cache.get("conv-1")
+    history.append({"role": "user", "content": "mutated"})
+
+    assert cache.get("conv-1") == [{"role": "user", "content": "hello"}]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_append_turn_extends_cached_history_only():
+    cache = ConversationHistoryCache()
+    cache.put("conv-1", [])
+
+    cache.append_turn("conv-1", "question", "answer")
+    cache.append_turn("conv-2", "question", "answer")
+
+    assert cache.get("conv-1") == [
+        {"role": "user", "content": "question"},
+        {"role": "assistant", "content": "answer"},
+    ]
+    assert cache.get("conv-2") is None
+
+
+def test_least_recently_used_conversation_is_evicted():
+    cache = ConversationHistoryCache(max_conversations=2)
+    cache.put("conv-1", [])
+    cache.put("conv-2", [])
+    cache.get("conv-1")
+
+    cache.put("conv-3", [])
+
+    assert len(cache) == 2
+    assert cache.get("conv-2") is None
+    assert cache.get("conv-1") == []
+
+
+def test_invalidate_and_zero_size_disable_caching():
+    cache = ConversationHistoryCache()
+    cache.put("conv-1", [])
+    cache.invalidate("conv-1")
+    cache.invalidate("missing")
+    assert cache.get("conv-1") is None
+
+    disabled = ConversationHistoryCache(max_conversations=0)
+    disabled.put("conv-1", [])
+    assert disabled.get("conv-1") is None
+
+
+def test_load_is_not_put_when_conversation_changes_during_read():
+    """読み込み中に保存されたターンが欠けた履歴で上書きしないこと"""
+    cache = ConversationHistoryCache()
+    stored = [{"role": "user", "content": "old"}]
+
+    load = cache.begin_load("conv-1")
+    cache.append_turn("conv-1", "question", "answer")
+    cache.put("conv-1", stored, load)
+    assert cache.get("conv-1") is None
+
+    load = cache.begin_load("conv-1")
+    cache.invalidate("conv-1")
+    cache.put("conv-1", stored, load)
+    assert cache.get("conv-1") is None
+
+    load = cache.begin_load("conv-1")
+    cache.append_turn("conv-2", "question", "answer")
+    cache.put("conv-1", stored, load)
+    assert cache.get("conv-1") == stored
+    assert cache._loads == {}
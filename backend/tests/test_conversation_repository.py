@@ -1,6 +1,15 @@
 """会話リポジトリテスト"""
 
-from app.repositories.message_repository import MessageRepository
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+from app.repositories.message_repository import (
+    LEGACY_CONVERSATION_ID,
+    MessageRepository,
+)
+from app.repositories.pagination import encode_cursor
 
 
 def test_save_message_with_conversation_id():
@@ -49,3 +58,212 @@ def test_delete_conversation_returns_false_when_not_found():
     deleted = repo.delete_conversation("missing")
 
     assert deleted is False
+
+
+def test_get_conversation_summaries_counts_and_preview():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+
+    repo.create_conversation("空の会話", "conv-empty")
+    repo.create_conversation("会話1", "conv-1")
+    repo.save_message("user", "question", "gpt-5.2", "conv-1")
+    repo.save_message("assistant", "a" * 100, "gpt-5.2", "conv-1")
+
+    summaries = {
+        summary["id"]: summary for summary in repo.get_conversation_summaries()
+    }
+
+    assert summaries["conv-1"]["message_count"] == 2
+    assert summaries["conv-1"]["last_message_preview"] == "a" * 80
+    assert summaries["conv-empty"]["message_count"] == 0
+    assert summaries["conv-empty"]["last_message_preview"] == ""
+    assert set(summaries["conv-1"]) == {
+        "id",
+        "title",
+        "created_at",
+        "updated_at",
+        "message_count",
+        "last_message_preview",
+    }
+
+
+def test_save_message_updates_conversation_stats():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+
+    repo.create_conversation("会話1", "conv-1")
+    repo.save_message("user", "question", "gpt-5.2", "conv-1")
+    reply = repo.save_message("assistant", "answer", "gpt-5.2", "conv-1")
+
+    conversation = repo.get_conversation("conv-1")
+
+    assert conversation.message_count == 2
+    assert conversation.last_message_preview == "answer"
+    assert conversation.last_message_at == reply.timestamp
+
+
+def test_migrate_schema_backfills_conversation_stats(tmp_path):
+    db_path = tmp_path / "chat.db"
+    connection = sqlite3.connect(db_path)
+    connection.executescript(
+        """
+        CREATE TABLE conversations (
+            id VARCHAR PRIMARY KEY,
+            title VARCHAR NOT NULL,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL
+        );
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id VARCHAR,
+            role VARCHAR NOT NULL,
+            content VARCHAR NOT NULL,
+            model VARCHAR NOT NULL,
+            timestamp DATETIME NOT NULL
+        );
+        INSERT INTO conversations VALUES
+            ('conv-1', '会話1', '2026-01-01 00:00:00', '2026-01-01 00:00:02');
+        INSERT INTO messages (conversation_id, role, content, model, timestamp)
+        VALUES
+            ('conv-1', 'user', 'hello', 'gpt-5.2', '2026-01-01 00:00:01'),
+            ('conv-1', 'assistant', 'world', 'gpt-5.2', '2026-01-01 00:00:02');
+        """
+    )
+    connection.commit()
+    connection.close()
+
+    repo = MessageRepository(db_url=f"sqlite:///{db_path}")
+    summaries = repo.get_conversation_summaries()
+
+    assert summaries[0]["message_count"] == 2
+    assert summaries[0]["last_message_preview"] == "world"
+    assert repo.get_conversation("conv-1").last_message_at is not None
+    messages = repo.get_messages_by_conversation("conv-1")
+    assert [m.truncated for m in messages] == [False, False]
+
+
+def test_get_messages_by_conversation_paginates_with_cursor():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+    repo.create_conversation("会話1", "conv-1")
+    for i in range(5):
+        repo.save_message("user", f"m{i}", "gpt-5.2", "conv-1")
+
+    first_page = repo.get_messages_by_conversation("conv-1", limit=2)
+    cursor = encode_cursor(first_page[-1].timestamp, first_page[-1].id)
+    second_page = repo.get_messages_by_conversation("conv-1", limit=2, after=cursor)
+    older = repo.get_messages_by_conversation(
+        "conv-1",
+        limit=2,
+        before=encode_cursor(second_page[0].timestamp, second_page[0].id),
+    )
+
+    assert [m.content for m in first_page] == ["m0", "m1"]
+    assert [m.content for m in second_page] == ["m2", "m3"]
+    assert [m.content for m in older] == ["m0", "m1"]
+
+
+def test_get_conversation_history_returns_role_and_content_in_order():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+    repo.save_turn("question", "answer", "gpt-5.2", "conv-1")
+    repo.save_message("user", "other", "gpt-5.2", "conv-2")
+
+    assert repo.get_conversation_history("conv-1") == [
+        {"role": "user", "content": "question"},
+        {"role": "assistant", "content": "answer"},
+    ]
+    assert repo.get_conversation_history("missing") == []
+
+
+def test_get_conversation_summaries_paginates_with_cursor():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+    for i in range(5):
+        repo.create_conversation(f"会話{i}", f"conv-{i}")
+        repo.save_message("user", f"m{i}", "gpt-5.2", f"conv-{i}")
+
+    first_page = repo.get_conversation_summaries(limit=2)
+    last = first_page[-1]
+    second_page = repo.get_conversation_summaries(
+        limit=2, after=encode_cursor(last["updated_at"], last["id"])
+    )
+    first = second_page[0]
+    newer = repo.get_conversation_summaries(
+        limit=2, before=encode_cursor(first["updated_at"], first["id"])
+    )
+
+    assert [s["id"] for s in first_page] == ["conv-4", "conv-3"]
+    assert [s["id"] for s in second_page] == ["conv-2", "conv-1"]
+    assert [s["id"] for s in newer] == ["conv-4", "conv-3"]
+
+
+def test_pagination_rejects_invalid_cursor():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+
+    with pytest.raises(ValueError):
+        repo.get_conversation_summaries(limit=2, after="not-a-cursor")
+
+
+def test_save_turn_persists_both_messages_and_stats():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+
+    user_message, assistant_message = repo.save_turn(
+        "question", "answer", "gpt-5.2", "conv-1"
+    )
+
+    assert user_message.id is not None
+    assert assistant_message.id is not None
+    assert assistant_message.timestamp is not None
+    messages = repo.get_messages_by_conversation("conv-1")
+    assert [(m.role, m.content) for m in messages] == [
+        ("user", "question"),
+        ("assistant", "answer"),
+    ]
+    conversation = repo.get_conversation("conv-1")
+    assert conversation.title == "question"
+    assert conversation.message_count == 2
+    assert conversation.last_message_preview == "answer"
+
+
+def test_save_turn_marks_truncated_reply():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+
+    repo.save_turn("question", "partial", "gpt-5.2", "conv-1", truncated=True)
+
+    messages = repo.get_messages_by_conversation("conv-1")
+    assert [(m.role, m.truncated) for m in messages] == [
+        ("user", False),
+        ("assistant", True),
+    ]
+
+
+def test_save_turn_orders_assistant_after_user():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+
+    user_message, assistant_message = repo.save_turn(
+        "question", "answer", "gpt-5.2", LEGACY_CONVERSATION_ID
+    )
+
+    # 時刻のみで並べる経路でもユーザー発言が先になるよう、応答の時刻は厳密に後
+    assert assistant_message.timestamp > user_message.timestamp
+    assert [m.role for m in repo.get_all_messages()] == ["user", "assistant"]
+
+
+def test_save_turn_uses_single_transaction_without_refresh():
+    repo = MessageRepository(db_url="sqlite:///:memory:")
+    repo.create_conversation("会話1", "conv-1")
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement.lstrip().split()[0].upper())
+
+    def on_commit(conn):
+        statements.append("COMMIT")
+
+    event.listen(repo.engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(repo.engine, "commit", on_commit)
+
+    repo.save_turn("question", "answer", "gpt-5.2", "conv-1")
+
+    # 会話の取得1回とコミット1回のみで、INSERT後のrefresh（再SELECT）が無い
+    assert statements.count("COMMIT") == 1
+    assert statements.count("SELECT") == 1
+    assert statements[0] == "SELECT"
+    assert statements[-1] == "COMMIT"
+    assert sorted(set(statements[1:-1])) == ["INSERT", "UPDATE"]
@@ -0,0 +1,143 @@
+"""会話のバックグラウンド要約のテスト"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+
+from app.repositories.async_message_repository import AsyncMessageRepository
+from app.services.conversation_summarizer import (
+    SUMMARY_CONTEXT_PREFIX,
+    ConversationSummarizer,
+)
+
+
+class FakeLLMService:
+    """受け取ったプロンプトを記録し、固定の要約を返すLLMサービス"""
+
+    def __init__(self, available: bool = True):
+        self.available = available
+        self.prompts = []
+
+    def is_model_available(self, model):
+        return self.available
+
+    async def stream_chat(self, messages, model):
+        self.prompts.append(messages)
+        yield f"summary-{len(self.prompts)}"
+
+
+@pytest_asyncio.fixture
+async def repo(tmp_path):
+    repository = AsyncMessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+    yield repository
+    await repository.close()
+
+
+async def seed_turns(repo, conversation_id, start, count):
+    for i in range(start, start + count):
+        await repo.save_turn(f"q{i}", f"a{i}", "gpt-5.2", conversation_id)
+
+
+async def run_scheduled(summarizer, conversation_id, message_count):
+    summarizer.schedule(conversation_id, message_count)
+    task = summarizer._tasks.get(conversation_id)
+    if task is not None:
+        await asyncio.wait_for(task, timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_schedule_below_threshold_does_nothing(repo):
+    llm = FakeLLMService()
+    summarizer = ConversationSummarizer(
+        llm, repo, model="cheap", trigger_messages=6, keep_recent=2
+    )
+    await seed_turns(repo, "conv-1", 0, 3)
+
+    await run_scheduled(summarizer, "conv-1", 6)
+
+    assert llm.prompts == []
+    assert await repo.get_rolling_summary("conv-1") is None
+
+
+@pytest.mark.asyncio
+async def test_summary_is_stored_and_used_for_prompts(repo):
+    llm = FakeLLMService()
+    summarizer = ConversationSummarizer(
+        llm, repo, model="cheap", trigger_messages=6, keep_recent=2
+    )
+    await seed_turns(repo, "conv-1", 0, 4)
+
+    await run_scheduled(summarizer, "conv-1", 8)
+
+    summary = await repo.get_rolling_summary("conv-1")
+    assert summary.content == "summary-1"
+    assert summary.summarized_count == 6
+    assert summary.model == "cheap"
+
+    history = await repo.get_conversation_history("conv-1")
+    messages = await summarizer.build_messages("conv-1", history)
+    assert messages == [
+        {"role": "system", "content": SUMMARY_CONTEXT_PREFIX + "summary-1"},
+        {"role": "user", "content": "q3"},
+        {"role": "assistant", "content": "a3"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_summary_is_updated_incrementally(repo):
+    llm = FakeLLMService()
+    summarizer = ConversationSummarizer(
+        llm, repo, model="cheap", trigger_messages=6, keep_recent=2
+    )
+    await seed_turns(repo, "conv-1", 0, 4)
+    await run_scheduled(summarizer, "conv-1", 8)
+
+    await seed_turns(repo, "conv-1", 4, 3)
+    await run_scheduled(summarizer, "conv-1", 14)
+
+    # 2回目は前回の要約と、要約後の新しいメッセージのみを渡す
+    second_prompt = llm.prompts[1][1]["content"]
+    assert "summary-1" in second_prompt
+    assert "q2" not in second_prompt
+    assert "q3" in second_prompt
+    assert "a5" in second_prompt
+    assert "q6" not in second_prompt
+    summary = await repo.get_rolling_summary("conv-1")
+    assert (summary.content, summary.summarized_count) == ("summary-2", 12)
+
+
+@pytest.mark.asyncio
+async def test_summarization_failure_is_logged(repo):
+    class FailingLLMService(FakeLLMService):
+        async def stream_chat(self, messages, model):
+            raise RuntimeError("upstream error")
+            yield ""
+
+    summarizer = ConversationSummarizer(
+        FailingLLMService(), repo, model="cheap", trigger_messages=2, keep_recent=0
+    )
+    await seed_turns(repo, "conv-1", 0, 1)
+
+    with patch("app.services.conversation_summarizer.logger") as mock_logger:
+        await run_scheduled(summarizer, "conv-1", 2)
+
+    mock_logger.error.assert_called_once()
+    assert await repo.get_rolling_summary("conv-1") is None
+
+
+@pytest.mark.asyncio
+async def test_deleted_conversation_removes_summary(repo):
+    summarizer = ConversationSummarizer(
+        FakeLLMService(), repo, model="cheap", trigger_messages=2, keep_recent=0
+    )
+    await seed_turns(repo, "conv-1", 0, 1)
+    await run_scheduled(summarizer, "conv-1", 2)
+
+    await repo.delete_conversation("conv-1")
+    summarizer.invalidate("conv-1")
+
+    assert await repo.get_rolling_summary("conv-1") is None
+    assert await repo.save_rolling_summary("conv-1", "stale", 2, "cheap") is None
+    assert await summarizer.build_messages("conv-1", []) == []
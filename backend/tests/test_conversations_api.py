@@ -1,10 +1,12 @@
 """会話APIのテスト"""
 
-from unittest.mock import MagicMock, patch
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
+from app.repositories.pagination import decode_cursor
 from main import app
 
 
@@ -14,7 +16,7 @@ def client():
 
 
 def test_create_conversation(client):
-    with patch("main.message_repository") as mock_repo:
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
         mock_repo.create_conversation.return_value = MagicMock(
             id="conv-1",
             title="新しいチャット",
@@ -31,7 +33,7 @@ def test_create_conversation(client):
 
 
 def test_list_conversations(client):
-    with patch("main.message_repository") as mock_repo:
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
         mock_repo.get_conversation_summaries.return_value = [
             {
                 "id": "conv-1",
@@ -53,7 +55,7 @@ def test_list_conversations(client):
 
 
 def test_get_conversation_messages(client):
-    with patch("main.message_repository") as mock_repo:
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
         mock_repo.get_conversation.return_value = MagicMock(id="conv-1")
         mock_repo.get_messages_by_conversation.return_value = [
             MagicMock(
@@ -63,6 +65,7 @@ def test_get_conversation_messages(client):
                 content="hello",
                 model="gpt-5.2",
                 timestamp="2026-01-01T00:00:00",
+                truncated=False,
             )
         ]
 
@@ -75,7 +78,7 @@ def test_get_conversation_messages(client):
 
 
 def test_delete_conversation_success(client):
-    with patch("main.message_repository") as mock_repo:
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
         mock_repo.delete_conversation.return_value = True
 
         response = client.delete("/api/conversations/conv-1")
@@ -85,7 +88,7 @@ def test_delete_conversation_success(client):
 
 
 def test_delete_conversation_not_found(client):
-    with patch("main.message_repository") as mock_repo:
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
         mock_repo.delete_conversation.return_value = False
 
         response = client.delete("/api/conversations/not-found")
@@ -93,3 +96,78 @@ def test_delete_conversation_not_found(client):
         assert response.status_code == 404
         payload = response.json()
         assert payload["detail"] == "会話が見つかりません"
+
+
+def test_list_conversations_returns_next_cursor_when_page_is_full(client):
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
+        mock_repo.get_conversation_summaries.return_value = [
+            {
+                "id": "conv-1",
+                "title": "会話1",
+                "created_at": datetime(2026, 1, 1),
+                "updated_at": datetime(2026, 1, 2),
+                "message_count": 2,
+                "last_message_preview": "こんにちは",
+            }
+        ]
+
+        response = client.get("/api/conversations", params={"limit": 1})
+
+        assert response.status_code == 200
+        mock_repo.get_conversation_summaries.assert_called_once_with(
+            limit=1, before=None, after=None
+        )
+        cursor = response.headers["X-Next-Cursor"]
+        assert decode_cursor(cursor) == (datetime(2026, 1, 2), "conv-1")
+
+
+def test_get_conversation_messages_paginates(client):
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
+        mock_repo.get_conversation.return_value = MagicMock(id="conv-1")
+        mock_repo.get_messages_by_conversation.return_value = [
+            MagicMock(
+                id=3,
+                conversation_id="conv-1",
+                role="user",
+                content="hello",
+                model="gpt-5.2",
+                timestamp=datetime(2026, 1, 1),
+                truncated=False,
+            )
+        ]
+
+        response = client.get(
+            "/api/conversations/conv-1/messages",
+            params={"limit": 1, "after": "cursor-1"},
+        )
+
+        assert response.status_code == 200
+        mock_repo.get_messages_by_conversation.assert_called_once_with(
+            "conv-1", limit=1, before=None, after="cursor-1"
+        )
+        assert decode_cursor(response.headers["X-Next-Cursor"]) == (
+            datetime(2026, 1, 1),
+            3,
+        )
+
+
+def test_last_page_has_no_next_cursor(client):
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
+        mock_repo.get_conversation_summaries.return_value = []
+
+        response = client.get("/api/conversations", params={"limit": 10})
+
+        assert response.status_code == 200
+        assert "X-Next-Cursor" not in response.headers
+
+
+def test_invalid_cursor_returns_400(client):
+    with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
+        mock_repo.get_conversation_summaries.side_effect = ValueError("bad cursor")
+
+        response = client.get(
+            "/api/conversations", params={"limit": 10, "after": "broken"}
+        )
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "不正なカーソルです"
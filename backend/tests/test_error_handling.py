@@ -6,8 +6,10 @@
 
 import json
 import os
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
+import httpx
+import openai
 import pytest
 from fastapi.testclient import TestClient
 
@@ -17,6 +19,14 @@ os.environ["ANTHROPIC_API_KEY"] = "test-anthropic-key"
 
 from main import app
 
+OPENAI_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/responses")
+
+
+def api_status_error(error_class: type, status_code: int, message: str):
+    """SDKのHTTPステータスエラーを作成"""
+    response = httpx.Response(status_code, request=OPENAI_REQUEST)
+    return error_class(message, response=response, body=None)
+
 
 @pytest.fixture
 def client():
@@ -27,8 +37,8 @@ def client():
 @pytest.fixture
 def mock_message_repository():
     """MessageRepositoryをモック"""
-    with patch("main.message_repository") as mock:
-        mock.save_message.return_value = None
+    with patch("main.message_repository", new_callable=AsyncMock) as mock:
+        mock.save_turn.return_value = None
         yield mock
 
 
@@ -41,7 +51,7 @@ def test_rate_limit_error_handling(client, mock_message_repository):
         mock.is_model_available.return_value = True
 
         async def mock_stream():
-            raise Exception("rate limit exceeded")
+            raise api_status_error(openai.RateLimitError, 429, "Too Many Requests")
             yield  # この行は実行されない
 
         mock.stream_chat.return_value = mock_stream()
@@ -81,7 +91,7 @@ def test_authentication_error_handling(client, mock_message_repository):
         mock.is_model_available.return_value = True
 
         async def mock_stream():
-            raise Exception("authentication failed")
+            raise api_status_error(openai.AuthenticationError, 401, "Invalid API key")
             yield  # この行は実行されない
 
         mock.stream_chat.return_value = mock_stream()
@@ -120,7 +130,7 @@ def test_network_error_handling(client, mock_message_repository):
         mock.is_model_available.return_value = True
 
         async def mock_stream():
-            raise Exception("network connection failed")
+            raise openai.APIConnectionError(request=OPENAI_REQUEST)
             yield  # この行は実行されない
 
         mock.stream_chat.return_value = mock_stream()
@@ -251,9 +261,9 @@ def test_database_error_does_not_affect_user(client):
 
         mock_llm.stream_chat.return_value = mock_stream()
 
-        with patch("main.message_repository") as mock_repo:
+        with patch("main.message_repository", new_callable=AsyncMock) as mock_repo:
             # データベースエラーを発生させる
-            mock_repo.save_message.side_effect = Exception("Database error")
+            mock_repo.save_turn.side_effect = Exception("Database error")
 
             response = client.post(
                 "/api/chat",
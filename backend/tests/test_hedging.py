@@ -0,0 +1,323 @@
+"""ヘッジリクエストのテスト"""
+
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController
+from app.services.hedging import RELAY_QUEUE_SIZE, HedgePolicy, race_first_chunk
+from app.services.llm_provider import LLMProvider
+from app.services.llm_service import LLMService
+from app.services.metrics import MetricsRegistry
+from app.services.model_router import ModelRouter
+from app.services.rate_limiter import RateLimiter
+from app.services.retry import RetryPolicy
+from app.services.stream_events import model_event, usage_event
+
+
+class FakeStream:
+    """最初のチャンクまでの遅延と閉じられたかを記録するストリーム"""
+
+    def __init__(self, chunks, first_delay=0.0, error=None):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.error = error
+        self.closed = False
+        self.sent = 0
+
+    async def __call__(self):
+        try:
+            await asyncio.sleep(self.first_delay)
+            if self.error is not None:
+                raise self.error
+            for chunk in self.chunks:
+                self.sent += 1
+                yield chunk
+                await asyncio.sleep(0)
+        finally:
+            self.closed = True
+
+
+def backup_starter(stream: FakeStream | None):
+    calls = []
+
+    def start_backup():
+        calls.append(True)
+        if stream is None:
+            return None
+        return stream(), lambda: calls.append("released")
+
+    return start_backup, calls
+
+
+async def collect(race) -> list:
+    return [item async for item in race]
+
+
+def test_policy_uses_fixed_delay_until_enough_samples():
+    policy = HedgePolicy(
+        enabled=True, delay=1.5, quantile=0.9, backups={}, min_samples=10
+    )
+    for ttft in range(9):
+        policy.record("gpt-5.2", ttft / 10)
+    assert policy.delay_for("gpt-5.2") == 1.5
+
+    policy.record("gpt-5.2", 0.9)
+    assert policy.delay_for("gpt-5.2") == pytest.approx(0.8)
+    assert policy.delay_for("claude-haiku-4-5") == 1.5
+
+
+def test_policy_backup_model_defaults_to_same_model():
+    policy = HedgePolicy(enabled=True, backups={"gpt-5.2-pro": ["gpt-5.2"]})
+
+    assert policy.backup_for("gpt-5.2-pro") == "gpt-5.2"
+    assert policy.backup_for("gpt-5.2") == "gpt-5.2"
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_does_not_hedge():
+    primary = FakeStream(["a", "b"])
+    start_backup, calls = backup_starter(FakeStream(["x"]))
+
+    items = await collect(race_first_chunk(primary(), start_backup, 0.5))
+
+    assert items == [(0, "a"), (0, "b")]
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_loses_to_hedge_and_is_closed():
+    primary = FakeStream(["slow"], first_delay=5)
+    backup = FakeStream(["fast", "!"])
+    start_backup, calls = backup_starter(backup)
+
+    items = await collect(race_first_chunk(primary(), start_backup, 0.05))
+
+    assert items == [(1, "fast"), (1, "!")]
+    assert primary.closed
+    assert calls == [True, "released"]
+
+
+@pytest.mark.asyncio
+async def test_primary_still_wins_when_hedge_is_slower():
+    primary = FakeStream(["primary"], first_delay=0.1)
+    backup = FakeStream(["backup"], first_delay=5)
+    start_backup, calls = backup_starter(backup)
+
+    items = await collect(race_first_chunk(primary(), start_backup, 0.02))
+
+    assert items == [(0, "primary")]
+    assert backup.closed
+
+
+@pytest.mark.asyncio
+async def test_waits_for_primary_when_hedge_is_not_sent():
+    primary = FakeStream(["primary"], first_delay=0.1)
+    start_backup, calls = backup_starter(None)
+
+    items = await collect(race_first_chunk(primary(), start_backup, 0.02))
+
+    assert items == [(0, "primary")]
+    assert calls == [True]
+
+
+@pytest.mark.asyncio
+async def test_error_before_hedge_is_raised():
+    primary = FakeStream([], error=RuntimeError("boom"))
+    start_backup, calls = backup_starter(FakeStream(["x"]))
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await collect(race_first_chunk(primary(), start_backup, 0.5))
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_failed_racer_waits_for_the_other():
+    primary = FakeStream(["primary"], first_delay=0.1)
+    backup = FakeStream([], error=RuntimeError("backup failed"))
+    start_backup, _ = backup_starter(backup)
+
+    items = await collect(race_first_chunk(primary(), start_backup, 0.02))
+
+    assert items == [(0, "primary")]
+
+
+@pytest.mark.asyncio
+async def test_raises_primary_error_when_both_fail():
+    primary = FakeStream([], first_delay=0.1, error=RuntimeError("primary failed"))
+    backup = FakeStream([], error=RuntimeError("backup failed"))
+    start_backup, _ = backup_starter(backup)
+
+    with pytest.raises(RuntimeError, match="primary failed"):
+        await collect(race_first_chunk(primary(), start_backup, 0.02))
+
+
+@pytest.mark.asyncio
+async def test_closing_the_race_closes_every_stream():
+    primary = FakeStream(["slow"], first_delay=5)
+    backup = FakeStream([f"t{i}" for i in range(100)])
+    start_backup, calls = backup_starter(backup)
+
+    race = race_first_chunk(primary(), start_backup, 0.02)
+    assert await anext(race) == (1, "t0")
+    await race.aclose()
+
+    assert primary.closed
+    assert backup.closed
+    assert calls[-1] == "released"
+
+
+@pytest.mark.asyncio
+async def test_losing_hedge_is_released_before_winner_finishes():
+    primary = FakeStream(["a", "b"], first_delay=0.1)
+    backup = FakeStream(["backup"], first_delay=5)
+    start_backup, calls = backup_starter(backup)
+
+    race = race_first_chunk(primary(), start_backup, 0.02)
+    assert await anext(race) == (0, "a")
+    await asyncio.sleep(0.01)
+
+    assert backup.closed
+    assert calls == [True, "released"]
+    await race.aclose()
+
+
+@pytest.mark.asyncio
+async def test_relay_queue_applies_backpressure_to_winner():
+    primary = FakeStream([f"t{i}" for i in range(200)])
+    start_backup, _ = backup_starter(None)
+
+    race = race_first_chunk(primary(), start_backup, 0.5)
+    assert await anext(race) == (0, "t0")
+    await asyncio.sleep(0.05)
+
+    assert primary.sent <= RELAY_QUEUE_SIZE + 2
+    await race.aclose()
+
+
+class SlowFirstCallProvider(LLMProvider):
+    """最初の呼び出しだけ最初のチャンクが遅いプロバイダー"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def stream_chat(self, messages, model):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(5)
+        yield f"{model}:{self.calls}"
+
+
+def build_service(provider: LLMProvider, backups=None) -> LLMService:
+    service = LLMService(
+        admission=AdmissionController(model_max_concurrency={}),
+        rate_limiter=RateLimiter(
+            provider_rpm={}, provider_tpm={}, model_rpm={}, model_tpm={}
+        ),
+        retry_policy=RetryPolicy(max_attempts=1),
+        metrics=MetricsRegistry(),
+        router=ModelRouter({}),
+        hedging=HedgePolicy(enabled=True, delay=0.05, backups=backups or {}),
+    )
+    service.providers = {"openai": provider}
+    return service
+
+
+@pytest.mark.asyncio
+async def test_llm_service_hedges_slow_first_token():
+    service = build_service(SlowFirstCallProvider())
+
+    chunks = [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], "gpt-5.2"
+        )
+    ]
+
+    assert chunks == ["gpt-5.2:2"]
+    assert service.metrics.get("llm_hedges_total") == 1
+    assert service.metrics.get("llm_hedge_wins_total") == 1
+    limiter = service.admission.limiters_for("openai", "gpt-5.2")[0]
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_llm_service_reports_backup_model_when_it_wins():
+    service = build_service(
+        SlowFirstCallProvider(), backups={"gpt-5.2-pro": ["gpt-5.2"]}
+    )
+
+    chunks = [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], "gpt-5.2-pro"
+        )
+    ]
+
+    assert chunks == [model_event("gpt-5.2", "gpt-5.2-pro", "hedge"), "gpt-5.2:2"]
+
+
+@pytest.mark.asyncio
+async def test_llm_service_skips_hedge_without_spare_capacity():
+    service = build_service(SlowFirstCallProvider())
+    service.admission = AdmissionController(
+        provider_max_concurrency=1, model_max_concurrency={}
+    )
+    service.hedging.delay = 0.01
+
+    class SlowProvider(LLMProvider):
+        async def stream_chat(self, messages, model):
+            await asyncio.sleep(0.1)
+            yield "primary"
+
+    service.providers = {"openai": SlowProvider()}
+
+    chunks = [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], "gpt-5.2"
+        )
+    ]
+
+    assert chunks == ["primary"]
+    assert service.metrics.get("llm_hedges_total") == 0
+
+
+@pytest.mark.asyncio
+async def test_backup_win_is_recorded_for_the_backup_only():
+    """勝ったヘッジ先のみに最初のチャンクまでの時間と使用量を記録すること"""
+
+    class SlowProvider(LLMProvider):
+        async def stream_chat(self, messages, model):
+            await asyncio.sleep(5)
+            yield "primary"
+
+    class FastProvider(LLMProvider):
+        async def stream_chat(self, messages, model):
+            yield "backup"
+            yield usage_event(input_tokens=3, output_tokens=1)
+
+    service = build_service(
+        SlowProvider(), backups={"gpt-5.2-pro": ["claude-haiku-4-5"]}
+    )
+    service.providers = {"openai": SlowProvider(), "claude": FastProvider()}
+
+    chunks = [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], "gpt-5.2-pro"
+        )
+    ]
+
+    assert "backup" in chunks
+    assert list(service.router.breaker("openai")._outcomes) == []
+    assert list(service.router.breaker("claude")._outcomes) == [False]
+    assert "gpt-5.2-pro" not in service.hedging._samples
+    assert service.hedging._samples["claude-haiku-4-5"][0] < 0.05
+    assert (
+        service.metrics.get(
+            "llm_output_tokens_total", provider="claude", model="claude-haiku-4-5"
+        )
+        == 1
+    )
+    assert service.metrics.get("llm_output_tokens_total", provider="openai") == 0
@@ -0,0 +1,125 @@
+"""プロバイダー向けHTTP接続プールのテスト"""
+
+from unittest.mock import AsyncMock, patch
+
+import anthropic
+import openai
+import pytest
+
+from app.services.claude_provider import ClaudeProvider
+from app.services.google_provider import GoogleProvider
+from app.services.http_transport import ProviderTransport
+from app.services.llm_service import LLMService
+from app.services.openai_provider import OpenAIProvider
+
+
+def build_transport(**kwargs) -> ProviderTransport:
+    options = {
+        "max_connections": 7,
+        "max_keepalive_connections": 3,
+        "keepalive_expiry": 15.0,
+        "connect_timeout": 2.0,
+        "read_timeout": 30.0,
+        "http2": False,
+    }
+    options.update(kwargs)
+    return ProviderTransport(**options)
+
+
+@pytest.mark.parametrize(
+    "client_class", [openai.DefaultAsyncHttpxClient, anthropic.DefaultAsyncHttpxClient]
+)
+def test_create_client_applies_timeouts(client_class):
+    client = build_transport().create_client(client_class, "openai")
+
+    assert client.timeout.connect == 2.0
+    assert client.timeout.read == 30.0
+
+
+def test_http2_falls_back_when_h2_is_missing():
+    with patch("app.services.http_transport.http2_available", return_value=False):
+        assert build_transport(http2=True).http2 is False
+    with patch("app.services.http_transport.http2_available", return_value=True):
+        assert build_transport(http2=True).http2 is True
+
+
+def test_http2_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("PROVIDER_HTTP2", raising=False)
+
+    with patch("app.services.http_transport.http2_available", return_value=True):
+        assert ProviderTransport().http2 is False
+
+
+def test_transport_reads_settings_from_env(monkeypatch):
+    monkeypatch.setenv("PROVIDER_HTTP_MAX_CONNECTIONS", "11")
+    monkeypatch.setenv("PROVIDER_HTTP_CONNECT_TIMEOUT", "1.5")
+    monkeypatch.setenv("PROVIDER_HTTP2", "false")
+
+    transport = ProviderTransport()
+
+    assert transport.max_connections == 11
+    assert transport.connect_timeout == 1.5
+    assert transport.http2 is False
+
+
+@pytest.mark.parametrize(
+    "provider_class", [OpenAIProvider, ClaudeProvider, GoogleProvider]
+)
+def test_providers_use_injected_http_client(provider_class):
+    transport = build_transport()
+
+    provider = provider_class(api_key="test-key", transport=transport)
+
+    assert provider.http_client is not None
+    assert provider.client.timeout == provider.http_client.timeout
+    assert provider.base_url == str(provider.client.base_url)
+
+
+def test_providers_without_transport_keep_sdk_defaults():
+    provider = OpenAIProvider(api_key="test-key")
+
+    assert provider.http_client is None
+
+
+def test_llm_service_shares_one_transport(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-openai-key")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-anthropic-key")
+    transport = build_transport()
+
+    service = LLMService(transport=transport)
+
+    assert service.transport is transport
+    assert all(p.http_client is not None for p in service.providers.values())
+
+
+@pytest.mark.asyncio
+async def test_warm_up_opens_connections_and_ignores_errors():
+    client = AsyncMock()
+    client.head.side_effect = [None, OSError("connection refused")]
+
+    with patch("app.services.http_transport.logger") as mock_logger:
+        await build_transport().warm_up(client, "https://api.example.com/", 2)
+
+    assert client.head.await_count == 2
+    mock_logger.warning.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_uses_single_connection_with_http2():
+    client = AsyncMock()
+    with patch("app.services.http_transport.http2_available", return_value=True):
+        transport = build_transport(http2=True)
+
+    await transport.warm_up(client, "https://api.example.com/", 4)
+
+    assert client.head.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_aclose_closes_created_clients():
+    transport = build_transport()
+    client = transport.create_client(openai.DefaultAsyncHttpxClient, "openai")
+
+    await transport.aclose()
+
+    assert client.is_closed
@@ -4,12 +4,16 @@
 要件: 1.1, 1.2, 1.3, 1.4, 1.5
 """
 
+import asyncio
+import contextlib
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
+from app.repositories.conversation_history_cache import ConversationHistoryCache
+from app.services.llm_service import LLMService
 from main import app
 
 
@@ -29,7 +33,7 @@ def mock_llm_service():
 @pytest.fixture
 def mock_message_repository():
     """メッセージリポジトリのモックを作成"""
-    with patch("main.message_repository") as mock:
+    with patch("main.message_repository", new_callable=AsyncMock) as mock:
         yield mock
 
 
@@ -52,7 +56,10 @@ class TestChatIntegration:
 
         mock_llm_service.is_model_available.return_value = True
         mock_llm_service.stream_chat.return_value = mock_stream()
-        mock_message_repository.save_message.return_value = MagicMock(id=1)
+        mock_message_repository.save_turn.return_value = (
+            MagicMock(id=1),
+            MagicMock(id=2),
+        )
 
         # チャットリクエストを送信
         response = client.post(
@@ -75,20 +82,10 @@ class TestChatIntegration:
         assert '"content":"Hello"' in content or '"content": "Hello"' in content
         assert '"done":true' in content or '"done": true' in content
 
-        # メッセージが保存されたことを確認
-        assert mock_message_repository.save_message.call_count == 2
-
-        # ユーザーメッセージの保存を確認
-        user_call = mock_message_repository.save_message.call_args_list[0]
-        assert user_call[0][0] == "user"
-        assert user_call[0][1] == "Hello"
-        assert user_call[0][2] == "gpt-5.2"
-
-        # アシスタントメッセージの保存を確認
-        assistant_call = mock_message_repository.save_message.call_args_list[1]
-        assert assistant_call[0][0] == "assistant"
-        assert assistant_call[0][1] == "Hello World!"
-        assert assistant_call[0][2] == "gpt-5.2"
+        # 1往復分のメッセージが1回で保存されたことを確認
+        mock_message_repository.save_turn.assert_called_once_with(
+            "Hello", "Hello World!", "gpt-5.2", "test-conversation", truncated=False
+        )
 
     def test_streaming_response_format(
         self, client, mock_llm_service, mock_message_repository
@@ -106,7 +103,10 @@ class TestChatIntegration:
 
         mock_llm_service.is_model_available.return_value = True
         mock_llm_service.stream_chat.return_value = mock_stream()
-        mock_message_repository.save_message.return_value = MagicMock(id=1)
+        mock_message_repository.save_turn.return_value = (
+            MagicMock(id=1),
+            MagicMock(id=2),
+        )
 
         # チャットリクエストを送信
         response = client.post(
@@ -206,7 +206,10 @@ class TestChatIntegration:
 
         mock_llm_service.is_model_available.return_value = True
         mock_llm_service.stream_chat.return_value = mock_stream()
-        mock_message_repository.save_message.return_value = MagicMock(id=1)
+        mock_message_repository.save_turn.return_value = (
+            MagicMock(id=1),
+            MagicMock(id=2),
+        )
 
         # 会話履歴を含むリクエスト
         response = client.post(
@@ -238,6 +241,184 @@ class TestChatIntegration:
         assert messages[2]["role"] == "user"
         assert messages[2]["content"] == "Follow-up question"
 
+    def test_chat_without_history_uses_server_side_history(
+        self, client, mock_llm_service, mock_message_repository
+    ):
+        """
+        historyを省略した場合、保存済みの履歴からプロンプトを組み立て、
+        2回目以降はキャッシュを使うことを検証
+        """
+
+        async def mock_stream(reply):
+            yield reply
+
+        mock_llm_service.is_model_available.return_value = True
+        mock_llm_service.stream_chat.side_effect = [
+            mock_stream("First response"),
+            mock_stream("Second response"),
+        ]
+        mock_message_repository.get_conversation_history.return_value = [
+            {"role": "user", "content": "Stored message"},
+            {"role": "assistant", "content": "Stored response"},
+        ]
+
+        with patch("main.history_cache", ConversationHistoryCache()):
+            for message in ("First question", "Second question"):
+                response = client.post(
+                    "/api/chat",
+                    json={
+                        "message": message,
+                        "model": "gpt-5.2",
+                        "conversation_id": "test-conversation",
+                    },
+                )
+                assert response.status_code == 200
+
+        # DBからの読み込みは初回のみ
+        mock_message_repository.get_conversation_history.assert_awaited_once_with(
+            "test-conversation"
+        )
+        second_messages = mock_llm_service.stream_chat.call_args_list[1][0][0]
+        assert [m["content"] for m in second_messages] == [
+            "Stored message",
+            "Stored response",
+            "First question",
+            "First response",
+            "Second question",
+        ]
+
+    def test_failed_write_behind_invalidates_history_cache(
+        self, client, mock_llm_service, mock_message_repository
+    ):
+        """ライトビハインドの書き込みに失敗した会話はキャッシュした履歴を破棄する"""
+
+        async def mock_stream():
+            yield "Response"
+
+        class FailingWriter:
+            async def save_turn(self, *args, **kwargs):
+                future = asyncio.get_running_loop().create_future()
+                future.set_exception(RuntimeError("Database write error"))
+                return future
+
+            async def flush(self, conversation_id=None):
+                pass
+
+        mock_llm_service.is_model_available.return_value = True
+        mock_llm_service.stream_chat.return_value = mock_stream()
+        mock_message_repository.get_conversation_history.return_value = []
+        cache = ConversationHistoryCache()
+
+        with (
+            patch("main.history_cache", cache),
+            patch("main.message_writer", FailingWriter()),
+        ):
+            response = client.post(
+                "/api/chat",
+                json={
+                    "message": "Question",
+                    "model": "gpt-5.2",
+                    "conversation_id": "test-conversation",
+                },
+            )
+
+        assert response.status_code == 200
+        assert cache.get("test-conversation") is None
+
+    def test_cancelled_save_invalidates_history_cache(
+        self, client, mock_llm_service, mock_message_repository
+    ):
+        """保存中にキャンセルされた会話はキャッシュした履歴を破棄する"""
+
+        async def mock_stream():
+            yield "Response"
+
+        mock_llm_service.is_model_available.return_value = True
+        mock_llm_service.stream_chat.return_value = mock_stream()
+        mock_message_repository.save_turn.side_effect = asyncio.CancelledError()
+        cache = ConversationHistoryCache()
+        cache.put("test-conversation", [])
+
+        with (
+            patch("main.history_cache", cache),
+            contextlib.suppress(asyncio.CancelledError),
+        ):
+            client.post(
+                "/api/chat",
+                json={
+                    "message": "Question",
+                    "model": "gpt-5.2",
+                    "conversation_id": "test-conversation",
+                    "history": [],
+                },
+            )
+
+        assert cache.get("test-conversation") is None
+
+    @pytest.mark.asyncio
+    async def test_history_read_racing_a_save_is_not_cached(
+        self, mock_message_repository
+    ):
+        """DBの読み込み中に保存されたターンが欠けた履歴をキャッシュしない"""
+        import main
+
+        read_started = asyncio.Event()
+        release_read = asyncio.Event()
+
+        async def slow_history(conversation_id):
+            read_started.set()
+            await release_read.wait()
+            return []
+
+        mock_message_repository.get_conversation_history.side_effect = slow_history
+        cache = ConversationHistoryCache()
+
+        with (
+            patch("main.history_cache", cache),
+            patch("main.message_writer", None),
+        ):
+            loading = asyncio.create_task(main.load_history("test-conversation"))
+            await read_started.wait()
+            cache.append_turn("test-conversation", "Question", "Answer")
+            release_read.set()
+            assert await loading == []
+
+        assert cache.get("test-conversation") is None
+
+    def test_chat_uses_summary_and_schedules_update(
+        self, client, mock_llm_service, mock_message_repository
+    ):
+        """要約が有効な場合、要約入りの履歴で呼び出し、保存後に要約更新を予約する"""
+
+        async def mock_stream():
+            yield "Response"
+
+        stored = [{"role": "user", "content": f"m{i}"} for i in range(4)]
+        summarized = [{"role": "system", "content": "summary"}, stored[-1]]
+        mock_llm_service.is_model_available.return_value = True
+        mock_llm_service.stream_chat.return_value = mock_stream()
+        mock_message_repository.get_conversation_history.return_value = stored
+        mock_summarizer = MagicMock()
+        mock_summarizer.build_messages = AsyncMock(return_value=summarized)
+
+        with (
+            patch("main.history_cache", ConversationHistoryCache()),
+            patch("main.summarizer", mock_summarizer),
+        ):
+            response = client.post(
+                "/api/chat",
+                json={
+                    "message": "Question",
+                    "model": "gpt-5.2",
+                    "conversation_id": "test-conversation",
+                },
+            )
+
+        assert response.status_code == 200
+        messages = mock_llm_service.stream_chat.call_args[0][0]
+        assert messages == [*summarized, {"role": "user", "content": "Question"}]
+        mock_summarizer.schedule.assert_called_once_with("test-conversation", 6)
+
 
 class TestModelsEndpoint:
     """モデルエンドポイントの統合テスト"""
@@ -253,7 +434,9 @@ class TestModelsEndpoint:
                 "ANTHROPIC_API_KEY": "test-anthropic-key",
             },
         ):
-            response = client.get("/api/models")
+            # APIキーの設定はLLMServiceの作成時に読み込まれる
+            with patch("main.llm_service", LLMService()):
+                response = client.get("/api/models")
 
             assert response.status_code == 200
             models = response.json()
@@ -276,7 +459,9 @@ class TestModelsEndpoint:
         with patch.dict(
             "os.environ", {"OPENAI_API_KEY": "test-openai-key"}, clear=True
         ):
-            response = client.get("/api/models")
+            # APIキーの設定はLLMServiceの作成時に読み込まれる
+            with patch("main.llm_service", LLMService()):
+                response = client.get("/api/models")
 
             assert response.status_code == 200
             models = response.json()
@@ -294,7 +479,9 @@ class TestModelsEndpoint:
         with patch.dict(
             "os.environ", {"GEMINI_API_KEY": "test-gemini-key"}, clear=True
         ):
-            response = client.get("/api/models")
+            # APIキーの設定はLLMServiceの作成時に読み込まれる
+            with patch("main.llm_service", LLMService()):
+                response = client.get("/api/models")
 
             assert response.status_code == 200
             models = response.json()
@@ -317,7 +504,9 @@ class TestModelsEndpoint:
             },
             clear=True,
         ):
-            response = client.get("/api/models")
+            # APIキーの設定はLLMServiceの作成時に読み込まれる
+            with patch("main.llm_service", LLMService()):
+                response = client.get("/api/models")
 
             assert response.status_code == 200
             models = response.json()
@@ -352,7 +541,10 @@ class TestDatabaseIntegration:
 
         mock_llm_service.is_model_available.return_value = True
         mock_llm_service.stream_chat.return_value = mock_stream()
-        mock_message_repository.save_message.return_value = MagicMock(id=1)
+        mock_message_repository.save_turn.return_value = (
+            MagicMock(id=1),
+            MagicMock(id=2),
+        )
 
         # チャットリクエストを送信
         response = client.post(
@@ -367,17 +559,11 @@ class TestDatabaseIntegration:
 
         assert response.status_code == 200
 
-        # メッセージが保存されたことを確認
-        assert mock_message_repository.save_message.call_count == 2
-
-        # ユーザーメッセージの保存を確認
-        user_call = mock_message_repository.save_message.call_args_list[0]
-        assert user_call[0][0] == "user"
-        assert user_call[0][1] == "Test message"
-        assert user_call[0][2] == "gpt-5.2"
-
-        # アシスタントメッセージの保存を確認
-        assistant_call = mock_message_repository.save_message.call_args_list[1]
-        assert assistant_call[0][0] == "assistant"
-        assert assistant_call[0][1] == "Test response"
-        assert assistant_call[0][2] == "gpt-5.2"
+        # 1往復分のメッセージが1回で保存されたことを確認
+        mock_message_repository.save_turn.assert_called_once_with(
+            "Test message",
+            "Test response",
+            "gpt-5.2",
+            "test-conversation",
+            truncated=False,
+        )
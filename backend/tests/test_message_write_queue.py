@@ -0,0 +1,148 @@
+"""ライトビハインドキューのテスト"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+
+from app.repositories.async_message_repository import AsyncMessageRepository
+from app.repositories.message_write_queue import MessageWriteQueue
+
+
+@pytest_asyncio.fixture
+async def repo(tmp_path):
+    repository = AsyncMessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+    yield repository
+    await repository.close()
+
+
+def spy_save_messages(repo):
+    """save_messagesの呼び出しごとのメッセージ数を記録する。"""
+    batch_sizes = []
+    original = repo.save_messages
+
+    async def recording_save_messages(entries):
+        batch_sizes.append(len(entries))
+        return await original(entries)
+
+    repo.save_messages = recording_save_messages
+    return batch_sizes
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_are_committed_in_one_batch(repo):
+    batch_sizes = spy_save_messages(repo)
+    queue = MessageWriteQueue(repo, flush_interval_ms=50, max_batch_size=100)
+    await queue.start()
+
+    futures = await asyncio.gather(
+        *(queue.save_turn(f"q{i}", f"a{i}", "gpt-5.2", f"conv-{i}") for i in range(10))
+    )
+    await asyncio.gather(*futures)
+    await queue.stop()
+
+    assert batch_sizes == [20]
+    summaries = await repo.get_conversation_summaries()
+    assert len(summaries) == 10
+    assert all(summary["message_count"] == 2 for summary in summaries)
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size_splits_batches(repo):
+    batch_sizes = spy_save_messages(repo)
+    queue = MessageWriteQueue(repo, flush_interval_ms=50, max_batch_size=4)
+    await queue.start()
+
+    for i in range(5):
+        await queue.save_turn(f"q{i}", f"a{i}", "gpt-5.2", "conv-1")
+    await queue.flush()
+    await queue.stop()
+
+    assert sum(batch_sizes) == 10
+    assert max(batch_sizes) <= 4
+
+
+@pytest.mark.asyncio
+async def test_flush_on_read_commits_without_waiting_for_interval(repo):
+    queue = MessageWriteQueue(repo, flush_interval_ms=60_000)
+    await queue.start()
+
+    await queue.save_turn("question", "answer", "gpt-5.2", "conv-1")
+    await asyncio.wait_for(queue.flush("conv-1"), timeout=5)
+
+    messages = await repo.get_messages_by_conversation("conv-1")
+    assert [message.content for message in messages] == ["question", "answer"]
+    assert messages[1].timestamp > messages[0].timestamp
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending_writes(repo):
+    queue = MessageWriteQueue(repo, flush_interval_ms=60_000)
+    await queue.start()
+
+    await queue.save_message("user", "hello", "gpt-5.2", "conv-1")
+    await asyncio.wait_for(queue.stop(), timeout=5)
+
+    messages = await repo.get_messages_by_conversation("conv-1")
+    assert [message.content for message in messages] == ["hello"]
+
+
+@pytest.mark.asyncio
+async def test_database_error_is_logged_and_set_on_future(repo):
+    async def failing_save_messages(entries):
+        raise RuntimeError("Database write error")
+
+    repo.save_messages = failing_save_messages
+    queue = MessageWriteQueue(repo, flush_interval_ms=10)
+    await queue.start()
+
+    with patch("app.repositories.message_write_queue.logger") as mock_logger:
+        future = await queue.save_turn("question", "answer", "gpt-5.2", "conv-1")
+        with pytest.raises(RuntimeError, match="Database write error"):
+            await asyncio.wait_for(future, timeout=5)
+        # 読み込み前のflushは失敗した要求があっても例外を送出しない
+        await queue.flush("conv-1")
+
+    mock_logger.error.assert_called_once()
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_per_write(repo):
+    """1件の不正な要求でバッチ内の他の会話の書き込みを失わないこと"""
+    original = repo.save_messages
+
+    async def save_messages_rejecting_bad(entries):
+        if any(entry["conversation_id"] == "conv-bad" for entry in entries):
+            raise RuntimeError("Database write error")
+        return await original(entries)
+
+    repo.save_messages = save_messages_rejecting_bad
+    queue = MessageWriteQueue(repo, flush_interval_ms=50)
+    await queue.start()
+
+    futures = await asyncio.gather(
+        queue.save_turn("q1", "a1", "gpt-5.2", "conv-1"),
+        queue.save_turn("bad", "bad", "gpt-5.2", "conv-bad"),
+        queue.save_turn("q2", "a2", "gpt-5.2", "conv-2"),
+    )
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    await queue.stop()
+
+    assert results[0] is None
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] is None
+    for conversation_id in ("conv-1", "conv-2"):
+        messages = await repo.get_messages_by_conversation(conversation_id)
+        assert len(messages) == 2
+    assert await repo.get_messages_by_conversation("conv-bad") == []
+
+
+@pytest.mark.asyncio
+async def test_enqueue_before_start_raises(repo):
+    queue = MessageWriteQueue(repo)
+
+    with pytest.raises(RuntimeError, match="not started"):
+        await queue.save_message("user", "hello", "gpt-5.2", "conv-1")
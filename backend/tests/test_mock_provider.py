@@ -0,0 +1,176 @@
+"""負荷試験用のモックプロバイダーのテスト"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.repositories.async_message_repository import AsyncMessageRepository
+from app.repositories.conversation_history_cache import ConversationHistoryCache
+from app.services.llm_service import LLMService
+from app.services.mock_provider import MockAPIError, MockProvider
+from app.services.retry import RATE_LIMIT, SERVER, RetryPolicy, classify_error
+from app.services.stream_events import StreamEvent
+from main import app
+
+MESSAGES = [{"role": "user", "content": "こんにちは"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def collect(provider: MockProvider) -> list:
+    return [chunk async for chunk in provider.stream_chat(MESSAGES, "mock-llm")]
+
+
+def fast_provider(**options) -> MockProvider:
+    settings = {"ttft": 0, "token_latency": 0, "output_tokens": 5}
+    settings.update(options)
+    return MockProvider(**settings)
+
+
+@pytest.mark.asyncio
+async def test_streams_configured_number_of_chunks_and_usage():
+    chunks = await collect(fast_provider())
+
+    text, usage = chunks[:-1], chunks[-1]
+    assert len(text) == 5
+    assert all(isinstance(chunk, str) for chunk in text)
+    assert isinstance(usage, StreamEvent)
+    assert usage.data["output_tokens"] == 5
+    assert usage.data["input_tokens"] > 0
+
+
+@pytest.mark.asyncio
+async def test_same_seed_gives_same_response():
+    first = await collect(fast_provider(seed=42))
+    second = await collect(fast_provider(seed=42))
+
+    assert first[:-1] == second[:-1]
+
+
+@pytest.mark.asyncio
+async def test_waits_for_time_to_first_token():
+    provider = fast_provider(ttft=0.05, output_tokens=1)
+    loop = asyncio.get_running_loop()
+
+    started = loop.time()
+    await collect(provider)
+
+    assert loop.time() - started >= 0.04
+
+
+@pytest.mark.parametrize("distribution", ["fixed", "uniform", "exponential"])
+def test_latency_samples_are_non_negative(distribution):
+    provider = fast_provider(latency_distribution=distribution)
+
+    samples = [provider._sample(0.01) for _ in range(200)]
+
+    assert all(sample >= 0 for sample in samples)
+    if distribution == "fixed":
+        assert set(samples) == {0.01}
+    if distribution == "uniform":
+        assert max(samples) <= 0.02
+
+
+def test_unknown_distribution_is_rejected():
+    with pytest.raises(ValueError):
+        MockProvider(latency_distribution="normal")
+
+
+@pytest.mark.asyncio
+async def test_injected_errors_are_classified_as_server_errors():
+    provider = fast_provider(error_rate=1.0)
+
+    with pytest.raises(MockAPIError) as excinfo:
+        await collect(provider)
+
+    assert excinfo.value.status_code == 500
+    assert classify_error(excinfo.value) == SERVER
+
+
+@pytest.mark.asyncio
+async def test_rpm_limit_returns_rate_limit_errors_until_window_passes():
+    clock = FakeClock()
+    provider = fast_provider(rpm=2, clock=clock)
+
+    await collect(provider)
+    await collect(provider)
+    with pytest.raises(MockAPIError) as excinfo:
+        await collect(provider)
+    assert excinfo.value.status_code == 429
+    assert classify_error(excinfo.value) == RATE_LIMIT
+
+    clock.now = 60.0
+    assert len(await collect(provider)) == 6
+
+
+@pytest.mark.asyncio
+async def test_service_retries_injected_errors(monkeypatch):
+    monkeypatch.setenv("MOCK_LLM", "true")
+    service = LLMService(
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001)
+    )
+    provider = fast_provider(error_rate=0.5, seed=1)
+    service.providers.register("mock", provider)
+
+    chunks = [chunk async for chunk in service.stream_chat(MESSAGES, "mock-llm")]
+
+    assert [c for c in chunks if isinstance(c, str)]
+    assert service.metrics.get("llm_retries_total", provider="mock") >= 1
+
+
+def test_mock_models_are_enabled_by_env(monkeypatch):
+    monkeypatch.setenv("MOCK_LLM", "false")
+    assert not LLMService().is_model_available("mock-llm")
+
+    monkeypatch.setenv("MOCK_LLM", "true")
+    assert LLMService().is_model_available("mock-llm")
+
+
+def test_chat_streams_and_persists_mock_response(tmp_path, monkeypatch):
+    """SSEと永続化を含む/api/chatの経路をモックで通せること"""
+    monkeypatch.setenv("MOCK_LLM", "true")
+    monkeypatch.setenv("MOCK_LLM_TTFT", "0")
+    monkeypatch.setenv("MOCK_LLM_TOKEN_LATENCY", "0")
+    monkeypatch.setenv("MOCK_LLM_OUTPUT_TOKENS", "8")
+    repository = AsyncMessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+
+    with (
+        patch("main.llm_service", LLMService()),
+        patch("main.message_repository", repository),
+        patch("main.message_writer", None),
+        patch("main.history_cache", ConversationHistoryCache()),
+        patch("main.response_cache", None),
+    ):
+        response = TestClient(app).post(
+            "/api/chat",
+            json={
+                "message": "負荷試験",
+                "model": "mock-llm",
+                "conversation_id": "mock-conversation",
+                "history": [],
+            },
+        )
+        messages = asyncio.run(
+            repository.get_messages_by_conversation("mock-conversation")
+        )
+
+    frames = [
+        json.loads(line[6:])
+        for line in response.text.split("\n")
+        if line.startswith("data: ") and line != "data: [DONE]"
+    ]
+    content = "".join(frame["content"] for frame in frames if "content" in frame)
+    assert response.status_code == 200
+    assert any("usage" in frame for frame in frames)
+    assert [message.role for message in messages] == ["user", "assistant"]
+    assert messages[1].content == content
+    assert messages[1].model == "mock-llm"
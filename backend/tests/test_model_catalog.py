@@ -0,0 +1,158 @@
+"""モデルカタログのテスト"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.llm_service import LLMService
+from app.services.model_catalog import ModelCatalog, ModelSpec, load_catalog
+from main import app
+
+CLAUDE_CATALOG = """
+[models."claude-haiku-4-5"]
+provider = "claude"
+name = "Claude Haiku 4.5"
+context_window = 200000
+max_output_tokens = 123
+"""
+
+CUSTOM_CATALOG = """
+[models."local-small"]
+provider = "openai"
+name = "Local Small"
+context_window = 8192
+max_output_tokens = 1024
+"""
+
+
+@pytest.fixture
+def client():
+    """テストクライアントを作成"""
+    return TestClient(app)
+
+
+def test_default_catalog_routes_every_model():
+    catalog = load_catalog()
+
+    assert dict(catalog.model_mapping) == {
+        "gpt-5.2": "openai",
+        "gpt-5.2-pro": "openai",
+        "gemini-3-pro-preview": "google",
+        "gemini-3-flash-preview": "google",
+        "claude-opus-4-5": "claude",
+        "claude-sonnet-4-5": "claude",
+        "claude-haiku-4-5": "claude",
+        "mock-llm": "mock",
+    }
+
+
+def test_input_budgets_come_from_context_window_and_output_tokens():
+    budgets = load_catalog().input_token_budgets()
+
+    assert budgets["gpt-5.2"] == 400_000 - 128_000
+    assert budgets["gemini-3-pro-preview"] == 1_048_576
+    assert budgets["claude-sonnet-4-5"] == 200_000 - 4096
+
+
+def test_catalog_index_is_immutable():
+    catalog = load_catalog()
+
+    with pytest.raises(TypeError):
+        catalog.model_mapping["new-model"] = "openai"
+
+
+def test_duplicate_model_is_rejected():
+    spec = ModelSpec("m", "openai", "M", "", 1000, 100)
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        ModelCatalog([spec, spec])
+
+
+def test_missing_field_is_rejected(tmp_path):
+    path = tmp_path / "models.toml"
+    path.write_text('[models."m"]\nprovider = "openai"\nname = "M"\n')
+
+    with pytest.raises(ValueError, match="context_window"):
+        load_catalog(path)
+
+
+def test_unknown_field_is_rejected(tmp_path):
+    path = tmp_path / "models.toml"
+    path.write_text(CUSTOM_CATALOG + "max_tokens = 10\n")
+
+    with pytest.raises(ValueError, match="max_tokens"):
+        load_catalog(path)
+
+
+def test_custom_catalog_drives_routing_and_budgets(tmp_path, monkeypatch):
+    path = tmp_path / "models.toml"
+    path.write_text(CUSTOM_CATALOG)
+    monkeypatch.setenv("MODEL_CATALOG", str(path))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+    service = LLMService(catalog=load_catalog())
+
+    assert service.is_model_available("local-small")
+    assert not service.is_model_available("gpt-5.2")
+    assert service.context_window.budget_for("local-small") == int((8192 - 1024) * 0.9)
+
+
+def test_models_endpoint_returns_catalog_fields_with_etag(client):
+    with (
+        patch.dict("os.environ", {"ANTHROPIC_API_KEY": "test-key"}, clear=True),
+        patch("main.llm_service", LLMService()),
+    ):
+        response = client.get("/api/models")
+
+    assert response.status_code == 200
+    assert response.headers["etag"]
+    models = response.json()
+    assert [model["id"] for model in models] == [
+        "claude-opus-4-5",
+        "claude-sonnet-4-5",
+        "claude-haiku-4-5",
+    ]
+    assert models[1]["context_window"] == 200_000
+    assert models[1]["max_output_tokens"] == 4096
+    assert models[1]["input_price"] == 3.0
+
+
+def test_models_endpoint_returns_304_for_matching_etag(client):
+    with (
+        patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"}, clear=True),
+        patch("main.llm_service", LLMService()),
+    ):
+        first = client.get("/api/models")
+        etag = first.headers["etag"]
+        cached = client.get("/api/models", headers={"If-None-Match": etag})
+        weak = client.get("/api/models", headers={"If-None-Match": f"W/{etag}"})
+        stale = client.get("/api/models", headers={"If-None-Match": '"stale"'})
+
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert weak.status_code == 304
+    assert stale.status_code == 200
+    assert stale.content == first.content
+
+
+@pytest.mark.asyncio
+async def test_claude_max_tokens_come_from_the_service_catalog(tmp_path, monkeypatch):
+    path = tmp_path / "models.toml"
+    path.write_text(CLAUDE_CATALOG)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    service = LLMService(catalog=load_catalog(path))
+    provider = service.providers["claude"]
+
+    provider.client = MagicMock()
+    # 送信するパラメーターだけを確認する
+    provider.client.messages.stream.side_effect = RuntimeError("not sent")
+
+    with pytest.raises(RuntimeError, match="not sent"):
+        async for _ in provider.stream_chat(
+            [{"role": "user", "content": "hi"}], "claude-haiku-4-5"
+        ):
+            pass
+
+    assert provider.client.messages.stream.call_args.kwargs["max_tokens"] == 123
@@ -0,0 +1,269 @@
+"""フォールバックチェーンとサーキットブレーカーのテスト"""
+
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import anthropic
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+
+from app.services.admission import AdmissionController  # noqa: E402
+from app.services.circuit_breaker import (  # noqa: E402
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from app.services.llm_provider import LLMProvider  # noqa: E402
+from app.services.llm_service import LLMService  # noqa: E402
+from app.services.metrics import MetricsRegistry  # noqa: E402
+from app.services.model_router import ModelRouter, parse_fallbacks  # noqa: E402
+from app.services.rate_limiter import RateLimiter  # noqa: E402
+from app.services.retry import RetryPolicy  # noqa: E402
+from app.services.stream_events import model_event  # noqa: E402
+from main import app  # noqa: E402
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/messages")
+
+
+def status_error(error_class: type, status_code: int):
+    response = httpx.Response(status_code, request=REQUEST)
+    return error_class("error", response=response, body=None)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(
+        "claude",
+        failure_rate=0.5,
+        slow_call_seconds=2,
+        window_size=4,
+        min_calls=4,
+        open_seconds=10,
+        clock=clock,
+    )
+
+
+def test_breaker_opens_when_failure_rate_is_reached():
+    breaker = make_breaker(FakeClock())
+
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_success(0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_counts_slow_calls_as_failures():
+    breaker = make_breaker(FakeClock())
+
+    for latency in (3.0, 0.1, 5.0, 0.1):
+        breaker.record_success(latency)
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_breaker_allows_a_single_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+
+    clock.now += 10
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_and_lost_probe_is_replaced():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 10
+    assert breaker.allow_request()
+    # プローブの結果が記録されないまま時間が経過した場合は次のプローブを許可する
+    clock.now += 10
+    assert breaker.allow_request()
+
+
+def test_parse_fallbacks():
+    assert parse_fallbacks(
+        "claude-sonnet-4-5=gpt-5.2>gemini-3-flash-preview, gpt-5.2=claude-sonnet-4-5"
+    ) == {
+        "claude-sonnet-4-5": ["gpt-5.2", "gemini-3-flash-preview"],
+        "gpt-5.2": ["claude-sonnet-4-5"],
+    }
+    assert parse_fallbacks("") == {}
+    with pytest.raises(ValueError):
+        parse_fallbacks("claude-sonnet-4-5")
+
+
+def test_candidates_start_with_requested_model_without_duplicates():
+    router = ModelRouter({"claude-sonnet-4-5": ["gpt-5.2", "claude-sonnet-4-5"]})
+
+    assert router.candidates("claude-sonnet-4-5") == ["claude-sonnet-4-5", "gpt-5.2"]
+    assert router.candidates("gpt-5.2") == ["gpt-5.2"]
+
+
+class ScriptedProvider(LLMProvider):
+    """例外を送出するか、固定のチャンクを返すプロバイダー"""
+
+    def __init__(self, *items):
+        self.items = items
+        self.models = []
+
+    async def stream_chat(self, messages, model):
+        self.models.append(model)
+        for item in self.items:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+def build_service(providers: dict[str, LLMProvider], clock=None) -> LLMService:
+    clock = clock or FakeClock()
+    service = LLMService(
+        admission=AdmissionController(model_max_concurrency={}),
+        rate_limiter=RateLimiter(
+            provider_rpm={}, provider_tpm={}, model_rpm={}, model_tpm={}
+        ),
+        retry_policy=RetryPolicy(max_attempts=1),
+        metrics=MetricsRegistry(),
+        router=ModelRouter(
+            {"claude-sonnet-4-5": ["gpt-5.2", "gemini-3-flash-preview"]},
+            breaker_factory=lambda name: make_breaker(clock),
+        ),
+    )
+    service.providers = providers
+    return service
+
+
+async def collect(service: LLMService, model: str = "claude-sonnet-4-5") -> list:
+    return [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], model
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fails_over_to_next_model_before_first_token():
+    claude = ScriptedProvider(status_error(anthropic.InternalServerError, 503))
+    openai_provider = ScriptedProvider("from gpt")
+    service = build_service({"claude": claude, "openai": openai_provider})
+
+    chunks = await collect(service)
+
+    assert chunks == [model_event("gpt-5.2", "claude-sonnet-4-5", "server"), "from gpt"]
+    assert openai_provider.models == ["gpt-5.2"]
+    assert service.metrics.get("llm_failovers_total", fallback="gpt-5.2") == 1
+
+
+@pytest.mark.asyncio
+async def test_skips_provider_with_open_circuit():
+    claude = ScriptedProvider("from claude")
+    service = build_service({"claude": claude, "openai": ScriptedProvider("ok")})
+    breaker = service.router.breaker("claude")
+    for _ in range(4):
+        breaker.record_failure()
+
+    chunks = await collect(service)
+
+    assert chunks == [model_event("gpt-5.2", "claude-sonnet-4-5", "circuit_open"), "ok"]
+    assert claude.models == []
+
+
+@pytest.mark.asyncio
+async def test_failures_open_the_circuit_for_later_requests():
+    claude = ScriptedProvider(openai.APIConnectionError(request=REQUEST))
+    service = build_service({"claude": claude, "google": ScriptedProvider("ok")})
+
+    for _ in range(5):
+        await collect(service)
+
+    assert len(claude.models) == 4
+    assert service.router.breaker("claude").state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_does_not_fail_over_after_output_or_on_client_errors():
+    partial = ScriptedProvider(
+        "partial", status_error(anthropic.InternalServerError, 500)
+    )
+    service = build_service({"claude": partial, "openai": ScriptedProvider("ok")})
+    with pytest.raises(anthropic.InternalServerError):
+        await collect(service)
+
+    bad_request = ScriptedProvider(status_error(anthropic.BadRequestError, 400))
+    service = build_service({"claude": bad_request, "openai": ScriptedProvider("ok")})
+    with pytest.raises(anthropic.BadRequestError):
+        await collect(service)
+
+
+@pytest.mark.asyncio
+async def test_raises_when_every_candidate_is_unavailable():
+    error = status_error(anthropic.InternalServerError, 503)
+    service = build_service({"claude": ScriptedProvider(error)})
+    with pytest.raises(anthropic.InternalServerError):
+        await collect(service)
+
+    for _ in range(4):
+        service.router.breaker("claude").record_failure()
+    with pytest.raises(CircuitOpenError):
+        await collect(service)
+
+
+def test_chat_persists_the_model_that_answered():
+    async def stream():
+        yield model_event("gpt-5.2", "claude-sonnet-4-5", "server")
+        yield "answer"
+
+    llm = MagicMock()
+    llm.is_model_available.return_value = True
+    llm.stream_chat.return_value = stream()
+
+    with (
+        patch("main.llm_service", llm),
+        patch("main.message_repository", new_callable=AsyncMock) as repository,
+        patch("main.message_writer", None),
+    ):
+        response = TestClient(app).post(
+            "/api/chat",
+            json={
+                "message": "hi",
+                "model": "claude-sonnet-4-5",
+                "conversation_id": "failover-conversation",
+                "history": [],
+            },
+        )
+
+    assert '"model": "gpt-5.2"' in response.text
+    args = repository.save_turn.await_args.args
+    assert args[:3] == ("hi", "answer", "gpt-5.2")
@@ -4,11 +4,12 @@
 選択したモデルがそのままLLMサービスへ渡されることを検証する。
 """
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
+from app.services.llm_service import LLMService
 from main import app
 
 
@@ -28,8 +29,8 @@ def mock_llm_service():
 @pytest.fixture
 def mock_message_repository():
     """MessageRepositoryをモック"""
-    with patch("main.message_repository") as mock:
-        mock.save_message.return_value = MagicMock(id=1)
+    with patch("main.message_repository", new_callable=AsyncMock) as mock:
+        mock.save_turn.return_value = (MagicMock(id=1), MagicMock(id=2))
         yield mock
 
 
@@ -84,7 +85,9 @@ def test_models_endpoint_returns_openai_and_claude_ids(client):
             "ANTHROPIC_API_KEY": "test-anthropic-key",
         },
     ):
-        response = client.get("/api/models")
+        # APIキーの設定はLLMServiceの作成時に読み込まれる
+        with patch("main.llm_service", LLMService()):
+            response = client.get("/api/models")
         assert response.status_code == 200
 
         model_ids = [model["id"] for model in response.json()]
@@ -107,7 +110,9 @@ def test_models_endpoint_returns_google_ids_when_key_set(client):
         },
         clear=True,
     ):
-        response = client.get("/api/models")
+        # APIキーの設定はLLMServiceの作成時に読み込まれる
+        with patch("main.llm_service", LLMService()):
+            response = client.get("/api/models")
         assert response.status_code == 200
 
         model_ids = [model["id"] for model in response.json()]
@@ -0,0 +1,266 @@
+"""プロバイダーのプレフィックスキャッシュ対応のテスト"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.admission import AdmissionController
+from app.services.claude_provider import CACHE_CONTROL, ClaudeProvider
+from app.services.google_provider import GoogleProvider
+from app.services.llm_provider import LLMProvider, conversation_scope
+from app.services.llm_service import LLMService
+from app.services.metrics import MetricsRegistry
+from app.services.openai_provider import OpenAIProvider, prefix_cache_key
+from app.services.rate_limiter import RateLimiter
+from app.services.stream_events import usage_event
+from main import app
+
+CONVERSATION = [
+    {"role": "system", "content": "あなたは親切なアシスタントです"},
+    {"role": "user", "content": "こんにちは"},
+    {"role": "assistant", "content": "こんにちは！"},
+    {"role": "user", "content": "天気は？"},
+]
+
+
+class FakeStream:
+    """SDKのストリームの代替（イテレーション、text_stream、最終メッセージ）"""
+
+    def __init__(self, items, final_message=None):
+        self.items = items
+        self.final_message = final_message
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    @property
+    def text_stream(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.items:
+            yield item
+
+    async def get_final_message(self):
+        return self.final_message
+
+
+async def collect(stream) -> list:
+    return [item async for item in stream]
+
+
+def claude_provider(prompt_caching: bool) -> tuple[ClaudeProvider, FakeStream]:
+    usage = SimpleNamespace(
+        input_tokens=20,
+        output_tokens=5,
+        cache_read_input_tokens=1500,
+        cache_creation_input_tokens=30,
+    )
+    fake = FakeStream(["晴れ", "です"], SimpleNamespace(usage=usage))
+    provider = ClaudeProvider(api_key="test-key", prompt_caching=prompt_caching)
+    provider.client = MagicMock()
+    provider.client.messages.stream.return_value = fake
+    return provider, fake
+
+
+@pytest.mark.asyncio
+async def test_claude_marks_system_prompt_and_last_message_as_cacheable():
+    provider, _ = claude_provider(prompt_caching=True)
+
+    items = await collect(provider.stream_chat(CONVERSATION, "claude-haiku-4-5"))
+
+    params = provider.client.messages.stream.call_args.kwargs
+    assert params["system"] == [
+        {
+            "type": "text",
+            "text": "あなたは親切なアシスタントです",
+            "cache_control": CACHE_CONTROL,
+        }
+    ]
+    assert params["messages"][:2] == [
+        {"role": "user", "content": "こんにちは"},
+        {"role": "assistant", "content": "こんにちは！"},
+    ]
+    assert params["messages"][2] == {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "天気は？", "cache_control": CACHE_CONTROL}
+        ],
+    }
+    assert items == [
+        "晴れ",
+        "です",
+        usage_event(
+            input_tokens=1550,
+            output_tokens=5,
+            cached_tokens=1500,
+            cache_write_tokens=30,
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_claude_without_prompt_caching_sends_plain_messages():
+    provider, _ = claude_provider(prompt_caching=False)
+
+    await collect(provider.stream_chat(CONVERSATION, "claude-haiku-4-5"))
+
+    params = provider.client.messages.stream.call_args.kwargs
+    assert params["system"] == "あなたは親切なアシスタントです"
+    assert params["messages"][-1] == {"role": "user", "content": "天気は？"}
+
+
+def test_prefix_cache_key_is_stable_across_turns():
+    first_turn = CONVERSATION[:2]
+
+    assert prefix_cache_key(first_turn, "gpt-5.2", "conv-1") == prefix_cache_key(
+        CONVERSATION, "gpt-5.2", "conv-1"
+    )
+
+
+def test_prefix_cache_key_separates_model_scope_and_system_prompt():
+    key = prefix_cache_key(CONVERSATION, "gpt-5.2", "conv-1")
+    other_system = [
+        {"role": "system", "content": "英語で答えてください"},
+        *CONVERSATION[1:],
+    ]
+
+    assert key != prefix_cache_key(CONVERSATION, "gpt-5.2-pro", "conv-1")
+    assert key != prefix_cache_key(CONVERSATION, "gpt-5.2", "conv-2")
+    assert key != prefix_cache_key(other_system, "gpt-5.2", "conv-1")
+    assert prefix_cache_key(CONVERSATION, "gpt-5.2") != prefix_cache_key(
+        [{"role": "user", "content": "別の会話"}], "gpt-5.2"
+    )
+
+
+@pytest.mark.asyncio
+async def test_openai_sends_cache_key_and_reports_cached_tokens():
+    usage = SimpleNamespace(
+        input_tokens=2048,
+        output_tokens=12,
+        input_tokens_details=SimpleNamespace(cached_tokens=1024),
+    )
+    fake = FakeStream(
+        [
+            SimpleNamespace(type="response.output_text.delta", delta="晴れ"),
+            SimpleNamespace(
+                type="response.completed", response=SimpleNamespace(usage=usage)
+            ),
+        ]
+    )
+    provider = OpenAIProvider(api_key="test-key", prompt_caching=True)
+    provider.client = MagicMock()
+    provider.client.responses.stream.return_value = fake
+
+    token = conversation_scope.set("conv-1")
+    try:
+        items = await collect(provider.stream_chat(CONVERSATION, "gpt-5.2"))
+    finally:
+        conversation_scope.reset(token)
+
+    params = provider.client.responses.stream.call_args.kwargs
+    assert params["prompt_cache_key"] == prefix_cache_key(
+        CONVERSATION, "gpt-5.2", "conv-1"
+    )
+    assert [msg["content"] for msg in params["input"]] == [
+        msg["content"] for msg in CONVERSATION
+    ]
+    assert items == [
+        "晴れ",
+        usage_event(input_tokens=2048, output_tokens=12, cached_tokens=1024),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_google_requests_usage_and_reports_cached_tokens():
+    text_chunk = SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content="晴れ"))], usage=None
+    )
+    usage_chunk = SimpleNamespace(
+        choices=[],
+        usage=SimpleNamespace(
+            prompt_tokens=3000,
+            completion_tokens=8,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=2048),
+        ),
+    )
+    provider = GoogleProvider(api_key="test-key")
+    provider.client = MagicMock()
+    provider.client.chat.completions.create = AsyncMock(
+        return_value=FakeStream([text_chunk, usage_chunk])
+    )
+
+    items = await collect(provider.stream_chat(CONVERSATION, "gemini-3-flash-preview"))
+
+    params = provider.client.chat.completions.create.call_args.kwargs
+    assert params["stream_options"] == {"include_usage": True}
+    assert params["messages"] == CONVERSATION
+    assert items == [
+        "晴れ",
+        usage_event(input_tokens=3000, output_tokens=8, cached_tokens=2048),
+    ]
+
+
+class UsageProvider(LLMProvider):
+    async def stream_chat(self, messages, model):
+        yield "ok"
+        yield usage_event(input_tokens=100, output_tokens=3, cached_tokens=64)
+
+
+@pytest.mark.asyncio
+async def test_llm_service_counts_reported_tokens():
+    service = LLMService(
+        admission=AdmissionController(model_max_concurrency={}),
+        rate_limiter=RateLimiter(
+            provider_rpm={}, provider_tpm={}, model_rpm={}, model_tpm={}
+        ),
+        metrics=MetricsRegistry(),
+    )
+    service.providers = {"openai": UsageProvider()}
+
+    items = await collect(
+        service.stream_chat([{"role": "user", "content": "hi"}], "gpt-5.2")
+    )
+
+    assert items[0] == "ok"
+    assert service.metrics.get("llm_input_tokens_total", model="gpt-5.2") == 100
+    assert service.metrics.get("llm_cached_input_tokens_total", model="gpt-5.2") == 64
+    assert service.metrics.get("llm_output_tokens_total", model="gpt-5.2") == 3
+
+
+def test_chat_endpoint_scopes_provider_requests_to_conversation():
+    scopes = []
+
+    async def stream(messages, model):
+        scopes.append(conversation_scope.get())
+        yield "ok"
+
+    llm = MagicMock()
+    llm.is_model_available.return_value = True
+    llm.stream_chat.side_effect = stream
+
+    with (
+        patch("main.llm_service", llm),
+        patch("main.message_repository", new_callable=AsyncMock),
+        patch("main.message_writer", None),
+    ):
+        response = TestClient(app).post(
+            "/api/chat",
+            json={
+                "message": "こんにちは",
+                "model": "gpt-5.2",
+                "conversation_id": "conv-1",
+                "history": [],
+            },
+        )
+
+    assert response.status_code == 200
+    assert scopes == ["conv-1"]
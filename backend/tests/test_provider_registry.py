@@ -0,0 +1,159 @@
+"""プロバイダーの遅延読み込みのテスト"""
+
+import subprocess
+import sys
+import threading
+import types
+from pathlib import Path
+
+import pytest
+
+from app.services.admission import AdmissionController
+from app.services.http_transport import ProviderTransport
+from app.services.llm_provider import LLMProvider
+from app.services.llm_service import LLMService
+from app.services.provider_registry import ProviderRegistry
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FAKE_MODULE = "tests._fake_provider_module"
+MESSAGES = [{"role": "user", "content": "こんにちは"}]
+
+
+class FakeProvider(LLMProvider):
+    """生成回数を数えるテスト用プロバイダー"""
+
+    created = 0
+
+    def __init__(self, transport=None):
+        type(self).created += 1
+        self.transport = transport
+
+    async def stream_chat(self, messages, model):
+        yield "ok"
+
+
+@pytest.fixture
+def fake_module(monkeypatch):
+    """importlibから読み込めるテスト用のプロバイダーモジュール"""
+    module = types.ModuleType(FAKE_MODULE)
+    module.FakeProvider = FakeProvider
+    monkeypatch.setitem(sys.modules, FAKE_MODULE, module)
+    monkeypatch.setattr(FakeProvider, "created", 0)
+    return module
+
+
+def build_registry(monkeypatch, configured: bool = True) -> ProviderRegistry:
+    if configured:
+        monkeypatch.setenv("FAKE_API_KEY", "test-key")
+    else:
+        monkeypatch.delenv("FAKE_API_KEY", raising=False)
+    return ProviderRegistry(
+        ProviderTransport(),
+        specs={"fake": (FAKE_MODULE, "FakeProvider", ("FAKE_API_KEY",))},
+    )
+
+
+def test_importing_main_does_not_load_provider_sdks(tmp_path):
+    """mainのimportでプロバイダーのSDKを読み込まないこと"""
+    code = (
+        "import sys, main; "
+        "print(','.join(m for m in ('openai', 'anthropic') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={"PYTHONPATH": str(BACKEND_DIR), "OPENAI_API_KEY": "test-key"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_membership_does_not_create_provider(monkeypatch, fake_module):
+    """APIキーの有無の判定ではプロバイダーを生成しないこと"""
+    registry = build_registry(monkeypatch)
+
+    assert "fake" in registry
+    assert list(registry) == ["fake"]
+    assert FakeProvider.created == 0
+    assert registry.loaded() == {}
+
+
+def test_provider_is_created_once_on_first_use(monkeypatch, fake_module):
+    """初回利用時に1度だけ生成し、HTTP接続プールを渡すこと"""
+    registry = build_registry(monkeypatch)
+
+    first = registry["fake"]
+    second = registry.get("fake")
+
+    assert first is second
+    assert isinstance(first, FakeProvider)
+    assert first.transport is registry.transport
+    assert FakeProvider.created == 1
+    assert registry.loaded() == {"fake": first}
+
+
+def test_unconfigured_provider_is_unavailable(monkeypatch, fake_module):
+    """APIキーが無いプロバイダーは利用できないこと"""
+    registry = build_registry(monkeypatch, configured=False)
+
+    assert "fake" not in registry
+    assert registry.get("fake") is None
+    with pytest.raises(KeyError):
+        registry["fake"]
+    assert FakeProvider.created == 0
+
+
+def test_registered_provider_is_available(monkeypatch, fake_module):
+    """登録したプロバイダーはAPIキーの設定に関係なく利用できること"""
+    registry = build_registry(monkeypatch, configured=False)
+    provider = FakeProvider()
+
+    registry.register("fake", provider)
+
+    assert "fake" in registry
+    assert registry["fake"] is provider
+    assert len(registry) == 1
+
+
+def test_has_api_key_does_not_load_sdk(monkeypatch):
+    """モデルの利用可否の判定でプロバイダーを生成しないこと"""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    service = LLMService()
+
+    assert service.has_api_key("claude-sonnet-4-5")
+    assert service.providers.loaded() == {}
+
+
+@pytest.mark.asyncio
+async def test_warm_up_creates_configured_providers(monkeypatch, fake_module):
+    """事前の接続確立で、APIキーが設定されているプロバイダーを生成すること"""
+    service = LLMService()
+    service.providers = build_registry(monkeypatch)
+
+    await service.warm_up()
+
+    assert FakeProvider.created == 1
+    assert list(service.providers.loaded()) == ["fake"]
+
+
+@pytest.mark.asyncio
+async def test_first_use_creates_provider_off_the_event_loop(monkeypatch, fake_module):
+    """事前読み込みが無効でも、初回利用時のSDKの読み込みでイベントループを止めないこと"""
+    threads = []
+    monkeypatch.setattr(
+        FakeProvider,
+        "__init__",
+        lambda self, transport=None: threads.append(threading.current_thread()),
+    )
+    service = LLMService(admission=AdmissionController(model_max_concurrency={}))
+    service.providers = build_registry(monkeypatch)
+    service.model_mapping = {"fake-model": "fake"}
+
+    chunks = [chunk async for chunk in service.stream_chat(MESSAGES, "fake-model")]
+
+    assert chunks == ["ok"]
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
@@ -0,0 +1,131 @@
+"""
+クエリプランのテスト
+
+主要な読み取りクエリがインデックスを使用し、
+全件走査や一時B-treeによるソートを行わないことを EXPLAIN QUERY PLAN で検証する。
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.repositories.message_repository import MessageRepository
+from app.repositories.pagination import encode_cursor
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repository = MessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+    repository.create_conversation("会話1", "conv-1")
+    repository.save_message("user", "hello", "gpt-5.2", "conv-1")
+    repository.save_message("assistant", "world", "gpt-5.2", "conv-1")
+    return repository
+
+
+def capture_select(repo, func):
+    """funcの実行中に発行されたSELECT文とパラメータを取得する。"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(repo.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(repo.engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len(statements) == 1
+    return statements[0]
+
+
+def explain(repo, statement, parameters) -> str:
+    with repo.engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_messages_by_conversation_uses_composite_index(repo):
+    statement, parameters = capture_select(
+        repo, lambda: repo.get_messages_by_conversation("conv-1")
+    )
+
+    plan = explain(repo, statement, parameters)
+
+    assert "USING INDEX ix_messages_conversation_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_conversation_summaries_uses_updated_at_index(repo):
+    statement, parameters = capture_select(repo, repo.get_conversation_summaries)
+
+    plan = explain(repo, statement, parameters)
+
+    assert "USING INDEX ix_conversations_updated_at_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_migrate_schema_creates_indexes_on_existing_db(tmp_path):
+    db_path = tmp_path / "chat.db"
+    repo = MessageRepository(db_url=f"sqlite:///{db_path}")
+    with repo.engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_conversations_updated_at_id")
+        connection.exec_driver_sql("DROP INDEX ix_messages_conversation_id_timestamp")
+    repo.engine.dispose()
+
+    migrated = MessageRepository(db_url=f"sqlite:///{db_path}")
+    with migrated.engine.connect() as connection:
+        indexes = {
+            row[0]
+            for row in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+
+    assert "ix_conversations_updated_at_id" in indexes
+    assert "ix_messages_conversation_id_timestamp" in indexes
+
+
+def test_paginated_queries_use_indexes(repo):
+    messages = repo.get_messages_by_conversation("conv-1")
+    summaries = repo.get_conversation_summaries()
+    message_cursor = encode_cursor(messages[0].timestamp, messages[0].id)
+    summary_cursor = encode_cursor(summaries[0]["updated_at"], summaries[0]["id"])
+
+    for func in (
+        lambda: repo.get_messages_by_conversation(
+            "conv-1", limit=10, after=message_cursor
+        ),
+        lambda: repo.get_messages_by_conversation(
+            "conv-1", limit=10, before=message_cursor
+        ),
+        lambda: repo.get_conversation_summaries(limit=10, after=summary_cursor),
+        lambda: repo.get_conversation_summaries(limit=10, before=summary_cursor),
+    ):
+        plan = explain(repo, *capture_select(repo, func))
+
+        assert "USING INDEX" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_migrate_schema_drops_obsolete_indexes(tmp_path):
+    db_path = tmp_path / "chat.db"
+    repo = MessageRepository(db_url=f"sqlite:///{db_path}")
+    with repo.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE INDEX ix_conversations_updated_at ON conversations (updated_at)"
+        )
+    repo.engine.dispose()
+
+    migrated = MessageRepository(db_url=f"sqlite:///{db_path}")
+    with migrated.engine.connect() as connection:
+        indexes = {
+            row[0]
+            for row in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+
+    assert "ix_conversations_updated_at" not in indexes
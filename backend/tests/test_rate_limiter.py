@@ -0,0 +1,238 @@
+"""RPM/TPMレート制限のテスト"""
+
+from email.utils import formatdate
+from time import time
+
+import httpx
+import openai
+import pytest
+
+from app.services.admission import AdmissionController
+from app.services.http_transport import MODEL_HEADER, ProviderTransport, model_headers
+from app.services.llm_provider import LLMProvider
+from app.services.llm_service import LLMService
+from app.services.rate_limiter import (
+    RateLimiter,
+    RateLimitExceededError,
+    TokenBucket,
+)
+from app.services.stream_events import StreamEvent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_paces_requests_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+
+    clock.now += 2
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_token_bucket_clamps_oversized_requests_and_refunds():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+
+    assert bucket.reserve(1000) == 0
+    bucket.refund(1000)
+    assert bucket.level == 60
+
+
+def test_reserve_combines_provider_and_model_buckets():
+    clock = FakeClock()
+    limiter = RateLimiter(
+        provider_rpm={"openai": 60},
+        provider_tpm={},
+        model_rpm={},
+        model_tpm={"gpt-5.2": 600},
+        clock=clock,
+    )
+
+    assert limiter.reserve("openai", "gpt-5.2", 600).delay == 0
+    # TPM側（10トークン/秒）が律速になる
+    assert limiter.reserve("openai", "gpt-5.2", 20).delay == pytest.approx(2.0)
+    # 他のモデルはプロバイダーのRPMのみ
+    assert limiter.reserve("openai", "gpt-5.2-pro", 20).delay == 0
+
+
+def test_reserve_raises_and_refunds_when_wait_is_too_long():
+    clock = FakeClock()
+    limiter = RateLimiter(
+        provider_rpm={"openai": 60},
+        provider_tpm={},
+        model_rpm={},
+        model_tpm={},
+        max_wait=5,
+        clock=clock,
+    )
+    for _ in range(65):
+        limiter.reserve("openai", "gpt-5.2", 0)
+
+    with pytest.raises(RateLimitExceededError):
+        limiter.reserve("openai", "gpt-5.2", 0)
+    # 拒否した予約は返却されている
+    clock.now += 1
+    assert limiter.reserve("openai", "gpt-5.2", 0).delay == pytest.approx(5.0)
+
+
+def empty_limiter(clock) -> RateLimiter:
+    return RateLimiter(
+        provider_rpm={}, provider_tpm={}, model_rpm={}, model_tpm={}, clock=clock
+    )
+
+
+@pytest.mark.parametrize(
+    ("headers", "expected"),
+    [
+        ({"retry-after": "7"}, 7.0),
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"retry-after": "http-date"}, 30.0),
+    ],
+)
+def test_retry_after_pauses_model(headers, expected):
+    clock = FakeClock()
+    limiter = empty_limiter(clock)
+    if headers.get("retry-after") == "http-date":
+        headers = {"retry-after": formatdate(time() + 30, usegmt=True)}
+
+    limiter.observe_headers("claude", "claude-haiku-4-5", headers)
+
+    assert limiter.reserve("claude", "claude-haiku-4-5", 0).delay == pytest.approx(
+        expected, abs=1.5
+    )
+    assert limiter.reserve("claude", "claude-opus-4-5", 0).delay == 0
+    assert limiter.reserve("openai", "gpt-5.2", 0).delay == 0
+
+
+def test_rate_limit_headers_adapt_budgets():
+    clock = FakeClock()
+    limiter = empty_limiter(clock)
+
+    limiter.observe_headers(
+        "openai",
+        "gpt-5.2",
+        {"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0"},
+    )
+    assert limiter.reserve("openai", "gpt-5.2", 0).delay == pytest.approx(1.0)
+
+    limiter.observe_headers(
+        "claude",
+        "claude-haiku-4-5",
+        {
+            "anthropic-ratelimit-tokens-limit": "600",
+            "anthropic-ratelimit-tokens-remaining": "100",
+        },
+    )
+    assert limiter.reserve("claude", "claude-haiku-4-5", 200).delay == pytest.approx(
+        10.0
+    )
+
+
+def test_rate_limit_headers_are_kept_per_model():
+    """同じプロバイダーでもモデルごとに別の上限が掛かること"""
+    clock = FakeClock()
+    limiter = empty_limiter(clock)
+
+    limiter.observe_headers(
+        "openai",
+        "gpt-5.2",
+        {"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0"},
+    )
+    limiter.observe_headers(
+        "openai",
+        "gpt-5.2-pro",
+        {"x-ratelimit-limit-requests": "6", "x-ratelimit-remaining-requests": "0"},
+    )
+
+    assert limiter.reserve("openai", "gpt-5.2", 0).delay == pytest.approx(1.0)
+    assert limiter.reserve("openai", "gpt-5.2-pro", 0).delay == pytest.approx(10.0)
+
+
+@pytest.mark.asyncio
+async def test_transport_response_hook_feeds_listeners():
+    transport = ProviderTransport(http2=False)
+    received = []
+    transport.add_response_listener(
+        lambda provider, model, headers: received.append(
+            (provider, model, dict(headers))
+        )
+    )
+    transport.add_response_listener(lambda provider, model, headers: 1 / 0)
+    client = transport.create_client(openai.DefaultAsyncHttpxClient, "openai")
+
+    chat = httpx.Request(
+        "POST", "https://api.openai.com/v1/responses", headers=model_headers("gpt-5.2")
+    )
+    for hook in client.event_hooks["request"]:
+        await hook(chat)
+    warmup = httpx.Request("HEAD", "https://api.openai.com")
+    for request in (chat, warmup):
+        response = httpx.Response(200, headers={"retry-after": "1"}, request=request)
+        for hook in client.event_hooks["response"]:
+            await hook(response)
+
+    assert MODEL_HEADER not in chat.headers
+    assert received == [("openai", "gpt-5.2", {"retry-after": "1"})]
+    await transport.aclose()
+
+
+class EchoProvider(LLMProvider):
+    async def stream_chat(self, messages, model):
+        yield "ok"
+
+
+def build_service(limiter: RateLimiter) -> LLMService:
+    service = LLMService(
+        admission=AdmissionController(model_max_concurrency={}),
+        rate_limiter=limiter,
+    )
+    service.providers = {"openai": EchoProvider()}
+    return service
+
+
+@pytest.mark.asyncio
+async def test_llm_service_paces_requests_with_throttle_event():
+    limiter = RateLimiter(
+        provider_rpm={}, provider_tpm={"openai": 600}, model_rpm={}, model_tpm={}
+    )
+    service = build_service(limiter)
+    limiter.reserve("openai", "gpt-5.2", 600)
+
+    chunks = [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "abcd"}], "gpt-5.2"
+        )
+    ]
+
+    assert isinstance(chunks[0], StreamEvent)
+    assert chunks[0].event == "throttle"
+    assert 0 < chunks[0].data["wait_ms"] <= 500
+    assert chunks[1:] == ["ok"]
+
+
+@pytest.mark.asyncio
+async def test_closing_a_throttled_stream_refunds_the_reservation():
+    limiter = RateLimiter(
+        provider_rpm={}, provider_tpm={"openai": 600}, model_rpm={}, model_tpm={}
+    )
+    service = build_service(limiter)
+    limiter.reserve("openai", "gpt-5.2", 600)
+    bucket = limiter._buckets[("tpm", "provider:openai")]
+
+    stream = service.stream_chat([{"role": "user", "content": "abcd"}], "gpt-5.2")
+    await anext(stream)
+    level_while_waiting = bucket.level
+    await stream.aclose()
+
+    assert bucket.level > level_while_waiting
@@ -0,0 +1,278 @@
+"""応答キャッシュのテスト"""
+
+import json
+import os
+import time
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+
+from app.models.message import utc_now  # noqa: E402
+from app.repositories.async_message_repository import (  # noqa: E402
+    AsyncMessageRepository,
+)
+from app.services.metrics import MetricsRegistry  # noqa: E402
+from app.services.response_cache import ResponseCache, replay  # noqa: E402
+from app.services.stream_events import cache_event  # noqa: E402
+from main import app  # noqa: E402
+
+HOUR = timedelta(hours=1)
+MESSAGES = [
+    {"role": "system", "content": "簡潔に答えてください"},
+    {"role": "user", "content": "こんにちは"},
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(**kwargs) -> ResponseCache:
+    options = {
+        "max_entries": 2,
+        "ttl": 60,
+        "excluded_models": set(),
+        "default_models": set(),
+        "metrics": MetricsRegistry(),
+    }
+    options.update(kwargs)
+    return ResponseCache(**options)
+
+
+@pytest_asyncio.fixture
+async def repo(tmp_path):
+    repository = AsyncMessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+    yield repository
+    await repository.close()
+
+
+def test_key_ignores_whitespace_and_newline_differences():
+    messy = [
+        {"role": "system", "content": "簡潔に答えてください\r\n"},
+        {"role": "user", "content": "  こんにちは"},
+    ]
+
+    assert ResponseCache.key(MESSAGES, "gpt-5.2") == ResponseCache.key(messy, "gpt-5.2")
+    assert ResponseCache.key(MESSAGES, "gpt-5.2") != ResponseCache.key(
+        MESSAGES, "claude-haiku-4-5"
+    )
+    assert ResponseCache.key(MESSAGES, "gpt-5.2") != ResponseCache.key(
+        MESSAGES, "gpt-5.2", {"temperature": 0.2}
+    )
+    assert ResponseCache.key(MESSAGES, "gpt-5.2") != ResponseCache.key(
+        [*MESSAGES, {"role": "user", "content": "続けて"}], "gpt-5.2"
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_returns_stored_chunks_and_counts_hits_and_misses():
+    cache = make_cache()
+    key = cache.key(MESSAGES, "gpt-5.2")
+
+    assert await cache.get(key, "gpt-5.2") is None
+    await cache.put(key, "gpt-5.2", ["こん", "にちは"])
+
+    assert await cache.get(key, "gpt-5.2") == ["こん", "にちは"]
+    assert cache.metrics.get("response_cache_hits_total", model="gpt-5.2") == 1
+    assert cache.metrics.get("response_cache_misses_total", model="gpt-5.2") == 1
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_least_recently_used_is_evicted():
+    clock = FakeClock()
+    cache = make_cache(clock=clock)
+
+    await cache.put("a", "gpt-5.2", ["A"])
+    await cache.put("b", "gpt-5.2", ["B"])
+    assert await cache.get("a", "gpt-5.2") == ["A"]
+    await cache.put("c", "gpt-5.2", ["C"])
+
+    assert await cache.get("b", "gpt-5.2") is None
+    assert await cache.get("a", "gpt-5.2") == ["A"]
+
+    clock.now += 61
+    assert await cache.get("a", "gpt-5.2") is None
+
+
+def test_excluded_models_are_not_cached():
+    cache = make_cache(excluded_models={"gpt-5.2-pro"})
+
+    assert cache.enabled_for("gpt-5.2", True)
+    assert not cache.enabled_for("gpt-5.2-pro", True)
+
+
+def test_models_are_cached_without_opt_in_only_when_configured():
+    cache = make_cache(default_models={"gpt-5.2"})
+
+    assert cache.enabled_for("gpt-5.2")
+    assert not cache.enabled_for("gpt-5.2", False)
+    assert not cache.enabled_for("claude-haiku-4-5")
+    assert cache.enabled_for("claude-haiku-4-5", True)
+    assert make_cache(default_models={"*"}).enabled_for("claude-haiku-4-5")
+
+
+@pytest.mark.asyncio
+async def test_persisted_entries_survive_a_new_cache_instance(repo):
+    clock = FakeClock()
+    await make_cache(repository=repo, clock=clock).put("key", "gpt-5.2", ["x", "y"])
+
+    restarted = make_cache(repository=repo, clock=clock)
+    assert await restarted.get("key", "gpt-5.2") == ["x", "y"]
+
+    clock.now += 61
+    assert await make_cache(repository=repo, clock=clock).get("key", "gpt-5.2") is None
+
+
+@pytest.mark.asyncio
+async def test_expired_rows_are_deleted(repo):
+    clock = FakeClock()
+    clock.now -= 120
+    await make_cache(repository=repo, clock=clock).put("old", "gpt-5.2", ["x"])
+
+    assert await repo.get_cached_response("old") is None
+    assert repo.repository.get_cached_response("old") is None
+
+
+@pytest.mark.asyncio
+async def test_persisted_rows_are_pruned_to_max_entries(repo):
+    clock = FakeClock()
+    cache = make_cache(repository=repo, clock=clock)
+    for key in ("first", "second", "third"):
+        await cache.put(key, "gpt-5.2", [key])
+
+    assert await repo.get_cached_response("first") is None
+    assert await repo.get_cached_response("second") is not None
+    assert await repo.get_cached_response("third") is not None
+
+
+@pytest.mark.asyncio
+async def test_prune_deletes_expired_rows(repo):
+    expired = utc_now() - timedelta(seconds=1)
+    await repo.save_cached_response("old", "gpt-5.2", '["x"]', expired)
+    await repo.save_cached_response("new", "gpt-5.2", '["y"]', expired + HOUR)
+
+    assert await repo.prune_cached_responses(10) == 1
+    assert repo.repository.get_cached_response("old") is None
+    assert repo.repository.get_cached_response("new") is not None
+
+
+@pytest.mark.asyncio
+async def test_replay_uses_stream_chat_format():
+    items = [item async for item in replay(["a", "b"])]
+
+    assert items == [cache_event(), "a", "b"]
+
+
+def post_chat(client: TestClient, cache: bool | None = True):
+    # フロントエンドのChatServiceと同じ形（cacheは指定した場合のみ送る）
+    payload = {
+        "conversation_id": "cache-conversation",
+        "message": "こんにちは",
+        "model": "gpt-5.2",
+        "history": [],
+    }
+    if cache is not None:
+        payload["cache"] = cache
+    return client.post("/api/chat", json=payload)
+
+
+def content_frames(body: str) -> list[str]:
+    frames = []
+    for line in body.split("\n"):
+        if line.startswith("data: ") and line != "data: [DONE]":
+            data = json.loads(line[6:])
+            if "content" in data:
+                frames.append(data["content"])
+    return frames
+
+
+def test_chat_replays_cached_response_without_calling_provider():
+    async def stream():
+        yield "こん"
+        yield "にちは"
+
+    llm = MagicMock()
+    llm.is_model_available.return_value = True
+    llm.stream_chat.side_effect = lambda messages, model: stream()
+
+    with (
+        patch("main.llm_service", llm),
+        patch("main.message_repository", new_callable=AsyncMock) as repository,
+        patch("main.message_writer", None),
+        patch("main.response_cache", make_cache()),
+    ):
+        client = TestClient(app)
+        first = post_chat(client)
+        second = post_chat(client)
+
+    assert llm.stream_chat.call_count == 1
+    assert (
+        content_frames(first.text)
+        == content_frames(second.text)
+        == [
+            "こん",
+            "にちは",
+        ]
+    )
+    assert '"cache"' not in first.text
+    assert '"cache"' in second.text
+    assert repository.save_turn.await_count == 2
+
+
+def test_chat_without_opt_in_is_not_cached():
+    """生成は非決定的なため、キャッシュを許可しないリクエストは毎回生成する"""
+
+    async def stream():
+        yield "こんにちは"
+
+    llm = MagicMock()
+    llm.is_model_available.return_value = True
+    llm.stream_chat.side_effect = lambda messages, model: stream()
+    cache = make_cache()
+
+    with (
+        patch("main.llm_service", llm),
+        patch("main.message_repository", new_callable=AsyncMock),
+        patch("main.message_writer", None),
+        patch("main.response_cache", cache),
+    ):
+        client = TestClient(app)
+        post_chat(client, cache=False)
+        second = post_chat(client, cache=False)
+
+    assert llm.stream_chat.call_count == 2
+    assert '"cache"' not in second.text
+    assert cache.metrics.get("response_cache_misses_total", model="gpt-5.2") == 0
+
+
+def test_client_payload_is_cached_for_configured_models():
+    """cacheを送らないフロントエンドのリクエストも、設定したモデルはキャッシュする"""
+
+    async def stream():
+        yield "こんにちは"
+
+    llm = MagicMock()
+    llm.is_model_available.return_value = True
+    llm.stream_chat.side_effect = lambda messages, model: stream()
+
+    with (
+        patch("main.llm_service", llm),
+        patch("main.message_repository", new_callable=AsyncMock),
+        patch("main.message_writer", None),
+        patch("main.response_cache", make_cache(default_models={"gpt-5.2"})),
+    ):
+        client = TestClient(app)
+        post_chat(client, cache=None)
+        second = post_chat(client, cache=None)
+
+    assert llm.stream_chat.call_count == 1
+    assert '"cache"' in second.text
@@ -0,0 +1,231 @@
+"""最初のチャンクより前の失敗に対する再試行のテスト"""
+
+import anthropic
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.admission import AdmissionController
+from app.services.llm_provider import LLMProvider
+from app.services.llm_service import LLMService
+from app.services.metrics import MetricsRegistry
+from app.services.rate_limiter import RateLimiter
+from app.services.retry import (
+    AUTH,
+    CLIENT,
+    CONNECTION,
+    RATE_LIMIT,
+    SERVER,
+    TIMEOUT,
+    UNKNOWN,
+    RetryPolicy,
+    classify_error,
+)
+from app.services.stream_events import StreamEvent, retry_event
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/messages")
+
+
+def status_error(error_class: type, status_code: int):
+    response = httpx.Response(status_code, request=REQUEST)
+    return error_class("error", response=response, body=None)
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (status_error(openai.RateLimitError, 429), RATE_LIMIT),
+        (status_error(anthropic.RateLimitError, 429), RATE_LIMIT),
+        (status_error(openai.InternalServerError, 503), SERVER),
+        (status_error(anthropic.APIStatusError, 529), SERVER),
+        (status_error(openai.APIStatusError, 408), TIMEOUT),
+        (openai.APITimeoutError(request=REQUEST), TIMEOUT),
+        (anthropic.APIConnectionError(request=REQUEST), CONNECTION),
+        (httpx.RemoteProtocolError("peer closed connection"), CONNECTION),
+        (httpx.ReadTimeout("timed out"), TIMEOUT),
+        (status_error(openai.AuthenticationError, 401), AUTH),
+        (status_error(anthropic.PermissionDeniedError, 403), AUTH),
+        (status_error(openai.BadRequestError, 400), CLIENT),
+        (RuntimeError("rate limit exceeded"), UNKNOWN),
+    ],
+)
+def test_classify_error_uses_sdk_exception_types(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_backoff_grows_exponentially_up_to_max_delay():
+    policy = RetryPolicy(
+        max_attempts=10,
+        base_delay=0.5,
+        max_delay=4,
+        deadline=60,
+        random_func=lambda: 1.0,
+    )
+
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [
+        0.5,
+        1.0,
+        2.0,
+        4.0,
+        4.0,
+    ]
+
+
+def test_backoff_applies_full_jitter():
+    policy = RetryPolicy(base_delay=1, max_delay=8, random_func=lambda: 0.25)
+
+    assert policy.backoff(3) == 1.0
+
+
+def test_next_delay_stops_on_non_retryable_attempts_and_deadline():
+    policy = RetryPolicy(
+        max_attempts=3, base_delay=1, max_delay=8, deadline=5, random_func=lambda: 1
+    )
+
+    assert policy.next_delay(RATE_LIMIT, 1, 0) == 1
+    assert policy.next_delay(AUTH, 1, 0) is None
+    assert policy.next_delay(CLIENT, 1, 0) is None
+    assert policy.next_delay(SERVER, 3, 0) is None
+    assert policy.next_delay(SERVER, 2, 3.5) is None
+
+
+class ScriptedProvider(LLMProvider):
+    """試行ごとに例外または応答を返すプロバイダー"""
+
+    def __init__(self, *attempts):
+        self.attempts = list(attempts)
+        self.calls = 0
+
+    async def stream_chat(self, messages, model):
+        attempt = self.attempts[min(self.calls, len(self.attempts) - 1)]
+        self.calls += 1
+        for item in attempt:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+def build_service(provider: LLMProvider, max_attempts: int = 3) -> LLMService:
+    service = LLMService(
+        admission=AdmissionController(model_max_concurrency={}),
+        rate_limiter=RateLimiter(
+            provider_rpm={}, provider_tpm={}, model_rpm={}, model_tpm={}
+        ),
+        retry_policy=RetryPolicy(
+            max_attempts=max_attempts,
+            base_delay=0.01,
+            max_delay=0.01,
+            deadline=5,
+            random_func=lambda: 1.0,
+        ),
+        metrics=MetricsRegistry(),
+    )
+    service.providers = {"claude": provider}
+    return service
+
+
+async def collect(service: LLMService) -> list:
+    return [
+        chunk
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], "claude-haiku-4-5"
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_error_before_first_token():
+    provider = ScriptedProvider(
+        [status_error(anthropic.RateLimitError, 429)],
+        [httpx.ReadError("connection reset")],
+        ["Hello", " world"],
+    )
+    service = build_service(provider)
+
+    chunks = await collect(service)
+
+    assert chunks == [
+        retry_event(2, 10, RATE_LIMIT),
+        retry_event(3, 10, CONNECTION),
+        "Hello",
+        " world",
+    ]
+    assert provider.calls == 3
+    assert service.metrics.get("llm_retries_total") == 2
+    assert service.metrics.get("llm_retries_total", kind=RATE_LIMIT) == 1
+    assert service.metrics.get("llm_retry_successes_total") == 1
+    assert service.metrics.get("llm_errors_total") == 0
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_after_first_token():
+    provider = ScriptedProvider(
+        ["partial", status_error(anthropic.InternalServerError, 500)],
+        ["complete"],
+    )
+    service = build_service(provider)
+
+    with pytest.raises(anthropic.InternalServerError):
+        await collect(service)
+
+    assert provider.calls == 1
+    assert service.metrics.get("llm_retries_total") == 0
+    assert service.metrics.get("llm_errors_total", kind=SERVER) == 1
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_non_retryable_errors():
+    provider = ScriptedProvider([status_error(anthropic.AuthenticationError, 401)])
+    service = build_service(provider)
+
+    with pytest.raises(anthropic.AuthenticationError):
+        await collect(service)
+
+    assert provider.calls == 1
+    assert service.metrics.get("llm_errors_total", kind=AUTH) == 1
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts():
+    provider = ScriptedProvider([status_error(anthropic.InternalServerError, 503)])
+    service = build_service(provider, max_attempts=2)
+
+    chunks = []
+    with pytest.raises(anthropic.InternalServerError):
+        async for chunk in service.stream_chat(
+            [{"role": "user", "content": "hi"}], "claude-haiku-4-5"
+        ):
+            chunks.append(chunk)
+
+    assert provider.calls == 2
+    assert all(isinstance(chunk, StreamEvent) for chunk in chunks)
+    assert service.metrics.get("llm_retries_exhausted_total") == 1
+
+
+def test_metrics_registry_snapshot():
+    metrics = MetricsRegistry()
+    metrics.increment("llm_retries_total", provider="openai", kind=SERVER)
+    metrics.increment("llm_retries_total", provider="openai", kind=SERVER)
+    metrics.increment("llm_retries_total", provider="claude", kind=RATE_LIMIT)
+
+    assert metrics.get("llm_retries_total", provider="openai") == 2
+    assert metrics.snapshot() == {
+        "llm_retries_total": [
+            {"labels": {"kind": RATE_LIMIT, "provider": "claude"}, "value": 1},
+            {"labels": {"kind": SERVER, "provider": "openai"}, "value": 2},
+        ]
+    }
+
+
+def test_metrics_endpoint_returns_counters(monkeypatch):
+    import main
+
+    metrics = MetricsRegistry()
+    metrics.increment("llm_retries_total", provider="openai", kind=SERVER)
+    monkeypatch.setattr(main.llm_service, "metrics", metrics)
+
+    response = TestClient(main.app).get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.json() == metrics.snapshot()
@@ -0,0 +1,46 @@
+"""SQLite PRAGMAプロファイルのテスト"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app.repositories.message_repository import MessageRepository
+
+
+def read_pragma(repo: MessageRepository, name: str):
+    with repo.engine.connect() as connection:
+        return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_tuned_profile_is_applied_to_new_connections(tmp_path):
+    repo = MessageRepository(
+        db_url=f"sqlite:///{tmp_path / 'chat.db'}", pragma_profile="tuned"
+    )
+
+    assert read_pragma(repo, "journal_mode") == "wal"
+    assert read_pragma(repo, "synchronous") == 1  # NORMAL
+    assert read_pragma(repo, "busy_timeout") == 5000
+    assert read_pragma(repo, "temp_store") == 2  # MEMORY
+    assert read_pragma(repo, "cache_size") == -64 * 1024
+
+
+def test_none_profile_keeps_sqlite_defaults(tmp_path):
+    repo = MessageRepository(
+        db_url=f"sqlite:///{tmp_path / 'chat.db'}", pragma_profile="none"
+    )
+
+    assert read_pragma(repo, "journal_mode") == "delete"
+    assert read_pragma(repo, "synchronous") == 2  # FULL
+
+
+def test_profile_is_read_from_environment(tmp_path):
+    with patch.dict(os.environ, {"SQLITE_PRAGMA_PROFILE": "none"}):
+        repo = MessageRepository(db_url=f"sqlite:///{tmp_path / 'chat.db'}")
+
+    assert read_pragma(repo, "journal_mode") == "delete"
+
+
+def test_unknown_profile_raises():
+    with pytest.raises(ValueError, match="Unknown SQLite pragma profile"):
+        MessageRepository(db_url="sqlite:///:memory:", pragma_profile="turbo")
@@ -5,7 +5,7 @@ SSE接続のユニットテスト
 """
 
 import os
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
@@ -41,8 +41,8 @@ def mock_llm_service():
 @pytest.fixture
 def mock_message_repository():
     """MessageRepositoryをモック"""
-    with patch("main.message_repository") as mock:
-        mock.save_message.return_value = None
+    with patch("main.message_repository", new_callable=AsyncMock) as mock:
+        mock.save_turn.return_value = None
         yield mock
 
 
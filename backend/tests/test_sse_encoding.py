@@ -0,0 +1,31 @@
+"""
+SSEフレームエンコーダーのプロパティベーステスト
+
+事前構築したエンコーダーの出力が、従来の json.dumps によるフレームと
+完全に一致することを検証する。
+"""
+
+import json
+
+from hypothesis import given
+from hypothesis import strategies as st
+
+from app.api.sse import DONE_FRAME, encode_content, encode_event
+
+
+@given(chunk=st.text(max_size=200))
+def test_encode_content_matches_json_dumps(chunk):
+    """任意のチャンクに対して従来形式と同一のフレームを生成すること"""
+    assert encode_content(chunk) == f"data: {json.dumps({'content': chunk})}\n\n"
+
+
+@given(message=st.text(max_size=200))
+def test_encode_event_matches_json_dumps(message):
+    """任意のペイロードに対して従来形式と同一のフレームを生成すること"""
+    payload = {"error": message}
+    assert encode_event(payload) == f"data: {json.dumps(payload)}\n\n"
+
+
+def test_done_frame():
+    """完了フレームが従来形式と一致すること"""
+    assert f"data: {json.dumps({'done': True})}\n\n" == DONE_FRAME
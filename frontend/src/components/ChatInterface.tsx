@@ -221,11 +221,6 @@ export function ChatInterface() {
       conversationId,
     };
 
-    const history = messages.map((msg) => ({
-      role: msg.role,
-      content: msg.content,
-    }));
-
     setMessages((prev) => [...prev, userMessage, assistantMessage]);
     setConversations((prev) =>
       moveConversationToTop(prev, conversationId, message.slice(0, 40), message, 1)
@@ -238,7 +233,8 @@ export function ChatInterface() {
       await chatService.sendMessage(
         message,
         selectedModel,
-        history,
+        // 履歴はサーバー側で保存済みのメッセージから組み立てる
+        undefined,
         conversationId,
         (content: string) => {
           setMessages((prev) =>
@@ -27,7 +27,7 @@ export class ChatService {
   async sendMessage(
     message: string,
     model: string,
-    history: Array<{ role: string; content: string }>,
+    history: Array<{ role: string; content: string }> | undefined,
     conversationId: string,
     onChunk: (content: string) => void,
     onComplete: () => void,
@@ -21,7 +21,10 @@ export interface ChatRequest {
   conversation_id: string;
   message: string;
   model: string;
-  history: Array<{ role: string; content: string }>;
+  // 省略時はサーバー側で保存済みのメッセージから履歴を組み立てる
+  history?: Array<{ role: string; content: string }>;
+  // キャッシュした応答の再利用を許可するか（省略時はサーバーの設定に従う）
+  cache?: boolean;
 }
 
 /**
@@ -30,8 +33,14 @@ export interface ChatRequest {
 export interface ModelInfo {
   id: string;
   name: string;
-  provider: 'openai' | 'claude' | 'google';
+  provider: 'openai' | 'claude' | 'google' | 'mock';
   description: string;
+  context_window?: number;
+  max_output_tokens?: number;
+  // 100万トークンあたりの料金（USD）
+  input_price?: number | null;
+  cached_input_price?: number | null;
+  output_price?: number | null;
 }
 
 /**
@@ -83,6 +83,29 @@ describe('ChatService', () => {
         history,
       });
     });
+
+    it('履歴を省略した場合はリクエストペイロードにhistoryを含めない', async () => {
+      let requestBody: ChatRequest | null = null;
+
+      server.use(
+        http.post(`${API_BASE_URL}/api/chat`, async ({ request }) => {
+          requestBody = (await request.json()) as ChatRequest;
+          return new HttpResponse('data: {"done":true}\n\n', {
+            headers: { 'Content-Type': 'text/event-stream' },
+          });
+        })
+      );
+
+      const chatService = new ChatService(API_BASE_URL);
+
+      await chatService.sendMessage('New message', 'gpt-5.2', undefined, 'conv-1', vi.fn(), vi.fn(), vi.fn());
+
+      expect(requestBody).toEqual({
+        conversation_id: 'conv-1',
+        message: 'New message',
+        model: 'gpt-5.2',
+      });
+    });
   });
 
   describe('getModels', () => {